@@ -25,19 +25,32 @@ else:
     PYWIKIBOT_DATA_DIR = CONFIG_DIR
 
 USER_CONFIG_PATH = os.path.join(CONFIG_DIR, 'user-config.py')
+# Downloaded sources kept between runs; shared by all config directories
+DOWNLOAD_CACHE_DIR = os.path.join(CONFIG_DIR, 'download-cache')
+# Converted videos kept between runs, keyed by source content and encoder settings
+CONVERSION_CACHE_DIR = os.path.join(CONFIG_DIR, 'conversion-cache')
 PASSWORD_FILE_PATH = os.path.join(CONFIG_DIR, 'user-password.py')
 
 import time
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+except ImportError:
+    # Headless servers may ship Python without Tk; the command line still works
+    tk = None
 import threading
+import subprocess
+import sqlite3
+import argparse
+import getpass
+import signal
 import pandas as pd
 import json
 try:
     import openpyxl
 except ImportError:
     openpyxl = None
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 import requests
 import logging
 from datetime import datetime
@@ -46,12 +59,6 @@ from PIL import Image
 from urllib.parse import urlparse
 import tempfile
 
-try:
-    from moviepy import VideoFileClip
-    MOVIEPY_AVAILABLE = True
-except ImportError:
-    MOVIEPY_AVAILABLE = False
-
 try:
     import yt_dlp
     YT_DLP_AVAILABLE = True
@@ -83,11 +90,78 @@ ALLOWED_EXTENSIONS = {
     '.stl'
 }
 
+# Manifests up to this many rows stay in memory once read; larger ones are re-streamed
+MANIFEST_CACHE_MAX_ROWS = 200000
+# Rows per pandas chunk when streaming CSV manifests
+MANIFEST_CHUNK_ROWS = 5000
+
+# Rows queued or running at once, per upload worker
+SUBMIT_WINDOW_FACTOR = 3
+# Remote sources are downloaded at most this many rows ahead of the oldest unfinished row
+PREFETCH_ROWS = 8
+# Downloaded files waiting for their upload may take at most this much disk space
+PREFETCH_DISK_BUDGET = 2 * 1024 * 1024 * 1024
+
+# Encoder threads shared by all video conversions running at once
+TRANSCODE_CPU_THREADS = os.cpu_count() or 2
+# Keeps ffmpeg from opening a console window under the Windows GUI
+SUBPROCESS_FLAGS = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+# Bytes read per step when streaming a download to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Downloads up to this size are kept in memory; larger ones go to a temp file
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# Downloads at least this big are fetched as several byte ranges in parallel
+PARALLEL_DOWNLOAD_MIN_SIZE = 64 * 1024 * 1024
+# Number of byte ranges a large download is split into
+DOWNLOAD_RANGE_PARTS = 4
+
+# Wayback Machine snapshot index
+WAYBACK_CDX_URL = "http://web.archive.org/cdx/search/cdx"
+# Connection failures in a row after which a source host is treated as dead
+DEAD_HOST_THRESHOLD = 3
+# Seconds after which a dead host is tried directly again
+DEAD_HOST_TTL = 300
+
+# Default size limit of the download cache
+DOWNLOAD_CACHE_MAX_BYTES = 5 * 1024 * 1024 * 1024
+# Default size limit of the conversion cache
+CONVERSION_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+# Longest wait between two attempts, in seconds, however many retries came before
+RETRY_MAX_DELAY = 300
+# Retries allowed in one run, across all rows, before failures are final
+RETRY_BUDGET = 1000
+
+# API error codes that no amount of retrying will fix
+PERMANENT_API_CODES = {
+    'abusefilter-disallowed', 'abusefilter-warning', 'spamblacklist', 'titleblacklist-forbidden',
+    'filetype-banned', 'filetype-missing', 'filetype-badmime', 'verification-error',
+    'illegal-filename', 'badfilename', 'filename-tooshort', 'file-too-large', 'empty-file',
+    'fileexists-forbidden', 'fileexists-shared-forbidden', 'protectedpage', 'cascadeprotected',
+    'permissiondenied', 'mustbeloggedin', 'blocked', 'uploaddisabled', 'copyuploaddisabled',
+    # Upload warnings (when they are not ignored) do not go away on retry either
+    'exists', 'duplicate', 'duplicate-archive', 'was-deleted', 'bad-prefix',
+}
+
 # Popular video formats that need conversion to WebM
 VIDEO_FORMATS_TO_CONVERT = {
     '.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.m4v', '.mpeg', '.mpg', '.3gp', '.m2v'
 }
 
+# VP9 encoder settings by preset name: libvpx speed (cpu-used, deadline), row-based
+# multithreading, log2 tile columns, and either constant quality (crf) or a target bitrate
+ENCODER_PRESETS = {
+    'fast': {'deadline': 'good', 'cpu_used': 5, 'row_mt': True, 'tile_columns': 2, 'crf': None, 'bitrate': '2000k'},
+    'balanced': {'deadline': 'good', 'cpu_used': 3, 'row_mt': True, 'tile_columns': 2, 'crf': 32, 'bitrate': None},
+    'archival': {'deadline': 'good', 'cpu_used': 1, 'row_mt': True, 'tile_columns': 1, 'crf': 24, 'bitrate': None},
+}
+DEFAULT_ENCODER_PRESET = 'balanced'
+
+# Codecs Commons accepts in WebM; sources that already use them are remuxed, not re-encoded
+WEBM_VIDEO_CODECS = {'vp8', 'vp9', 'av1'}
+WEBM_AUDIO_CODECS = {'opus', 'vorbis'}
+
 def safe_chmod(path, mode):
     try:
         os.chmod(path, mode)
@@ -109,370 +183,1624 @@ def sanitize_filename(filename):
     
     return sanitized
 
-class PyPan:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("PyPan")
-        self.root.geometry("800x600")
-        
-        self.input_file = tk.StringVar()
-        self.output_file = tk.StringVar(value="upload_results.xlsx")
-        self.num_workers_var = tk.IntVar(value=1)
-        self.username = None
-        self.password = None
-        self.is_logged_in = False
-        self.is_running = False
-        self.is_paused = False
-        self.total_files = 0
-        self.processed_files = 0
-        self.successful_uploads = 0
-        self.failed_uploads = 0
-        self.start_time = None
-        self.executor = None
-        self.site = None
-        self.internet_status = tk.StringVar(value="Unknown")
-        
-        self.results = []
-        self.results_lock = threading.Lock()
-        self.stop_event = threading.Event()
-        
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[logging.StreamHandler()]
-        )
-        self.logger = logging.getLogger(__name__)
-               
-        self.setup_ui()
-        self.check_external_dependencies()
-        # Check internet connection on startup
-        threading.Thread(target=self.test_internet_connection, daemon=True).start()
-        
-    def check_external_dependencies(self):
-        """Check for external dependencies and warn user"""
-        missing = []
-        
-        # Check for yt-dlp 
-        if not YT_DLP_AVAILABLE:
-            missing.append("yt-dlp (for YouTube downloads)")
-        
-        # Check for moviepy 
-        if not MOVIEPY_AVAILABLE:
-            missing.append("moviepy (for video conversion)")
-        
-        if missing:
-            msg = "Optional dependencies not found:\n\n" + "\n".join(f"• {m}" for m in missing)
-            msg += "\n\nSome features may not work without these libraries."
-            msg += "\nInstall via: pip install yt-dlp moviepy"
-            self.log_message(msg, "WARNING")    
+def default_output_path(input_path):
+    """Return the results file path used for an input file (same directory, _results suffix)"""
+    input_dir = os.path.dirname(input_path)
+    input_name, input_ext = os.path.splitext(os.path.basename(input_path))
     
-    def cleanup_config_files(self):
-        """Delete config files and extra pywikibot artifacts in CONFIG_DIR"""
+    # Determine output extension based on input
+    if input_ext.lower() in ['.csv']:
+        output_ext = '.csv'
+    elif input_ext.lower() in ['.json']:
+        output_ext = '.json'
+    else:
+        output_ext = '.xlsx'
+    
+    return os.path.join(input_dir, f"{input_name}_results{output_ext}")
+
+def iter_json_array(f, chunk_size=65536):
+    """Yield the elements of a top-level JSON array from a text file one at a time"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    
+    def fill():
+        nonlocal buffer, eof
+        chunk = f.read(chunk_size)
+        if chunk:
+            buffer += chunk
+        else:
+            eof = True
+    
+    def skip_whitespace():
+        nonlocal buffer
+        while True:
+            buffer = buffer.lstrip()
+            if buffer or eof:
+                return
+            fill()
+    
+    skip_whitespace()
+    if not buffer.startswith('['):
+        raise ValueError("Invalid JSON format - expected array")
+    buffer = buffer[1:]
+    
+    expect_value = True
+    while True:
+        skip_whitespace()
+        if not buffer:
+            raise ValueError("Unexpected end of JSON array")
+        if buffer[0] == ']':
+            return
+        if not expect_value:
+            if buffer[0] != ',':
+                raise ValueError("Expected ',' between JSON array items")
+            buffer = buffer[1:]
+            expect_value = True
+            continue
+        # Decode the next element, reading more text until it is complete
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if end == len(buffer) and not eof:
+                # A number may continue in the next chunk
+                fill()
+                continue
+            break
+        buffer = buffer[end:]
+        expect_value = False
+        yield item
+
+def make_http_session(pool_size):
+    """requests.Session whose keep-alive pools allow `pool_size` concurrent connections per host"""
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max(pool_size, 10))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def stream_to_file(response, file_path, mode='wb', stop_event=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Write a streamed response body to `file_path`; returns the number of bytes written
+    
+    Use mode 'ab' to continue a partial file. Setting `stop_event` aborts
+    the transfer between chunks.
+    """
+    written = 0
+    with open(file_path, mode) as f:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if stop_event is not None and stop_event.is_set():
+                raise IOError("Download stopped by user")
+            if chunk:
+                f.write(chunk)
+                written += len(chunk)
+    return written
+
+def discard_download(file_path):
+    """Remove a download and any range parts left next to it"""
+    import glob
+    for path in [file_path] + glob.glob(glob.escape(file_path) + '.part*'):
         try:
-            # removing user-config and password files
-            for p in (USER_CONFIG_PATH, PASSWORD_FILE_PATH):
+            os.remove(path)
+        except OSError:
+            pass
+
+def describe_download(headers):
+    """Size, byte-range support and validators of a body, read from HEAD or GET response headers
+    
+    The size of a 206 response is the total from its Content-Range.
+    """
+    length = headers.get('Content-Length', '')
+    size = int(length) if length.isdigit() and not headers.get('Content-Encoding') else None
+    total = headers.get('Content-Range', '').rpartition('/')[2]
+    if headers.get('Content-Range'):
+        size = int(total) if total.isdigit() else None
+    etag = headers.get('ETag', '')
+    # If-Range only accepts strong validators
+    validator = etag if etag and not etag.startswith('W/') else headers.get('Last-Modified')
+    return {
+        'size': size,
+        'ranges': headers.get('Accept-Ranges', '').lower() == 'bytes' or bool(headers.get('Content-Range')),
+        'validator': validator,
+        'etag': etag or None,
+        'last_modified': headers.get('Last-Modified'),
+    }
+
+class MemoryDownload:
+    """A download small enough to be held in memory instead of a temp file
+    
+    Type detection and hashing read `data` directly; the bytes are written
+    to disk only by materialize(), when something needs a real path.
+    `name` is the source's file name, used where a path's extension is.
+    """
+    def __init__(self, data, name):
+        self.data = data
+        self.name = name
+    
+    @property
+    def size(self):
+        return len(self.data)
+    
+    def write_to(self, file_path):
+        with open(file_path, 'wb') as f:
+            f.write(self.data)
+    
+    def materialize(self, suffix='_download'):
+        """Write the bytes to a temp file and return its path"""
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        with temp_file:
+            temp_file.write(self.data)
+        return temp_file.name
+
+def file_sha1(file_path, chunk_size=1024 * 1024):
+    """Hex SHA-1 of a file (or MemoryDownload), the hash Commons reports for every upload"""
+    import hashlib
+    if isinstance(file_path, MemoryDownload):
+        return hashlib.sha1(file_path.data).hexdigest()
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def journal_path_for(output_path):
+    """Return the result journal path that belongs to a results file"""
+    base_name, _ = os.path.splitext(output_path)
+    return f"{base_name}.journal.jsonl"
+
+class ResultJournal:
+    """Append-only JSON Lines record of per-row upload outcomes
+    
+    Every result is written as one line and flushed immediately, so a crashed
+    process loses nothing; fsync is batched (every `fsync_every` records or
+    `fsync_interval` seconds) so power loss costs at most one batch.
+    """
+    def __init__(self, path, fsync_every=20, fsync_interval=2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.time()
+        self._lock = threading.Lock()
+    
+    def open(self, truncate=False):
+        """Open the journal for appending; `truncate` starts a fresh run"""
+        journal_dir = os.path.dirname(self.path)
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+        self._file = open(self.path, 'w' if truncate else 'a', encoding='utf-8')
+        # Terminate a torn last line so the next record starts on its own line
+        if not truncate and self._file.tell() > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write("\n")
+        self._last_sync = time.time()
+    
+    def append(self, result):
+        """Record one row outcome in constant time"""
+        line = json.dumps(result, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+    
+    def sync(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync_locked()
+    
+    def _sync_locked(self):
+        try:
+            os.fsync(self._file.fileno())
+        except OSError:
+            pass
+        self._pending = 0
+        self._last_sync = time.time()
+    
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+    
+    @staticmethod
+    def load(path):
+        """Read a journal and return {row_number: latest result}
+        
+        A torn last line (process killed mid-write) is ignored.
+        """
+        results = {}
+        if not os.path.exists(path):
+            return results
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
                 try:
-                    if os.path.exists(p):
-                        os.remove(p)
-                except Exception as e:
-                    print(f"Warning: could not remove {p}: {e}")
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(result, dict) and 'row' in result:
+                    results[result['row']] = result
+        return results
 
-            # removing apicache directory
-            apicache_dir = os.path.join(CONFIG_DIR, 'apicache')
-            try:
-                if os.path.isdir(apicache_dir):
-                    shutil.rmtree(apicache_dir, ignore_errors=True)
-            except Exception as e:
-                print(f"Warning: could not remove apicache dir {apicache_dir}: {e}")
+def link_or_copy(source, destination):
+    """Hard-link `source` to `destination`, copying when the filesystem cannot link"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
 
-            # removing throttle control file
-            throttle_path = os.path.join(CONFIG_DIR, 'throttle.ctrl')
+class BlobCache:
+    """Content-addressed file store under `root`, bounded to `max_bytes` by LRU eviction
+    
+    Files are stored once per SHA-1 in `root/blobs`, however many keys point
+    at them; `root/index.sqlite` maps each key to its blob and a free-form
+    `meta` dict. A blob's modification time is its last use, so a cache hit
+    costs one utime() instead of an index write. The least recently used
+    blobs are evicted once the total size goes over the limit.
+    
+    Several runs may share one cache directory: index changes and evictions
+    happen in SQLite transactions, which lock across processes, and a blob
+    that disappears under a reader is treated as a miss.
+    """
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.index_path = os.path.join(root, 'index.sqlite')
+        self._lock = threading.Lock()
+        self._db = None
+    
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(self.blob_dir, exist_ok=True)
+            # Autocommit mode; writes take BEGIN IMMEDIATE themselves
+            self._db = sqlite3.connect(self.index_path, timeout=60, isolation_level=None, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS blobs (sha1 TEXT PRIMARY KEY, size INTEGER NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, sha1 TEXT NOT NULL, meta TEXT NOT NULL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS entries_sha1 ON entries (sha1)')
+        return self._db
+    
+    def blob_path(self, sha1):
+        return os.path.join(self.blob_dir, sha1)
+    
+    def get(self, key):
+        """Return the meta dict stored with a key, or None if the key is not cached"""
+        with self._lock:
+            row = self._connect().execute('SELECT sha1, meta FROM entries WHERE key = ?', (key,)).fetchone()
+        if not row or not os.path.exists(self.blob_path(row[0])):
+            return None
+        return json.loads(row[1])
+    
+    def checkout(self, key, destination):
+        """Link (or copy) the blob of a key to `destination` and mark it as used; False on a miss"""
+        with self._lock:
+            db = self._connect()
+            row = db.execute('SELECT sha1 FROM entries WHERE key = ?', (key,)).fetchone()
+            if not row:
+                return False
+            path = self.blob_path(row[0])
             try:
-                if os.path.exists(throttle_path):
-                    os.remove(throttle_path)
-            except Exception as e:
-                print(f"Warning: could not remove {throttle_path}: {e}")
-
-            # removing lwp file
+                link_or_copy(path, destination)
+                os.utime(path)
+            except FileNotFoundError:
+                # Evicted meanwhile, possibly by another run sharing the cache
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                return False
+        return True
+    
+    def put(self, key, file_path, meta=None, sha1=None):
+        """Store a copy of `file_path` (or a MemoryDownload) under `key`; returns the blob path (None if it does not fit)"""
+        in_memory = isinstance(file_path, MemoryDownload)
+        size = file_path.size if in_memory else os.path.getsize(file_path)
+        if size > self.max_bytes:
+            return None
+        sha1 = sha1 or file_sha1(file_path)
+        path = self.blob_path(sha1)
+        with self._lock:
+            db = self._connect()
+            db.execute('BEGIN IMMEDIATE')
             try:
-                uname = getattr(self, 'username', '') or ''
-                lwp_name = f"pywikibot-{uname.replace(' ', '_')}.lwp"
-                lwp_path = os.path.join(CONFIG_DIR, lwp_name)
-                if os.path.exists(lwp_path):
-                    os.remove(lwp_path)
-            except Exception as e:
-                print(f"Warning: could not remove lwp file: {e}")
-
-            # removing upload_log.txt
+                if os.path.exists(path):
+                    os.utime(path)
+                else:
+                    # Unique temp name: other threads and runs may store the same content
+                    fd, temp_path = tempfile.mkstemp(dir=self.blob_dir, suffix='.tmp')
+                    os.close(fd)
+                    try:
+                        if in_memory:
+                            file_path.write_to(temp_path)
+                        else:
+                            os.remove(temp_path)
+                            link_or_copy(file_path, temp_path)
+                        os.replace(temp_path, path)
+                    except BaseException:
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                        raise
+                db.execute('INSERT OR REPLACE INTO blobs (sha1, size) VALUES (?, ?)', (sha1, size))
+                db.execute('INSERT OR REPLACE INTO entries (key, sha1, meta) VALUES (?, ?, ?)',
+                           (key, sha1, json.dumps(meta or {})))
+                self._evict_locked(db)
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        return path if os.path.exists(path) else None
+    
+    def _evict_locked(self, db):
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        blobs = db.execute('SELECT sha1, size FROM blobs').fetchall()
+        def last_used(sha1):
             try:
-                log_path = os.path.join(CONFIG_DIR, 'upload_log.txt')
-                if os.path.exists(log_path):
-                    os.remove(log_path)
-            except Exception as e:
-                print(f"Warning: could not remove upload_log.txt: {e}")
+                return os.path.getmtime(self.blob_path(sha1))
+            except OSError:
+                return 0
+        for sha1, size in sorted(blobs, key=lambda blob: last_used(blob[0])):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.blob_path(sha1))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # In use (Windows); try again on a later put
+                continue
+            total -= size
+            db.execute('DELETE FROM blobs WHERE sha1 = ?', (sha1,))
+            db.execute('DELETE FROM entries WHERE sha1 = ?', (sha1,))
 
-        except Exception as e:
-            print(f"Warning: cleanup_config_files failed: {e}")
-        
-    def setup_ui(self):
-        # Set window icon
+class WaybackResolver:
+    """Finds the oldest Wayback Machine snapshot of source URLs, with a shared cache
+    
+    `query_snapshot(url)` returns the snapshot timestamp, or None when there
+    is none. Answers are kept for the run and concurrent lookups of one URL
+    share a request. Hosts that fail at the connection level
+    `dead_after` times in a row are marked dead for `dead_ttl` seconds:
+    their rows skip the direct download, and snapshots of their upcoming
+    rows (announced with note_upcoming() and withdrawn with forget() once
+    the row is done) are looked up ahead of time on a small background
+    pool. Failures only count while `is_online()` says our own connection
+    works, and any direct fetch that reaches the host clears its mark.
+    """
+    def __init__(self, query_snapshot, dead_after=DEAD_HOST_THRESHOLD, lookahead_workers=2,
+                 is_online=None, dead_ttl=DEAD_HOST_TTL):
+        self.query_snapshot = query_snapshot
+        self.dead_after = dead_after
+        self.is_online = is_online
+        self.dead_ttl = dead_ttl
+        self._snapshots = {}   # url -> timestamp or None
+        self._in_flight = {}   # url -> Event set once its lookup finishes
+        self._failures = {}    # host -> connection failures in a row
+        self._dead_hosts = {}  # host -> time it was marked dead
+        self._upcoming = {}    # host -> {url: rows in the pipeline}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=lookahead_workers, thread_name_prefix='pypan-wayback')
+    
+    @staticmethod
+    def host_of(url):
+        return urlparse(url).netloc.lower()
+    
+    def snapshot(self, url):
+        """Return the timestamp of the oldest snapshot of `url`, or None; query errors are raised"""
+        while True:
+            with self._lock:
+                if url in self._snapshots:
+                    return self._snapshots[url]
+                event = self._in_flight.get(url)
+                if event is None:
+                    event = self._in_flight[url] = threading.Event()
+                    break
+            event.wait()
         try:
-            # When compiled, use the exe's embedded icon
-            if getattr(sys.modules[__name__], '__compiled__', False):
-                self.root.iconbitmap(default=sys.executable)
-            else:
-                # When running as script, use icon file
-                icon_path = get_resource_path('icon.ico')
-                if os.path.exists(icon_path):
-                    self.root.iconbitmap(icon_path)
-        except Exception as e:
-            # Icon is optional, continue without it
+            timestamp = self.query_snapshot(url)
+            with self._lock:
+                self._snapshots[url] = timestamp
+            return timestamp
+        finally:
+            with self._lock:
+                self._in_flight.pop(url, None)
+            event.set()
+    
+    def prefetch(self, urls):
+        """Look snapshots up in the background; errors are left for snapshot() to meet again"""
+        for url in urls:
+            with self._lock:
+                if url in self._snapshots or url in self._in_flight:
+                    continue
+            try:
+                self._executor.submit(self._prefetch_one, url)
+            except RuntimeError:
+                # Shut down at the end of the run
+                return
+    
+    def _prefetch_one(self, url):
+        try:
+            self.snapshot(url)
+        except Exception:
             pass
+    
+    def note_upcoming(self, url):
+        """Announce a row that will be fetched soon, so it can be resolved early if its host dies"""
+        host = self.host_of(url)
+        with self._lock:
+            if not self._is_dead_locked(host):
+                urls = self._upcoming.setdefault(host, {})
+                urls[url] = urls.get(url, 0) + 1
+                return
+        self.prefetch([url])
+    
+    def forget(self, url):
+        """Withdraw a row announced with note_upcoming(), however it ended"""
+        host = self.host_of(url)
+        with self._lock:
+            urls = self._upcoming.get(host)
+            if not urls or url not in urls:
+                return
+            urls[url] -= 1
+            if not urls[url]:
+                del urls[url]
+                if not urls:
+                    del self._upcoming[host]
+    
+    def is_dead(self, url):
+        with self._lock:
+            return self._is_dead_locked(self.host_of(url))
+    
+    def _is_dead_locked(self, host):
+        marked_at = self._dead_hosts.get(host)
+        if marked_at is None:
+            return False
+        if time.time() - marked_at < self.dead_ttl:
+            return True
+        # Expired: let the next row try the host again; one more failure marks it dead again
+        del self._dead_hosts[host]
+        self._failures[host] = self.dead_after - 1
+        return False
+    
+    def record_result(self, url, error=None):
+        """Track a direct download attempt; returns True once the URL's host counts as dead"""
+        host = self.host_of(url)
+        connection_failed = isinstance(error, (requests.ConnectionError, requests.Timeout))
+        # While our own connection is down, the host is not to blame
+        if connection_failed and self.is_online and not self.is_online():
+            return False
+        with self._lock:
+            if not connection_failed:
+                # Any answer from the server, even an error page, means the host is alive
+                self._failures.pop(host, None)
+                self._dead_hosts.pop(host, None)
+                return False
+            if self._is_dead_locked(host):
+                return True
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] < self.dead_after:
+                return False
+            self._dead_hosts[host] = time.time()
+            upcoming = self._upcoming.pop(host, {})
+        self.prefetch(sorted(upcoming))
+        return True
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class TitleResolver:
+    """Shared, thread-safe cache of which File: titles already exist on the wiki
+    
+    Lookups are batched: titles announced with prefetch() are collected and
+    checked together, up to `batch_size` per multi-title API query, and any
+    exists() call that misses the cache takes the pending titles along with
+    it. `query_titles(titles)` does the actual request and returns
+    {title: exists}; it can be pointed at a mock API for testing. Positive
+    answers are kept for the whole run, negative ones for `negative_ttl`
+    seconds so a title created by someone else is noticed.
+    """
+    def __init__(self, query_titles, batch_size=50, negative_ttl=300):
+        self.query_titles = query_titles
+        self.batch_size = batch_size
+        self.negative_ttl = negative_ttl
+        self._known = {}      # title -> (exists, checked_at)
+        self._in_flight = {}  # title -> Event set once its query finishes
+        self._pending = []
+        self._lock = threading.Lock()
+    
+    def _cached(self, title):
+        entry = self._known.get(title)
+        if entry is None:
+            return None
+        exists, checked_at = entry
+        if not exists and time.time() - checked_at > self.negative_ttl:
+            return None
+        return exists
+    
+    def prefetch(self, titles):
+        """Queue titles for the next batch; a full batch is queried right away"""
+        with self._lock:
+            for title in titles:
+                if self._cached(title) is None and title not in self._in_flight and title not in self._pending:
+                    self._pending.append(title)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            try:
+                self._resolve([])
+            except Exception:
+                # The titles are queried again by exists() when they are needed
+                pass
+    
+    def exists(self, title):
+        """Return whether File:<title> exists, querying it (and pending titles) if not cached"""
+        with self._lock:
+            cached = self._cached(title)
+        if cached is not None:
+            return cached
+        self._resolve([title])
+        with self._lock:
+            cached = self._cached(title)
+        if cached is None:
+            raise RuntimeError(f"Could not check whether File:{title} exists")
+        return cached
+    
+    def mark_exists(self, title):
+        """Record a title that this run has just created"""
+        with self._lock:
+            self._known[title] = (True, time.time())
+    
+    def _resolve(self, titles):
+        to_query = []
+        waits = []
+        with self._lock:
+            for title in titles:
+                if self._cached(title) is not None:
+                    continue
+                if title in self._in_flight:
+                    waits.append(self._in_flight[title])
+                    continue
+                self._in_flight[title] = threading.Event()
+                to_query.append(title)
+                if title in self._pending:
+                    self._pending.remove(title)
+            # Fill the rest of the batch (a whole batch when nothing else is
+            # queried) with titles announced by prefetch(). A title already in
+            # flight keeps its Event, or the callers waiting on it would hang.
+            while self._pending and (not to_query or len(to_query) % self.batch_size):
+                title = self._pending.pop(0)
+                if self._cached(title) is None and title not in self._in_flight:
+                    self._in_flight[title] = threading.Event()
+                    to_query.append(title)
         
-        main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
-        config_frame = ttk.LabelFrame(main_frame, text="Configuration", padding="10")
-        config_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
-        
-        ttk.Label(config_frame, text="Login Status:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
-        self.login_status_var = tk.StringVar(value="Not logged in")
-        self.login_status_label = ttk.Label(config_frame, textvariable=self.login_status_var, font=('Arial', 10, 'bold'), foreground='red')
-        self.login_status_label.grid(row=0, column=1, sticky=tk.W, padx=(0, 5))
-        
-        self.login_btn = ttk.Button(config_frame, text="Login", command=self.show_login_window)
-        self.login_btn.grid(row=0, column=2, sticky=tk.W)
-        
-        # Family and Language settings 
-        ttk.Label(config_frame, text="Family:").grid(row=0, column=3, sticky=tk.W, padx=(10, 5))
-        self.family_var = tk.StringVar(value="commons")
-        ttk.Entry(config_frame, textvariable=self.family_var, width=12).grid(row=0, column=4, sticky=tk.W, padx=(0, 5))
-        
-        ttk.Label(config_frame, text="Lang:").grid(row=0, column=5, sticky=tk.W, padx=(10, 5))
-        self.mylang_var = tk.StringVar(value="commons")
-        ttk.Entry(config_frame, textvariable=self.mylang_var, width=12).grid(row=0, column=6, sticky=tk.W, padx=(0, 10))
+        try:
+            for start in range(0, len(to_query), self.batch_size):
+                batch = to_query[start:start + self.batch_size]
+                answers = self.query_titles(batch)
+                now = time.time()
+                with self._lock:
+                    for title in batch:
+                        if title in answers:
+                            self._known[title] = (bool(answers[title]), now)
+                        event = self._in_flight.pop(title, None)
+                        if event:
+                            event.set()
+        finally:
+            # Release waiters even if a query failed
+            with self._lock:
+                for title in to_query:
+                    event = self._in_flight.pop(title, None)
+                    if event:
+                        event.set()
         
-        ttk.Label(config_frame, text="Input File:").grid(row=1, column=0, sticky=tk.W, padx=(0, 5))
-        ttk.Entry(config_frame, textvariable=self.input_file, width=50).grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(0, 5))
-        ttk.Button(config_frame, text="Browse", command=self.browse_input_file).grid(row=1, column=2, sticky=tk.W)
+        for event in waits:
+            event.wait()
+
+class DuplicateFinder:
+    """Shared, thread-safe cache of which file contents (SHA-1) are already on the wiki
+    
+    `query_sha1(sha1)` returns the title of an existing file with that hash,
+    or None. Each hash is looked up once per run even when several rows
+    carry the same file, and files uploaded by this run are remembered so
+    later copies are skipped without asking the wiki.
+    """
+    def __init__(self, query_sha1):
+        self.query_sha1 = query_sha1
+        self._known = {}      # sha1 -> existing title or None
+        self._in_flight = {}  # sha1 -> Event set once its query finishes
+        self._uploading = {}  # sha1 -> Event set once this run's upload of it ends
+        self._lock = threading.Lock()
+    
+    def find(self, sha1):
+        """Return the title of a file with this SHA-1, or None if there is none"""
+        while True:
+            with self._lock:
+                if sha1 in self._known:
+                    return self._known[sha1]
+                event = self._in_flight.get(sha1)
+                if event is None:
+                    event = self._in_flight[sha1] = threading.Event()
+                    break
+            event.wait()
+        try:
+            title = self.query_sha1(sha1)
+            with self._lock:
+                # An upload of this run may have answered it meanwhile
+                self._known.setdefault(sha1, title)
+                return self._known[sha1]
+        finally:
+            with self._lock:
+                self._in_flight.pop(sha1, None)
+            event.set()
+    
+    def remember(self, sha1, title):
+        """Record a file that this run has just uploaded"""
+        with self._lock:
+            if not self._known.get(sha1):
+                self._known[sha1] = title
+    
+    def claim(self, sha1):
+        """Take the right to upload this content; waits for another upload of it in this run
         
-        ttk.Label(config_frame, text="Output File:").grid(row=2, column=0, sticky=tk.W, padx=(0, 5))
-        ttk.Entry(config_frame, textvariable=self.output_file, width=30).grid(row=2, column=1, sticky=(tk.W, tk.E), padx=(0, 10))
+        Returns the title of an existing copy instead when there is one.
+        """
+        while True:
+            with self._lock:
+                if self._known.get(sha1):
+                    return self._known[sha1]
+                event = self._uploading.get(sha1)
+                if event is None:
+                    self._uploading[sha1] = threading.Event()
+                    return None
+            event.wait()
+    
+    def release(self, sha1):
+        """Give up the claim taken by claim()"""
+        with self._lock:
+            event = self._uploading.pop(sha1, None)
+        if event:
+            event.set()
+
+def normalize_file_title(title):
+    """Normalize a file title the way MediaWiki does (underscores, repeated spaces, first letter)"""
+    import re
+    title = re.sub(r'[ _]+', ' ', title).strip()
+    return title[:1].upper() + title[1:]
+
+class TitleAllocator:
+    """Hands out free "Name (n).ext" titles for auto-increment, atomically across workers
+    
+    The first time a title turns out to be taken, every existing title of its
+    series is loaded with one prefix listing (`list_prefix(prefix)` returns
+    the existing titles that start with `prefix`). Free suffixes are then
+    picked locally, so resolving a whole series costs a constant number of
+    API calls. Titles handed out but not yet uploaded are reserved, so two
+    workers never pick the same n.
+    """
+    def __init__(self, resolver, list_prefix, series_ttl=300):
+        self.resolver = resolver
+        self.list_prefix = list_prefix
+        self.series_ttl = series_ttl
+        self._series = {}    # (stem, ext) -> (set of taken n, loaded_at)
+        self._loading = {}   # (stem, ext) -> Event set once the listing is loaded
+        self._reserved = set()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def split_title(title):
+        stem, dot, ext = title.rpartition('.')
+        if not dot:
+            return title, ''
+        return stem, '.' + ext
+    
+    def allocate(self, title):
+        """Reserve and return `title` if it is free, otherwise the first free "stem (n).ext" """
+        key = normalize_file_title(title)
+        if not self.resolver.exists(title):
+            with self._lock:
+                if key not in self._reserved:
+                    self._reserved.add(key)
+                    return title
         
-        ttk.Label(config_frame, text="Parallelization:").grid(row=4, column=0, sticky=tk.W, padx=(0,5))
-        self.num_workers_var = tk.IntVar(value=1)
-        ttk.Entry(config_frame, textvariable=self.num_workers_var, width=5).grid(row=4, column=1, sticky=tk.W, padx=(0,10))
+        stem, ext = self.split_title(title)
+        series_key = (normalize_file_title(stem), ext)
+        taken = self._load_series(series_key)
+        with self._lock:
+            counter = 1
+            while counter in taken or normalize_file_title(f"{stem} ({counter}){ext}") in self._reserved:
+                counter += 1
+            candidate = f"{stem} ({counter}){ext}"
+            self._reserved.add(normalize_file_title(candidate))
+            return candidate
+    
+    def confirm(self, title):
+        """Record that `title` was uploaded"""
+        import re
+        self.resolver.mark_exists(title)
+        key = normalize_file_title(title)
+        stem, ext = self.split_title(key)
+        match = re.match(r'^(.*) \((\d+)\)$', stem)
+        with self._lock:
+            self._reserved.discard(key)
+            if match:
+                series = self._series.get((match.group(1), ext))
+                if series:
+                    series[0].add(int(match.group(2)))
+    
+    def release(self, title):
+        """Give back a title whose upload did not happen"""
+        with self._lock:
+            self._reserved.discard(normalize_file_title(title))
+    
+    def _load_series(self, series_key):
+        """Return the taken suffix numbers of a series, listing it from the wiki if needed"""
+        import re
+        stem, ext = series_key
+        while True:
+            with self._lock:
+                cached = self._series.get(series_key)
+                if cached and time.time() - cached[1] <= self.series_ttl:
+                    return cached[0]
+                event = self._loading.get(series_key)
+                if event is None:
+                    event = self._loading[series_key] = threading.Event()
+                    break
+            # Another worker is listing this series; use its answer
+            event.wait()
         
-        ttk.Label(config_frame, text="Pause Between Retry(s):").grid(row=4, column=2, sticky=tk.W, padx=(10,5))
-        self.pause_seconds_var = tk.IntVar(value=10)
-        ttk.Entry(config_frame, textvariable=self.pause_seconds_var, width=5).grid(row=4, column=3, sticky=tk.W, padx=(0,10))
-        
-        ttk.Label(config_frame, text="Max Retry Attempts:").grid(row=4, column=4, sticky=tk.W, padx=(10,5))
-        self.max_attempts_var = tk.IntVar(value=10)
-        ttk.Entry(config_frame, textvariable=self.max_attempts_var, width=5).grid(row=4, column=5, sticky=tk.W, padx=(0,10))
-        
-        ttk.Label(config_frame, text="Pause After Upload(s):").grid(row=5, column=2, sticky=tk.W, padx=(10,5))
-        self.pause_after_upload_var = tk.DoubleVar(value=0.2)
-        ttk.Entry(config_frame, textvariable=self.pause_after_upload_var, width=5).grid(row=5, column=3, sticky=tk.W, padx=(0,10))
-        
-        ttk.Label(config_frame, text="Ignore Warnings:").grid(row=5, column=0, sticky=tk.W, padx=(0,5))
-        self.ignore_warnings_var = tk.StringVar(value="True")
-        ignore_dropdown = ttk.Combobox(config_frame, textvariable=self.ignore_warnings_var, values=["True", "False"], width=5, state="readonly")
-        ignore_dropdown.grid(row=5, column=1, sticky=tk.W, padx=(0,10))
+        try:
+            pattern = re.compile(r'^' + re.escape(stem) + r' \((\d+)\)' + re.escape(ext) + '$')
+            taken = set()
+            for existing in self.list_prefix(f"{stem} ("):
+                match = pattern.match(normalize_file_title(existing))
+                if match:
+                    taken.add(int(match.group(1)))
+            with self._lock:
+                self._series[series_key] = (taken, time.time())
+            return taken
+        finally:
+            with self._lock:
+                self._loading.pop(series_key, None)
+            event.set()
 
-        ttk.Label(config_frame, text="Internet Status:").grid(row=3, column=0, sticky=tk.W, padx=(0, 5))
-        self.internet_status_label = ttk.Label(config_frame, textvariable=self.internet_status, foreground="gray")
-        self.internet_status_label.grid(row=3, column=1, sticky=tk.W, padx=(0, 10))
-        
-        config_frame.columnconfigure(1, weight=1)
-        
-        button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
-        
-        self.start_btn = ttk.Button(button_frame, text="Start Upload", command=self.start_upload)
-        self.start_btn.pack(side=tk.LEFT, padx=(0, 5))
-        
-        self.pause_btn = ttk.Button(button_frame, text="Pause", command=self.pause_upload, state=tk.DISABLED)
-        self.pause_btn.pack(side=tk.LEFT, padx=(0, 5))
-        
-        self.stop_btn = ttk.Button(button_frame, text="Stop", command=self.stop_upload, state=tk.DISABLED)
-        self.stop_btn.pack(side=tk.LEFT, padx=(0, 5))
-        
-        self.test_connection_btn = ttk.Button(button_frame, text="Test Connection", command=lambda: self.test_internet_connection(show_success=True))
-        self.test_connection_btn.pack(side=tk.LEFT, padx=(0, 5))
+class UploadVerifier:
+    """Checks finished uploads against the wiki in batches, away from the upload slots
+    
+    Uploads are queued with add() and checked `batch_size` at a time on a
+    single background thread; flush() checks the rest and waits.
+    `query_file_info(titles)` returns {title: {'sha1', 'size', 'text'}} for
+    the titles that exist, and `on_verified(result)` is called once a
+    result's 'verification' field has been filled in.
+    """
+    def __init__(self, query_file_info, on_verified, batch_size=50):
+        self.query_file_info = query_file_info
+        self.on_verified = on_verified
+        self.batch_size = batch_size
+        self._pending = []   # (result, expected_wikitext)
+        self._futures = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pypan-verify')
+    
+    def add(self, result, expected_wikitext):
+        """Queue a successful upload; a full batch is checked right away"""
+        with self._lock:
+            self._pending.append((result, expected_wikitext))
+            if len(self._pending) < self.batch_size:
+                return
+            batch, self._pending = self._pending, []
+            self._futures.append(self._executor.submit(self._verify_batch, batch))
+    
+    def flush(self):
+        """Check every queued upload and wait until all batches are done"""
+        with self._lock:
+            if self._pending:
+                batch, self._pending = self._pending, []
+                self._futures.append(self._executor.submit(self._verify_batch, batch))
+            futures, self._futures = self._futures, []
+        wait(futures)
+        self._executor.shutdown(wait=True)
+    
+    def _verify_batch(self, batch):
+        try:
+            file_info = self.query_file_info([result['target_filename'] for result, _ in batch])
+            error = None
+        except Exception as e:
+            file_info = {}
+            error = str(e)
+        for result, expected_wikitext in batch:
+            if error:
+                result['verification'] = f"Not OK: Could not get file info - {error}"
+            else:
+                result['verification'] = self.compare(file_info.get(result['target_filename']), result.get('sha1'), expected_wikitext)
+            self.on_verified(result)
+    
+    @staticmethod
+    def compare(info, sha1, expected_wikitext):
+        """Verification text for one upload: hashes must match exactly, then the wikitext"""
+        if not info:
+            return "Not OK: File not found on the wiki"
+        if not sha1:
+            return "Not OK: No local hash to compare"
+        if info.get('sha1') != sha1:
+            return f"Not OK: SHA-1 mismatch (original: {sha1}, uploaded: {info.get('sha1')})"
+        # Remove category added by pypan for comparison
+        expected_clean = expected_wikitext.replace("\n[[Category: Uploaded with pypan]]", "")
+        uploaded_clean = (info.get('text') or '').replace("[[Category: Uploaded with pypan]]", "")
+        if expected_clean.strip() != uploaded_clean.strip():
+            return "Not OK: Wikitext mismatch"
+        return "Verified"
+
+class PrefetchGate:
+    """Paces remote downloads ahead of the uploads
+    
+    A download may start when its row is at most `lookahead` rows past the
+    oldest row still in the pipeline, and while downloaded files waiting for
+    upload take less than `disk_budget` bytes. The oldest row is always let
+    through, so the pipeline cannot stall on its own budget.
+    """
+    def __init__(self, lookahead, disk_budget):
+        self.lookahead = lookahead
+        self.disk_budget = disk_budget
+        self._pending = set()
+        self._held = {}   # row -> bytes downloaded and not yet uploaded
+        self._cond = threading.Condition()
+    
+    def add(self, row_index):
+        with self._cond:
+            self._pending.add(row_index)
+    
+    def finish(self, row_index):
+        """The row left the pipeline; its files are gone"""
+        with self._cond:
+            self._pending.discard(row_index)
+            self._held.pop(row_index, None)
+            self._cond.notify_all()
+    
+    def hold(self, row_index, size):
+        """Count a finished download against the disk budget"""
+        with self._cond:
+            self._held[row_index] = self._held.get(row_index, 0) + size
+    
+    def wait_turn(self, row_index, should_continue, poll=0.5):
+        """Block until the row may download; returns False if should_continue() turns False first"""
+        with self._cond:
+            while should_continue():
+                oldest = min(self._pending, default=row_index)
+                if row_index == oldest:
+                    return True
+                if row_index - oldest <= self.lookahead and sum(self._held.values()) < self.disk_budget:
+                    return True
+                self._cond.wait(poll)
+            return False
+
+class UploadPipeline:
+    """Fetch -> convert -> upload stages, each running on its own worker pool
+    
+    Network downloads, CPU-bound video conversion and API uploads are sized
+    independently, so a slow encode never holds an upload slot. submit()
+    returns a Future that resolves to the row's result dict once the job
+    leaves the pipeline; how many jobs are inside at once is bounded by the
+    caller's submission window.
+    """
+    def __init__(self, engine, download_workers, convert_workers, upload_workers, prefetch_gate=None):
+        self.engine = engine
+        self.prefetch_gate = prefetch_gate
+        self.fetch_pool = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix='pypan-fetch')
+        self.convert_pool = ThreadPoolExecutor(max_workers=convert_workers, thread_name_prefix='pypan-convert')
+        self.upload_pool = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix='pypan-upload')
+    
+    def submit(self, row_data, row_index):
+        job = self.engine.new_upload_job(row_data, row_index)
+        outcome = Future()
+        if self.prefetch_gate:
+            self.prefetch_gate.add(row_index)
+            outcome.add_done_callback(lambda f: self.prefetch_gate.finish(row_index))
+        self._run_stage(self.fetch_pool, self.engine.stage_fetch, job, outcome)
+        return outcome
+    
+    def _run_stage(self, pool, stage, job, outcome):
+        future = pool.submit(stage, job)
+        future.add_done_callback(lambda f: self._advance(stage, job, outcome, f))
+    
+    def _advance(self, stage, job, outcome, future):
+        """Hand a job to the next stage, or resolve its outcome when it is done"""
+        try:
+            result = future.result()
+        except Exception as e:
+            self.engine.cleanup_job_files(job)
+            result = self.engine.make_result(job, 'Failed', f'Exception: {str(e)}')
         
-        self.clear_btn = ttk.Button(button_frame, text="Reset", command=self.clear_reset)
-        self.clear_btn.pack(side=tk.LEFT, padx=(0, 5))
+        try:
+            if result is None:
+                if stage == self.engine.stage_fetch and job['needs_conversion']:
+                    self._run_stage(self.convert_pool, self.engine.stage_convert, job, outcome)
+                    return
+                if stage != self.engine.stage_upload:
+                    self._run_stage(self.upload_pool, self.engine.stage_upload, job, outcome)
+                    return
+            outcome.set_result(result)
+        except Exception as e:
+            self.engine.cleanup_job_files(job)
+            outcome.set_result(self.engine.make_result(job, 'Failed', f'Exception: {str(e)}'))
+    
+    def shutdown(self, wait=True):
+        for pool in (self.fetch_pool, self.convert_pool, self.upload_pool):
+            pool.shutdown(wait=wait)
+
+def find_ffmpeg():
+    """Path of the ffmpeg binary moviepy uses (imageio-ffmpeg), else the one on PATH"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which('ffmpeg')
+
+def probe_media(input_path):
+    """Return {'streams': [(codec_type, codec_name), ...], 'duration': seconds or None} for a media file
+    
+    Uses ffprobe when installed, otherwise parses what `ffmpeg -i` prints.
+    Returns None if the file cannot be probed.
+    """
+    import re
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe:
+        completed = subprocess.run(
+            [ffprobe, '-v', 'error', '-show_entries', 'stream=codec_type,codec_name:format=duration', '-of', 'json', input_path],
+            capture_output=True, text=True, timeout=60, creationflags=SUBPROCESS_FLAGS)
+        if completed.returncode != 0:
+            return None
+        info = json.loads(completed.stdout or '{}')
+        duration = (info.get('format') or {}).get('duration')
+        return {
+            'streams': [(stream.get('codec_type'), stream.get('codec_name')) for stream in info.get('streams', [])],
+            'duration': float(duration) if duration not in (None, 'N/A') else None,
+        }
+    
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        return None
+    # Without an output file ffmpeg exits with an error after printing the input's streams
+    completed = subprocess.run([ffmpeg, '-hide_banner', '-i', input_path],
+                               capture_output=True, text=True, errors='replace', timeout=60, creationflags=SUBPROCESS_FLAGS)
+    streams = re.findall(r'Stream #\d+:\d+\S*: (\w+): (\w+)', completed.stderr)
+    if not streams:
+        return None
+    match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', completed.stderr)
+    return {
+        'streams': [(codec_type.lower(), codec_name.lower()) for codec_type, codec_name in streams],
+        'duration': int(match.group(1)) * 3600 + int(match.group(2)) * 60 + float(match.group(3)) if match else None,
+    }
+
+def is_webm_compatible(streams):
+    """True when every audio/video stream already uses a codec WebM on Commons allows"""
+    video = [codec for codec_type, codec in streams if codec_type == 'video']
+    audio = [codec for codec_type, codec in streams if codec_type == 'audio']
+    return (bool(video) and all(codec in WEBM_VIDEO_CODECS for codec in video)
+            and all(codec in WEBM_AUDIO_CODECS for codec in audio))
+
+def webm_remux_args(ffmpeg, input_path, output_path):
+    """ffmpeg arguments that copy the audio and video streams unchanged into a WebM container"""
+    # Subtitles, attachments and data streams are left out; WebM cannot hold most of them
+    return [ffmpeg, '-y', '-nostdin', '-v', 'error', '-i', input_path, '-map', '0:v', '-map', '0:a?',
+            '-c', 'copy', '-progress', 'pipe:1', '-nostats', '-f', 'webm', output_path]
+
+def webm_encode_args(ffmpeg, input_path, output_path, preset, threads, audio_codec='libopus'):
+    """ffmpeg arguments that encode the first video and audio stream to VP9 + `audio_codec` WebM"""
+    settings = ENCODER_PRESETS[preset]
+    args = [ffmpeg, '-y', '-nostdin', '-v', 'error', '-i', input_path, '-map', '0:v:0', '-map', '0:a:0?',
+            '-c:v', 'libvpx-vp9', '-pix_fmt', 'yuv420p',
+            '-deadline', settings['deadline'], '-cpu-used', str(settings['cpu_used']),
+            '-row-mt', '1' if settings['row_mt'] else '0', '-tile-columns', str(settings['tile_columns']),
+            '-threads', str(threads)]
+    if settings['crf'] is not None:
+        # Constant quality mode needs the bitrate limit switched off
+        args += ['-crf', str(settings['crf']), '-b:v', '0']
+    else:
+        args += ['-b:v', settings['bitrate']]
+    return args + ['-c:a', audio_codec, '-b:a', '128k', '-ar', '48000',
+                   '-progress', 'pipe:1', '-nostats', '-f', 'webm', output_path]
+
+class FfmpegJob:
+    """One ffmpeg run that reports its progress and can be cancelled at any time
+    
+    ffmpeg writes `-progress` key=value blocks to stdout; a reader thread
+    keeps the latest values, from which the percentage done, the encode
+    speed and the time left follow given the source's `duration` in seconds.
+    """
+    def __init__(self, args, duration=None):
+        self.args = args
+        self.duration = duration
+        self.frames = 0
+        self.fps = None
+        self.out_seconds = 0.0
+        self.started = None
+        self.process = None
+        self.cancelled = False
+        self._reader = None
+        self._stderr = None
+    
+    def start(self):
+        self._stderr = tempfile.TemporaryFile()
+        self.started = time.monotonic()
+        self.process = subprocess.Popen(self.args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                        stderr=self._stderr, text=True, errors='replace',
+                                        creationflags=SUBPROCESS_FLAGS)
+        self._reader = threading.Thread(target=self._read_progress, name='pypan-ffmpeg-progress', daemon=True)
+        self._reader.start()
+    
+    def _read_progress(self):
+        for line in self.process.stdout:
+            key, _, value = line.strip().partition('=')
+            try:
+                if key == 'frame':
+                    self.frames = int(value)
+                elif key == 'fps':
+                    self.fps = float(value) or None
+                elif key == 'out_time_us':
+                    self.out_seconds = max(0, int(value)) / 1000000
+            except ValueError:
+                pass
+    
+    @property
+    def percent(self):
+        if not self.duration:
+            return None
+        return min(100.0, 100.0 * self.out_seconds / self.duration)
+    
+    def remaining_seconds(self):
+        """Estimated seconds until ffmpeg is done, from the speed so far; None before it is known"""
+        if not self.duration or not self.out_seconds:
+            return None
+        elapsed = time.monotonic() - self.started
+        return max(0.0, (self.duration - self.out_seconds) * elapsed / self.out_seconds)
+    
+    def cancel(self):
+        """Stop ffmpeg: terminate, then kill if it has not exited within half a second"""
+        if self.process and self.process.poll() is None:
+            self.cancelled = True
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=0.5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+    
+    def wait(self, should_stop=None, on_progress=None, interval=0.25):
+        """Wait for ffmpeg to finish, polling `should_stop` every `interval` seconds
         
-        progress_frame = ttk.LabelFrame(main_frame, text="Progress", padding="10")
-        progress_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        Returns True when it succeeded and False when it was cancelled;
+        raises RuntimeError with ffmpeg's last error line when it failed.
+        """
+        try:
+            while self.process.poll() is None:
+                if should_stop and should_stop():
+                    self.cancel()
+                    return False
+                if on_progress:
+                    on_progress(self)
+                try:
+                    self.process.wait(timeout=interval)
+                except subprocess.TimeoutExpired:
+                    pass
+            self._reader.join(timeout=1)
+            if self.cancelled:
+                return False
+            if self.process.returncode != 0:
+                self._stderr.seek(0)
+                lines = self._stderr.read().decode('utf-8', 'replace').strip().splitlines()
+                raise RuntimeError(lines[-1] if lines else f"ffmpeg exited with {self.process.returncode}")
+            return True
+        finally:
+            if self.process.poll() is None:
+                self.cancel()
+            self._stderr.close()
+
+class TranscodeService:
+    """Runs VP9 encodes as ffmpeg subprocesses within a CPU thread budget
+    
+    At most `max_jobs` encodes run at once and they share `cpu_threads`
+    encoder threads, so one conversion gets the whole machine and several
+    never oversubscribe it. Encoding happens outside the uploader's process,
+    and a running encode can be cancelled at any time.
+    """
+    def __init__(self, max_jobs, cpu_threads=TRANSCODE_CPU_THREADS):
+        self.max_jobs = max(1, max_jobs)
+        self.threads_per_job = max(1, cpu_threads // self.max_jobs)
+        self._slots = threading.Semaphore(self.max_jobs)
+        self._jobs = set()
+        self._lock = threading.Lock()
+    
+    def encode(self, input_path, output_path, preset=DEFAULT_ENCODER_PRESET, duration=None,
+               should_stop=None, on_start=None, on_progress=None):
+        """Encode a video to WebM; returns {'audio_codec', 'fps'}, or None if cancelled
         
-        self.progress_var = tk.DoubleVar()
-        self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100)
-        self.progress_bar.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 5))
+        The audio codec is libvorbis when the ffmpeg build lacks libopus, and
+        fps is the encode speed in frames per second. `on_start(job)` is
+        called with each FfmpegJob once it runs. Raises RuntimeError on failure.
+        """
+        ffmpeg = find_ffmpeg()
+        if not ffmpeg:
+            raise RuntimeError("ffmpeg not found")
+        with self._slots:
+            for audio_codec in ('libopus', 'libvorbis'):
+                job = FfmpegJob(webm_encode_args(ffmpeg, input_path, output_path, preset, self.threads_per_job, audio_codec), duration)
+                with self._lock:
+                    self._jobs.add(job)
+                try:
+                    job.start()
+                    if on_start:
+                        on_start(job)
+                    if not job.wait(should_stop, on_progress):
+                        return None
+                    elapsed = time.monotonic() - job.started
+                    return {'audio_codec': audio_codec, 'fps': job.frames / elapsed if job.frames and elapsed > 0 else None}
+                except RuntimeError as e:
+                    # libopus not available in this ffmpeg build, fall back to libvorbis
+                    if audio_codec != 'libopus' or 'libopus' not in str(e):
+                        raise
+                finally:
+                    with self._lock:
+                        self._jobs.discard(job)
+    
+    def cancel_all(self):
+        """Stop every running encode"""
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.cancel()
+    
+    def shutdown(self):
+        self.cancel_all()
+
+def congestion_reason(error):
+    """Name the server-load signal in an API or HTTP error (maxlag, throttling, 5xx), or None"""
+    import re
+    code = getattr(error, 'code', None)
+    if code in ('maxlag', 'ratelimited', 'actionthrottled', 'throttled-upload'):
+        return code
+    if type(error).__name__ in ('MaxlagTimeoutError', 'TimeoutError') and 'maxlag' in str(error).lower():
+        return 'maxlag'
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status == 429:
+        return 'HTTP 429'
+    if isinstance(status, int) and status >= 500:
+        return f'HTTP {status}'
+    if type(error).__name__ == 'ServerError':
+        return 'server error'
+    text = str(error)
+    if 'maxlag' in text.lower():
+        return 'maxlag'
+    if 'ratelimited' in text or 'Too Many Requests' in text or re.search(r'\bHTTP (error )?429\b', text):
+        return 'HTTP 429'
+    match = re.search(r'\b(50[0-4])\b.*?(Server Error|Bad Gateway|Service Unavailable|Gateway Time-?out)', text, re.IGNORECASE)
+    if match:
+        return f'HTTP {match.group(1)}'
+    return None
+
+RETRY_PERMANENT = 'permanent'
+RETRY_RATE_LIMITED = 'rate_limited'
+RETRY_TRANSIENT = 'transient'
+
+class RetryPolicy:
+    """Decides whether and when a failed attempt is tried again
+    
+    Errors are classified as permanent (retrying cannot help), rate_limited
+    (the server asked us to slow down) or transient (anything else). Delays
+    grow exponentially from `base_delay` up to `max_delay`, with jitter so
+    workers that failed together do not retry together; rate-limited errors
+    start from a longer delay. At most `budget` retries are made per run,
+    and `counts` keeps the number of retries per class.
+    """
+    def __init__(self, base_delay=10, max_delay=RETRY_MAX_DELAY, budget=RETRY_BUDGET, rate_limit_factor=3):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.rate_limit_factor = rate_limit_factor
+        self.counts = {RETRY_TRANSIENT: 0, RETRY_RATE_LIMITED: 0}
+        self.permanent_failures = 0
+        self._used = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def classify(error):
+        """Return the retry class of an exception; None stands for a failure without one"""
+        if error is None:
+            return RETRY_TRANSIENT
+        reason = congestion_reason(error)
+        if reason and not reason.startswith('HTTP 5') and reason != 'server error':
+            return RETRY_RATE_LIMITED
+        if getattr(error, 'code', None) in PERMANENT_API_CODES:
+            return RETRY_PERMANENT
+        if isinstance(error, (FileNotFoundError, IsADirectoryError, PermissionError)):
+            return RETRY_PERMANENT
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+        if isinstance(status, int) and 400 <= status < 500 and status not in (408, 425, 429):
+            return RETRY_PERMANENT
+        return RETRY_TRANSIENT
+    
+    @property
+    def exhausted(self):
+        return self.budget is not None and self._used >= self.budget
+    
+    def should_retry(self, error_class, attempt, max_attempts, row_counts=None):
+        """Take a retry from the budget if this attempt may be repeated"""
+        with self._lock:
+            if error_class == RETRY_PERMANENT:
+                self.permanent_failures += 1
+                return False
+            if attempt + 1 >= max_attempts or self.exhausted:
+                return False
+            self._used += 1
+            self.counts[error_class] += 1
+            if row_counts is not None:
+                row_counts[error_class] = row_counts.get(error_class, 0) + 1
+            return True
+    
+    def delay(self, error_class, attempt):
+        """Capped exponential backoff with jitter, in seconds"""
+        import random
+        base = self.base_delay * (self.rate_limit_factor if error_class == RETRY_RATE_LIMITED else 1)
+        ceiling = min(self.max_delay, base * (2 ** attempt))
+        # Keep half of the delay and randomize the other half
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+    
+    def summary(self):
+        return (f"{self.counts[RETRY_TRANSIENT]} transient, {self.counts[RETRY_RATE_LIMITED]} rate-limited, "
+                f"{self.permanent_failures} permanent errors not retried")
+
+class ConcurrencyController:
+    """AIMD limit on how many uploads run at once
+    
+    Starts with `initial` slots and adds one each time a full round of
+    uploads (one per slot) finishes at least as fast as the round before;
+    a maxlag, throttling or 5xx error halves it, at most once per
+    `cooldown` seconds so one burst of errors counts once. `limit` and
+    `last_reason` say what the limit is and why it last changed;
+    `on_change(limit, reason)` is called whenever it does.
+    """
+    def __init__(self, max_limit, initial=1, min_limit=1, on_change=None, cooldown=10):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = min(max(initial, min_limit), self.max_limit)
+        self.last_reason = 'initial'
+        self.on_change = on_change
+        self.cooldown = cooldown
+        self._active = 0
+        self._round_done = 0
+        self._round_started = time.time()
+        self._last_rate = 0.0
+        self._last_decrease = 0
+        self._cond = threading.Condition()
+    
+    def acquire(self, should_continue, poll=0.5):
+        """Block until a slot is free; returns False if should_continue() turns False first"""
+        with self._cond:
+            while self._active >= self.limit:
+                if not should_continue():
+                    return False
+                self._cond.wait(poll)
+            self._active += 1
+            return True
+    
+    def release(self):
+        """Free a slot taken with acquire()"""
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+    
+    def record_success(self):
+        """Additive increase: one more slot after each round that kept up its throughput"""
+        with self._cond:
+            self._round_done += 1
+            if self._round_done < self.limit:
+                return
+            now = time.time()
+            rate = self._round_done / max(now - self._round_started, 1e-6)
+            improved = rate >= self._last_rate * 0.95
+            self._last_rate = rate
+            self._round_done = 0
+            self._round_started = now
+            if not improved or self.limit >= self.max_limit:
+                return
+            self.limit += 1
+            self.last_reason = f'throughput {rate:.2f} uploads/s'
+            self._cond.notify_all()
+            limit, reason = self.limit, self.last_reason
+        if self.on_change:
+            self.on_change(limit, reason)
+    
+    def record_error(self, error):
+        """Multiplicative decrease when an error says the server is overloaded"""
+        reason = congestion_reason(error)
+        if not reason:
+            return
+        with self._cond:
+            now = time.time()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit // 2)
+            self.last_reason = reason
+            # Measure the next rounds afresh at the lower limit
+            self._round_done = 0
+            self._round_started = now
+            self._last_rate = 0.0
+            limit = self.limit
+        if self.on_change:
+            self.on_change(limit, reason)
+
+class ConnectivityMonitor:
+    """Shared connectivity state, kept fresh by one background thread
+    
+    `probe()` returns True when the network is usable. Its answer is cached
+    for `ttl` seconds; while offline the thread probes again every
+    `retry_interval` seconds, and workers blocked in wait_online() are
+    woken through an Event as soon as the connection is back.
+    `on_change(online)` is called only when the state flips.
+    """
+    def __init__(self, probe, on_change=None, ttl=30, retry_interval=5):
+        self.probe = probe
+        self.on_change = on_change
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._online = threading.Event()
+        self._online.set()
+        self._state = None
+        self._checked_at = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """Start the background probe thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='pypan-connectivity', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background probe thread"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+    
+    def is_online(self):
+        """Return the cached state; a stale state is refreshed (in the background if running)"""
+        if time.time() - self._checked_at > self.ttl:
+            if self._thread and self._thread.is_alive():
+                self._wake.set()
+            else:
+                self.refresh()
+        return self._online.is_set()
+    
+    def report_failure(self):
+        """A worker saw a network error: probe again now instead of waiting for the TTL"""
+        self._checked_at = 0
+        self._wake.set()
+    
+    def wait_online(self, should_continue, poll=0.5):
+        """Block until the connection is back; returns False if should_continue() turns False first"""
+        while should_continue():
+            if self._online.wait(poll):
+                return True
+        return False
+    
+    def refresh(self):
+        """Run the probe now and update the shared state"""
+        with self._lock:
+            try:
+                online = bool(self.probe())
+            except Exception:
+                online = False
+            self._checked_at = time.time()
+            changed = online != self._state
+            self._state = online
+            if online:
+                self._online.set()
+            else:
+                self._online.clear()
+        if self.on_change and changed:
+            self.on_change(online)
+        return online
+    
+    def _run(self):
+        self.refresh()
+        while not self._stopped.is_set():
+            self._wake.wait(self.ttl if self._online.is_set() else self.retry_interval)
+            self._wake.clear()
+            if not self._stopped.is_set():
+                self.refresh()
+
+class UploadEngine:
+    """GUI-free batch upload engine, driven by the Tk window or the command line"""
+    def __init__(self, config_dir=CONFIG_DIR):
+        self.config_dir = config_dir
+        self.user_config_path = os.path.join(config_dir, 'user-config.py')
+        self.password_file_path = os.path.join(config_dir, 'user-password.py')
         
-        self.status_label = ttk.Label(progress_frame, text="Ready")
-        self.status_label.grid(row=1, column=0, sticky=tk.W)
+        # Run settings (plain values so no Tk variables are needed)
+        self.input_file = ""
+        self.output_file = "upload_results.xlsx"
+        # Results file a run writes to, picked when it starts; None writes output_file itself
+        self.output_path = None
+        # Whether the manifest's fourth column is the encoder preset, and preset names already warned about
+        self.preset_column = False
+        self.unknown_presets = set()
+        self.family = "commons"
+        self.mylang = "commons"
+        self.num_workers = 1
+        # Pipeline stage pools: URL/YouTube downloads and video conversions
+        self.download_workers = 2
+        self.convert_workers = 1
+        # Encoder threads the conversions share (see TranscodeService)
+        self.transcode_threads = TRANSCODE_CPU_THREADS
+        self.transcoder = None
+        # Running ffmpeg jobs (FfmpegJob -> source file name), shown as conversion progress
+        self.active_conversions = {}
+        self.conversions_lock = threading.Lock()
+        self.last_conversion_report = 0
+        # ENCODER_PRESETS name for rows whose manifest does not pick one
+        self.encoder_preset = DEFAULT_ENCODER_PRESET
+        self.max_attempts = 10
+        self.pause_seconds = 10
+        self.pause_after_upload = 0.2
+        self.ignore_warnings = True
+        # Continue the journal of a previous run instead of starting over
+        self.resume_previous = False
+        # Hash each file and skip it if Commons already has the same content
+        self.skip_duplicates = True
+        self.retry_budget = RETRY_BUDGET
+        # How far ahead of the uploads remote sources are downloaded
+        self.prefetch_rows = PREFETCH_ROWS
+        self.prefetch_disk_budget = PREFETCH_DISK_BUDGET
+        self.prefetch_gate = None
+        self.retry_policy = RetryPolicy(self.pause_seconds, budget=self.retry_budget)
         
-        self.stats_label = ttk.Label(progress_frame, text="Files: 0/0 | Success: 0 | Failed: 0")
-        self.stats_label.grid(row=2, column=0, sticky=tk.W)
+        self.username = None
+        self.password = None
+        self.is_running = False
+        self.is_paused = False
+        self.total_files = 0
+        # False while the manifest is still being streamed and total_files may grow
+        self.manifest_complete = True
+        self.processed_files = 0
+        # Rows finished since start_time; processed_files also counts rows a resume loaded
+        self.processed_this_run = 0
+        self.successful_uploads = 0
+        self.failed_uploads = 0
+        self.start_time = None
+        self.site = None
+        self.title_resolver = None
+        self.title_allocator = None
+        self.duplicate_finder = None
+        self.verifier = None
+        self.upload_slots = None
         
-        self.time_label = ttk.Label(progress_frame, text="Time: 00:00:00 | ETA: --:--:--")
-        self.time_label.grid(row=3, column=0, sticky=tk.W)
+        self.results = []
+        self.results_lock = threading.Lock()
+        self.journal = None
+        self.completed_rows = set()
+        # Parsed manifest, keyed by path and validated by (mtime, size)
+        self.manifest_cache = {}
+        self.manifest_cache_lock = threading.Lock()
+        self.stop_event = threading.Event()
         
-        progress_frame.columnconfigure(0, weight=1)
+        # Front-end hooks: on_log(formatted_message, level), on_progress(), on_internet_status(status)
+        self.on_log = None
+        self.on_progress = None
+        self.on_internet_status = None
         
-        log_frame = ttk.LabelFrame(main_frame, text="Log", padding="10")
-        log_frame.grid(row=3, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        # Downloaded sources are kept between runs; a size of 0 turns the cache off
+        self.download_cache_dir = DOWNLOAD_CACHE_DIR
+        self.download_cache_size = DOWNLOAD_CACHE_MAX_BYTES
+        self.download_cache = None
+        # Converted videos are kept the same way, so a retried or re-run row skips the encode
+        self.conversion_cache_dir = CONVERSION_CACHE_DIR
+        self.conversion_cache_size = CONVERSION_CACHE_MAX_BYTES
+        self.conversion_cache = None
         
-        self.log_text = tk.Text(log_frame, height=15, wrap=tk.WORD)
-        scrollbar = ttk.Scrollbar(log_frame, orient=tk.VERTICAL, command=self.log_text.yview)
-        self.log_text.configure(yscrollcommand=scrollbar.set)
+        self.wayback = WaybackResolver(self.query_wayback_snapshot, is_online=self.test_internet_connection)
+        # Small downloads stay in memory up to this size; 0 always uses temp files
+        self.spool_max_bytes = SPOOL_MAX_BYTES
         
-        self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        # Downloads share keep-alive connections; resized to the worker counts in run()
+        self.http = make_http_session(self.download_workers + self.num_workers)
         
-        log_frame.columnconfigure(0, weight=1)
-        log_frame.rowconfigure(0, weight=1)
+        # One shared connectivity check instead of probing on every upload attempt
+        self.connectivity = ConnectivityMonitor(self.probe_connectivity, self.connectivity_changed)
         
-        main_frame.columnconfigure(0, weight=1)
-        main_frame.rowconfigure(3, weight=1)
-        self.root.columnconfigure(0, weight=1)
-        self.root.rowconfigure(0, weight=1)
+        self.logger = logging.getLogger(__name__)
+
+    def check_external_dependencies(self):
+        """Check for external dependencies and warn user"""
+        missing = []
         
-    def show_login_window(self):
-        """Show login dialog"""
-        login_window = tk.Toplevel(self.root)
-        login_window.title("Wikimedia - Login")
-        login_window.geometry("400x275")
-        login_window.resizable(False, False)
-        login_window.transient(self.root)
-        login_window.grab_set()
+        # Check for yt-dlp 
+        if not YT_DLP_AVAILABLE:
+            missing.append("yt-dlp (for YouTube downloads)")
         
-        # Center window
-        login_window.update_idletasks()
-        width = login_window.winfo_width()
-        height = login_window.winfo_height()
-        x = (login_window.winfo_screenwidth() // 2) - (width // 2)
-        y = (login_window.winfo_screenheight() // 2) - (height // 2)
-        login_window.geometry(f'{width}x{height}+{x}+{y}')
+        # Check for ffmpeg (bundled with moviepy)
+        if not find_ffmpeg():
+            missing.append("moviepy or ffmpeg (for video conversion)")
         
-        main_frame = ttk.Frame(login_window, padding="20")
-        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        if missing:
+            msg = "Optional dependencies not found:\n\n" + "\n".join(f"• {m}" for m in missing)
+            msg += "\n\nSome features may not work without these libraries."
+            msg += "\nInstall via: pip install yt-dlp moviepy"
+            self.log_message(msg, "WARNING")    
+    
+    def cleanup_config_files(self):
+        """Delete config files and extra pywikibot artifacts in the config directory"""
+        try:
+            # removing user-config and password files
+            for p in (self.user_config_path, self.password_file_path):
+                try:
+                    if os.path.exists(p):
+                        os.remove(p)
+                except Exception as e:
+                    print(f"Warning: could not remove {p}: {e}")
+
+            # removing apicache directory
+            apicache_dir = os.path.join(self.config_dir, 'apicache')
+            try:
+                if os.path.isdir(apicache_dir):
+                    shutil.rmtree(apicache_dir, ignore_errors=True)
+            except Exception as e:
+                print(f"Warning: could not remove apicache dir {apicache_dir}: {e}")
+
+            # removing throttle control file
+            throttle_path = os.path.join(self.config_dir, 'throttle.ctrl')
+            try:
+                if os.path.exists(throttle_path):
+                    os.remove(throttle_path)
+            except Exception as e:
+                print(f"Warning: could not remove {throttle_path}: {e}")
+
+            # removing lwp file
+            try:
+                uname = getattr(self, 'username', '') or ''
+                lwp_name = f"pywikibot-{uname.replace(' ', '_')}.lwp"
+                lwp_path = os.path.join(self.config_dir, lwp_name)
+                if os.path.exists(lwp_path):
+                    os.remove(lwp_path)
+            except Exception as e:
+                print(f"Warning: could not remove lwp file: {e}")
+
+            # removing upload_log.txt
+            try:
+                log_path = os.path.join(self.config_dir, 'upload_log.txt')
+                if os.path.exists(log_path):
+                    os.remove(log_path)
+            except Exception as e:
+                print(f"Warning: could not remove upload_log.txt: {e}")
+
+        except Exception as e:
+            print(f"Warning: cleanup_config_files failed: {e}")
         
-        title_label = ttk.Label(main_frame, text="Wikimedia Login", 
-                               font=('Arial', 14, 'bold'))
-        title_label.grid(row=0, column=0, columnspan=3, pady=(0, 20))
-        
-        ttk.Label(main_frame, text="Username:").grid(row=1, column=0, sticky=tk.W, pady=5)
-        username_var = tk.StringVar()
-        username_entry = ttk.Entry(main_frame, textvariable=username_var, width=30)
-        username_entry.grid(row=1, column=1, columnspan=2, sticky=(tk.W, tk.E), pady=5)
-        username_entry.focus()
-        
-        ttk.Label(main_frame, text="Password:").grid(row=2, column=0, sticky=tk.W, pady=5)
-        password_var = tk.StringVar()
-        show_password_var = tk.BooleanVar(value=False)
-        password_entry = ttk.Entry(main_frame, textvariable=password_var, show="●", width=30)
-        password_entry.grid(row=2, column=1, sticky=(tk.W, tk.E), pady=5)
-        
-        def toggle_password():
-            if show_password_var.get():
-                password_entry.config(show="●")
-                show_password_var.set(False)
-            else:
-                password_entry.config(show="")
-                show_password_var.set(True)
-        
-        eye_button = ttk.Button(main_frame, text="👁", width=3, command=toggle_password)
-        eye_button.grid(row=2, column=2, sticky=tk.W, padx=(5, 0), pady=5)
-        
-        status_label = ttk.Label(main_frame, text="", font=('Arial', 9), foreground='red')
-        status_label.grid(row=3, column=0, columnspan=3, pady=(5, 10))
-        
-        info_frame = ttk.Frame(main_frame)
-        info_frame.grid(row=4, column=0, columnspan=3, pady=(0, 20))
-        
-        ttk.Label(info_frame, text="Enter your Wikimedia credentials", 
-                 font=('Arial', 8), foreground='gray').pack()
-        
-        creds_frame = ttk.Frame(info_frame)
-        creds_frame.pack()
-        ttk.Label(creds_frame, text="Use ", font=('Arial', 8), foreground='gray').pack(side=tk.LEFT)
-        
-        def open_bot_password():
-            import webbrowser
-            webbrowser.open("https://commons.wikimedia.org/wiki/Special:BotPasswords")
-        
-        bot_link = ttk.Button(creds_frame, text="bot password", command=open_bot_password, 
-                             style='Link.TButton', cursor='hand2')
-        bot_link.pack(side=tk.LEFT)
-        ttk.Label(creds_frame, text=" if you have 2FA enabled", 
-                 font=('Arial', 8), foreground='gray').pack(side=tk.LEFT)
-        
-        def do_login():
-            username = username_var.get().strip()
-            password = password_var.get().strip()
-            
-            if not username or not password:
-                status_label.config(text="Please enter both username and password", foreground='red')
-                return
-            
-            status_label.config(text="Logging in...", foreground='blue')
-            login_window.update()
-            
-            # Create config files
-            if self.create_config_files(username, password):
-                # Try to initialize pywikibot
-                if self.test_login():
-                    self.username = username
-                    self.password = password
-                    self.is_logged_in = True
-                    family = self.family_var.get()
-                    mylang = self.mylang_var.get()
-                    self.login_status_var.set(f"Logged in as {username}")
-                    self.login_status_label.config(foreground='green')
-                    self.login_btn.config(text="Logout", command=self.do_logout)
-                    self.log_message(f"Successfully logged in as {username} to {mylang}.{family}")
-                    login_window.destroy()
-                else:
-                    status_label.config(text="Login failed! Please check credentials and try again.", foreground='red')
-                    self.log_message("Login failed - invalid credentials or connection issue", "ERROR")
-                    self.cleanup_config_files()
-            else:
-                status_label.config(text="Failed to create config files. Try again.", foreground='red')
-        
-        button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=5, column=0, columnspan=3)
-        
-        ttk.Button(button_frame, text="Login", command=do_login, width=15).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="Cancel", command=login_window.destroy, width=15).pack(side=tk.LEFT, padx=5)
-        
-        login_window.bind('<Return>', lambda e: do_login())
-        
-        main_frame.columnconfigure(1, weight=1)
-        login_window.columnconfigure(0, weight=1)
-        login_window.rowconfigure(0, weight=1)
-    
-    def do_logout(self):
-        """Logout and cleanup"""
-        self.cleanup_config_files()
-        self.username = None
-        self.password = None
-        self.is_logged_in = False
-        self.login_status_var.set("Not logged in")
-        self.login_status_label.config(foreground='red')
-        self.login_btn.config(text="Login", command=self.show_login_window)
-        self.log_message("Logged out successfully")
-    
     def test_login(self):
         """Test login credentials"""
         try:
             self.log_message("Testing login credentials...")            
             # Set environment variables
-            os.environ['PYWIKIBOT_DIR'] = CONFIG_DIR
-            if CONFIG_DIR not in sys.path:
-                sys.path.insert(0, CONFIG_DIR)
+            os.environ['PYWIKIBOT_DIR'] = self.config_dir
+            if self.config_dir not in sys.path:
+                sys.path.insert(0, self.config_dir)
             # Force reload
             modules_to_remove = [key for key in sys.modules.keys() if key.startswith('pywikibot')]
             for module in modules_to_remove:
@@ -480,9 +1808,9 @@ class PyPan:
             
             # Wait for files
             for _ in range(10):
-                if os.path.exists(USER_CONFIG_PATH) and os.path.exists(PASSWORD_FILE_PATH):
+                if os.path.exists(self.user_config_path) and os.path.exists(self.password_file_path):
                     try:
-                        with open(PASSWORD_FILE_PATH, 'r', encoding='utf-8') as tf:
+                        with open(self.password_file_path, 'r', encoding='utf-8') as tf:
                             if tf.read(1) is not None:
                                 break
                     except Exception:
@@ -492,8 +1820,8 @@ class PyPan:
             import importlib
             pywikibot = importlib.import_module('pywikibot')
             
-            family = self.family_var.get()
-            mylang = self.mylang_var.get()
+            family = self.family
+            mylang = self.mylang
             
             test_site = pywikibot.Site(mylang, family)
             test_site.login()
@@ -510,8 +1838,8 @@ class PyPan:
         try:
             self.log_message("Creating configuration files...")
             
-            family = self.family_var.get()
-            mylang = self.mylang_var.get()
+            family = self.family
+            mylang = self.mylang
             
             # Creating user-config.py
             user_config_content = f"""# -*- coding: utf-8 -*-
@@ -521,7 +1849,7 @@ import os
 family = '{family}'
 mylang = '{mylang}'
 usernames['{family}']['{mylang}'] = '{username}'
-password_file = r"{PASSWORD_FILE_PATH}"
+password_file = r"{self.password_file_path}"
 maxlag = 60
 put_throttle = 1
 console_encoding = 'utf-8'
@@ -532,22 +1860,22 @@ textfile_encoding = 'utf-8'
 # Suppress interactive password prompts
 os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
 """
-            with open(USER_CONFIG_PATH, 'w', encoding='utf-8') as f:
+            with open(self.user_config_path, 'w', encoding='utf-8') as f:
                 f.write(user_config_content)
                 f.flush()
                 os.fsync(f.fileno())
-            safe_chmod(USER_CONFIG_PATH, 0o600)
+            safe_chmod(self.user_config_path, 0o600)
 
             # Creating user-password.py
             password_content = f"""# -*- coding: utf-8 -*-
 # Password file for pywikibot
 ('{mylang}', '{family}', '{username}', '{password}')
 """
-            with open(PASSWORD_FILE_PATH, 'w', encoding='utf-8') as f:
+            with open(self.password_file_path, 'w', encoding='utf-8') as f:
                 f.write(password_content)
                 f.flush()
                 os.fsync(f.fileno())
-            safe_chmod(PASSWORD_FILE_PATH, 0o600)
+            safe_chmod(self.password_file_path, 0o600)
             
             time.sleep(0.5)
             
@@ -558,117 +1886,100 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
             self.log_message(f"Failed to create config files: {str(e)}", "ERROR")
             return False
     
-    def browse_input_file(self):
-        filename = filedialog.askopenfilename(
-            title="Select input file",
-            filetypes=[
-                ("Supported files", "*.xlsx *.xls *.csv *.json"),
-                ("Excel files", "*.xlsx *.xls"),
-                ("CSV files", "*.csv"),
-                ("JSON files", "*.json"),
-                ("All files", "*.*")
-            ]
-        )
-        if filename:
-            self.input_file.set(filename)
-            # Setting output file to same directory of input
-            input_dir = os.path.dirname(filename)
-            input_basename = os.path.basename(filename)
-            input_name, input_ext = os.path.splitext(input_basename)
-            
-            # Determine output extension based on input
-            if input_ext.lower() in ['.csv']:
-                output_ext = '.csv'
-            elif input_ext.lower() in ['.json']:
-                output_ext = '.json'
-            else:
-                output_ext = '.xlsx'
-            
-            output_filename = os.path.join(input_dir, f"{input_name}_results{output_ext}")
-            self.output_file.set(output_filename)
-            
-    def read_input_file(self, filepath):
-        """Read input file (Excel, CSV, or JSON) and return dataframe"""
-        try:
-            _, ext = os.path.splitext(filepath)
-            ext = ext.lower()
-            
-            if ext in ['.xlsx', '.xls']:
-                self.log_message(f"Reading Excel file: {filepath}")
-                # Read Excel without evaluating formulas - treat everything as strings
-                import openpyxl
-                from openpyxl.utils.exceptions import InvalidFileException
-                
-                try:
-                    # Use openpyxl to read raw cell values without formula evaluation
-                    wb = openpyxl.load_workbook(filepath, data_only=False)
-                    ws = wb.active
-                    
-                    rows = []
-                    for row in ws.iter_rows(values_only=False):
-                        row_data = []
-                        for cell in row:
-                            # Get the actual cell value, not the formula result
-                            if cell.value is not None:
-                                # If it's a formula, get the formula string without the =
-                                if hasattr(cell, 'value') and isinstance(cell.value, str):
-                                    row_data.append(cell.value)
-                                else:
-                                    row_data.append(str(cell.value) if cell.value is not None else '')
-                            else:
-                                row_data.append('')
-                        rows.append(row_data)
-                    
-                    df = pd.DataFrame(rows)
-                    self.log_message(f"Successfully read Excel with {len(df)} rows (raw values)")
-                    
-                except Exception as openpyxl_error:
-                    self.log_message(f"openpyxl failed, trying pandas: {openpyxl_error}", "WARNING")
-                    # Fallback to pandas
-                    df = pd.read_excel(filepath, header=None, dtype=str)
-            elif ext == '.csv':
-                self.log_message(f"Reading CSV file: {filepath}")
-                df = pd.read_csv(filepath, header=None)
-            elif ext == '.json':
-                self.log_message(f"Reading JSON file: {filepath}")
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Convert JSON to dataframe
-                if isinstance(data, list):
-                    # Assume list of objects with keys: file_path, target_filename, description
-                    rows = []
-                    for item in data:
-                        if isinstance(item, dict):
-                            rows.append([
-                                item.get('file_path', ''),
-                                item.get('target_filename', ''),
-                                item.get('description', '')
-                            ])
-                        elif isinstance(item, list):
-                            rows.append(item)
-                    df = pd.DataFrame(rows)
-                else:
-                    self.log_message("Invalid JSON format - expected array", "ERROR")
-                    return None
-            else:
-                self.log_message(f"Unsupported file type: {ext}", "ERROR")
-                return None
-            
-            self.log_message(f"Successfully read {len(df)} rows from file")
-            return df
-            
-        except Exception as e:
-            self.log_message(f"Error reading file: {str(e)}", "ERROR")
-            return None
+    def iter_manifest_rows(self, filepath):
+        """Yield manifest rows lazily as lists of strings (at least three per row)
+        
+        Rows are streamed from disk so the first upload can start before the
+        file is fully read. A manifest of up to MANIFEST_CACHE_MAX_ROWS rows is
+        kept in memory once fully read and served from there until the file's
+        modification time or size changes.
+        """
+        stat = os.stat(filepath)
+        cache_key = os.path.abspath(filepath)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self.manifest_cache_lock:
+            cached = self.manifest_cache.get(cache_key)
+        if cached and cached[0] == signature:
+            yield from cached[1]
+            return
+        
+        collected = []
+        for row in self.stream_input_file(filepath):
+            row = ['' if value is None else value if isinstance(value, str) else str(value) for value in row]
+            if len(row) < 3:
+                row += [''] * (3 - len(row))
+            if collected is not None:
+                collected.append(row)
+                if len(collected) > MANIFEST_CACHE_MAX_ROWS:
+                    # Too large to hold; later passes stream from disk again
+                    collected = None
+            yield row
+        
+        if collected is not None:
+            with self.manifest_cache_lock:
+                self.manifest_cache = {cache_key: (signature, collected)}
+    
+    def stream_input_file(self, filepath):
+        """Yield raw rows from an input file (Excel, CSV, or JSON) without loading it whole"""
+        _, ext = os.path.splitext(filepath)
+        ext = ext.lower()
+        
+        if ext == '.xlsx':
+            self.log_message(f"Reading Excel file: {filepath}")
+            # Read-only mode streams rows from the zip; data_only=False keeps
+            # formulas as their raw text instead of evaluating them
+            import openpyxl
+            try:
+                wb = openpyxl.load_workbook(filepath, read_only=True, data_only=False)
+            except Exception as openpyxl_error:
+                self.log_message(f"openpyxl failed, trying pandas: {openpyxl_error}", "WARNING")
+                df = pd.read_excel(filepath, header=None, dtype=str)
+                for row in df.itertuples(index=False):
+                    yield [value if pd.notna(value) else '' for value in row]
+                return
+            try:
+                for row in wb.active.iter_rows(values_only=True):
+                    yield list(row)
+            finally:
+                wb.close()
+        elif ext == '.xls':
+            # Legacy format: openpyxl cannot read it, pandas loads it whole
+            self.log_message(f"Reading Excel file: {filepath}")
+            df = pd.read_excel(filepath, header=None, dtype=str)
+            for row in df.itertuples(index=False):
+                yield [value if pd.notna(value) else '' for value in row]
+        elif ext == '.csv':
+            self.log_message(f"Reading CSV file: {filepath}")
+            for chunk in pd.read_csv(filepath, header=None, dtype=str, keep_default_na=False, chunksize=MANIFEST_CHUNK_ROWS):
+                for row in chunk.itertuples(index=False):
+                    yield list(row)
+        elif ext == '.json':
+            self.log_message(f"Reading JSON file: {filepath}")
+            with open(filepath, 'r', encoding='utf-8') as f:
+                # Assume list of objects with keys: file_path, target_filename, description
+                # and optionally preset
+                for item in iter_json_array(f):
+                    if isinstance(item, dict):
+                        row = [
+                            item.get('file_path', ''),
+                            item.get('target_filename', ''),
+                            item.get('description', '')
+                        ]
+                        if item.get('preset'):
+                            row.append(item['preset'])
+                        yield row
+                    elif isinstance(item, list):
+                        # Only objects can name a preset
+                        yield item[:3]
+        else:
+            raise ValueError(f"Unsupported file type: {ext}")
     
     def log_message(self, message, level="INFO"):
         timestamp = datetime.now().strftime("%H:%M:%S")
         formatted_message = f"[{timestamp}] {level}: {message}\n"
         
-        self.log_text.insert(tk.END, formatted_message)
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        if self.on_log:
+            self.on_log(formatted_message, level)
         
         if level == "ERROR":
             self.logger.error(message)
@@ -676,225 +1987,401 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
             self.logger.warning(message)
         else:
             self.logger.info(message)
-            
+    
     def update_internet_status(self, status):
-        """Update internet status in UI"""
-        self.internet_status.set(status)
-        if status == "Active":
-            self.internet_status_label.config(foreground="green")
-        elif status == "Inactive":
-            self.internet_status_label.config(foreground="red")
-        else:
-            self.internet_status_label.config(foreground="gray")
+        """Report internet status ("Active", "Inactive" or "Unknown") to the front end"""
+        if self.on_internet_status:
+            self.on_internet_status(status)
+    
+    def update_progress(self):
+        """Report updated counters to the front end"""
+        if self.on_progress:
+            self.on_progress()
             
-    def test_internet_connection(self, show_success=False):
-        """Test internet connectivity using multiple reliable endpoints"""
-        test_urls = [
-            "https://www.google.com",
-            "https://commons.wikimedia.org",
-            "https://www.cloudflare.com",
-            "https://8.8.8.8" 
-        ]
+    def probe_connectivity(self):
+        """Cheap connectivity probe: a HEAD request to Commons, then a plain TCP connect"""
+        try:
+            response = self.http.head("https://commons.wikimedia.org", timeout=5)
+            if response.status_code < 500:
+                return True
+        except Exception:
+            pass
         
-        for url in test_urls:
-            try:
-                response = requests.get(url, timeout=10)
-                if response.status_code == 200:
-                    self.update_internet_status("Active")
-                    if show_success:
-                        self.log_message("Internet connection is working")
-                        messagebox.showinfo("Connection Test", "Internet connection is working!")
-                    return True
-            except:
-                continue
-                
         try:
             import socket
-            socket.gethostbyname("google.com")
-            self.update_internet_status("Active")
-            return True
-        except:
-            pass
-            
-        self.update_internet_status("Inactive")
-        if show_success:
-            self.log_message("Internet connection failed", "ERROR")
-        return False
+            with socket.create_connection(("1.1.1.1", 443), timeout=3):
+                return True
+        except Exception:
+            return False
+    
+    def concurrency_changed(self, limit, reason):
+        """Concurrency controller hook"""
+        self.log_message(f"Upload concurrency set to {limit} of {self.num_workers} ({reason})")
+    
+    def connectivity_changed(self, online):
+        """Connectivity monitor hook"""
+        self.update_internet_status("Active" if online else "Inactive")
+    
+    def test_internet_connection(self):
+        """Probe connectivity right now and update the shared state"""
+        return self.connectivity.refresh()
             
-    def clear_reset(self):
-        """Clear all fields and reset the application state"""
-        if self.is_running:
-            response = messagebox.askyesno(
-                "Upload in Progress",
-                "An upload is currently in progress. Are you sure you want to reset?"
-            )
-            if not response:
-                return
-            # Stop the upload
-            self.is_running = False
-            self.is_paused = False
-            self.stop_event.set()
-            if self.executor:
-                self.executor.shutdown(wait=False)
+    def probe_download(self, url, timeout=30):
+        """HEAD a URL for its size, byte-range support and a validator usable with If-Range"""
+        try:
+            response = self.http.head(url, timeout=timeout, allow_redirects=True,
+                                      headers={'Accept-Encoding': 'identity'})
+        except requests.RequestException:
+            return {}
+        # Some servers refuse HEAD; the plain GET still works
+        if response.status_code >= 400:
+            return {}
+        return describe_download(response.headers)
+    
+    def reset_download(self, url, file_path, state, info):
+        """Forget a partial download and what was known about its body, keeping `info` instead"""
+        discard_download(file_path)
+        state.clear()
+        state['url'] = url
+        state.update(info)
+    
+    def fetch_to_file(self, url, file_path, state, timeout=30):
+        """Download `url` into `file_path`, continuing what an earlier attempt left there
         
-        # Logout if logged in
-        if self.is_logged_in:
-            self.do_logout()
+        Bodies whose GET reports at most `spool_max_bytes` are returned as a
+        MemoryDownload instead, leaving `file_path` untouched; otherwise None
+        is returned.
+        `state` is kept by the caller between attempts. It remembers the
+        body's size and validator, so a resumed request only continues the
+        same version of the file. The HEAD probe only picks the strategy;
+        the size checked at the end is the one the GET responses report.
+        Large bodies on servers that accept byte ranges are fetched as
+        DOWNLOAD_RANGE_PARTS parallel ranges.
+        """
+        if state.get('url') != url:
+            # A different source (e.g. another snapshot): start over
+            self.reset_download(url, file_path, state, self.probe_download(url, timeout))
+        size = state.get('size')
+        if state.get('ranges') and size and size >= PARALLEL_DOWNLOAD_MIN_SIZE:
+            self.fetch_ranges(url, file_path, state, timeout)
+        else:
+            payload = self.fetch_range(url, file_path, 0, None, state, timeout, spool=True)
+            if payload:
+                return payload
         
-        # Clear input fields
-        self.input_file.set("")
-        self.output_file.set("upload_results.xlsx")
-        self.num_workers_var.set(1)
-        self.pause_seconds_var.set(10)
-        self.max_attempts_var.set(10)
-        self.pause_after_upload_var.set(0.2)
-        self.ignore_warnings_var.set("True")
+        have = os.path.getsize(file_path)
+        size = state.get('size')
+        if size is not None and have != size:
+            raise IOError(f"Incomplete download: {have} of {size} bytes")
+        return None
+    
+    def fetch_range(self, url, file_path, first, last, state, timeout, require_range=False, spool=False):
+        """Fetch bytes first..last (None: to the end) into `file_path`, keeping the bytes it already holds
         
-        # Reset family and lang to defaults
-        self.family_var.set("commons")
-        self.mylang_var.set("commons")
+        With `spool`, a whole body whose Content-Length is at most
+        `spool_max_bytes` is returned as a MemoryDownload instead.
+        """
+        have = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        if last is not None and have >= last - first + 1:
+            return
+        headers = {'Accept-Encoding': 'identity'}
+        if have or require_range:
+            headers['Range'] = f"bytes={first + have}-{'' if last is None else last}"
+            if state.get('validator'):
+                headers['If-Range'] = state['validator']
         
-        # Reset stop event for next run
-        self.stop_event.clear()
+        with self.http.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 416:
+                if require_range:
+                    # The range lies past the end of the body: the probed size was wrong
+                    state['ranges'] = False
+                    raise IOError("Server rejected the byte range")
+                # The partial file does not fit the body any more; start over next attempt
+                discard_download(file_path)
+                raise IOError("Server rejected the resume offset")
+            response.raise_for_status()
+            if response.status_code == 206:
+                total = describe_download(response.headers)['size']
+                if total is not None:
+                    state['size'] = total
+                if have:
+                    self.log_message(f"Resuming download at byte {first + have}: {url}")
+                stream_to_file(response, file_path, 'ab', self.stop_event)
+            elif require_range:
+                # Ranges ignored, or the file changed on the server: fetch_ranges starts over
+                state['ranges'] = False
+                raise IOError("Server did not honour the byte range")
+            else:
+                # A whole body, possibly a new version answering a resume: it replaces what
+                # was known about the download, and the partial file
+                if have:
+                    self.log_message(f"Server sent the whole file, restarting download: {url}")
+                self.reset_download(url, file_path, state, describe_download(response.headers))
+                size = state.get('size')
+                # Bodies without a length are never spooled, whatever HEAD said
+                if spool and size is not None and size <= self.spool_max_bytes:
+                    data = response.content
+                    if len(data) == size:
+                        return MemoryDownload(data, os.path.basename(urlparse(url).path))
+                    # Let the size check in fetch_to_file report the short body
+                    with open(file_path, 'wb') as f:
+                        f.write(data)
+                else:
+                    stream_to_file(response, file_path, 'wb', self.stop_event)
+        return None
+    
+    def fetch_ranges(self, url, file_path, state, timeout):
+        """Fetch a large body as parallel byte ranges into part files, then stitch them together"""
+        size = state['size']
+        part_size = -(-size // DOWNLOAD_RANGE_PARTS)
+        parts = [(f"{file_path}.part{index}", first, min(size, first + part_size) - 1)
+                 for index, first in enumerate(range(0, size, part_size))]
+        self.log_message(f"Downloading {size} bytes as {len(parts)} parallel ranges: {url}")
         
-        # Reset counters
-        self.processed_files = 0
-        self.successful_uploads = 0
-        self.failed_uploads = 0
-        self.total_files = 0
-        self.results = []
-        self.start_time = None
+        # Each part resumes on its own, so a failed attempt keeps what the others fetched
+        try:
+            with ThreadPoolExecutor(max_workers=len(parts), thread_name_prefix='pypan-range') as pool:
+                futures = [pool.submit(self.fetch_range, url, part_path, first, last, state, timeout, True)
+                           for part_path, first, last in parts]
+                for future in futures:
+                    future.result()
+        except Exception:
+            if not state.get('ranges'):
+                # A part came back whole: the parts may mix two versions of the file.
+                # Probe again and fetch it in one request next attempt
+                self.reset_download(url, file_path, state, self.probe_download(url, timeout))
+                state['ranges'] = False
+            raise
+        reported = state['size']
+        if reported != size:
+            # The ranges were cut from a wrong HEAD size; fetch it in one request next attempt
+            self.reset_download(url, file_path, state, {'ranges': False})
+            raise IOError(f"Server reported {reported} bytes instead of {size}")
+        for part_path, first, last in parts:
+            if os.path.getsize(part_path) != last - first + 1:
+                raise IOError(f"Incomplete range {first}-{last}")
         
-        # Reset UI elements
-        self.progress_var.set(0)
-        self.status_label.config(text="Ready")
-        self.stats_label.config(text="Files: 0/0 | Success: 0 | Failed: 0")
-        self.time_label.config(text="Time: 00:00:00 | ETA: --:--:--")
-        self.update_internet_status("Unknown")
+        with open(file_path, 'wb') as out:
+            for part_path, _, _ in parts:
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, out, DOWNLOAD_CHUNK_SIZE)
+        for part_path, _, _ in parts:
+            os.remove(part_path)
+    
+    def cached_download(self, key, revalidate_url=None):
+        """Return a temp copy of a cached download, or None
         
-        # Clear log
-        self.log_text.delete(1.0, tk.END)
+        With `revalidate_url` the entry is only used after a conditional GET
+        (If-None-Match / If-Modified-Since) answers 304 Not Modified; a 200
+        carries the new version, which replaces the entry and is returned.
+        Without `revalidate_url`, or while its host is marked dead, the
+        entry is trusted as is. A cache that cannot be read counts as a miss.
+        """
+        if not self.download_cache:
+            return None
+        try:
+            return self._cached_download(key, revalidate_url)
+        except Exception as e:
+            self.log_message(f"Could not read the download cache for {key}: {e}", "WARNING")
+            return None
+    
+    def _cached_download(self, key, revalidate_url):
+        meta = self.download_cache.get(key)
+        if meta is None:
+            return None
+        if revalidate_url and self.wayback.is_dead(revalidate_url):
+            # The cached copy of the live file beats a Wayback snapshot
+            self.log_message(f"{self.wayback.host_of(revalidate_url)} is unreachable, using the cached download unchecked")
+        elif revalidate_url:
+            headers = {'Accept-Encoding': 'identity'}
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+            if len(headers) == 1:
+                return None
+            try:
+                with self.http.get(revalidate_url, headers=headers, timeout=30, stream=True) as response:
+                    if response.status_code == 200:
+                        return self.refresh_cached_download(key, response)
+                    if response.status_code != 304:
+                        return None
+            except requests.RequestException:
+                return None
         
-        # Reset buttons
-        self.start_btn.config(state=tk.NORMAL)
-        self.pause_btn.config(state=tk.DISABLED, text="Pause")
-        self.stop_btn.config(state=tk.DISABLED)
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='_cached')
+        temp_file.close()
+        os.remove(temp_file.name)
+        if not self.download_cache.checkout(key, temp_file.name):
+            return None
+        self.log_message(f"Using cached download for {key}")
+        return temp_file.name
+    
+    def refresh_cached_download(self, key, response):
+        """Save the new version a revalidation returned to a temp file and the cache; returns its path"""
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='_download')
+        temp_file.close()
+        try:
+            written = stream_to_file(response, temp_file.name, 'wb', self.stop_event)
+            info = describe_download(response.headers)
+            if info['size'] is not None and written != info['size']:
+                raise IOError(f"Incomplete download: {written} of {info['size']} bytes")
+        except Exception:
+            discard_download(temp_file.name)
+            raise
+        self.log_message(f"Cached download of {key} changed on the server, refreshed it")
+        if info['etag'] or info['last_modified']:
+            self.cache_download(key, temp_file.name, {'etag': info['etag'], 'last_modified': info['last_modified']})
+        return temp_file.name
+    
+    def cache_download(self, key, file_path, meta=None):
+        """Keep a finished download in the cache; failures only cost the cache entry"""
+        if not self.download_cache:
+            return
+        try:
+            self.download_cache.put(key, file_path, meta)
+        except Exception as e:
+            self.log_message(f"Could not cache download of {key}: {e}", "WARNING")
+    
+    def download_file_from_url(self, url, max_retries, retries=None):
+        """Download file from URL with retries; `retries` collects the row's retry counts"""
+        cached = self.cached_download(url, revalidate_url=url)
+        if cached:
+            return cached
+        
+        if self.wayback.is_dead(url):
+            self.log_message(f"{self.wayback.host_of(url)} is unreachable, going straight to the Wayback Machine for: {url}")
+            return self.download_from_wayback(url, max_retries, retries)
         
-        self.log_message("Application reset successfully")
-        messagebox.showinfo("Reset Complete", "All fields and settings have been reset")
-            
-    def download_file_from_url(self, url, max_retries):
-        """Download file from URL with retries"""
         temp_file = None
         try:
             temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='_download')
             temp_path = temp_file.name
             temp_file.close()
             
+            # Kept across attempts so a retry resumes the partial file
+            state = {}
             for attempt in range(max_retries):
+                error = None
                 try:
                     self.log_message(f"Downloading from URL (attempt {attempt + 1}/{max_retries}): {url}")
-                    response = requests.get(url, timeout=30, stream=True)
-                    response.raise_for_status()
-                    
-                    with open(temp_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
+                    payload = self.fetch_to_file(url, temp_path, state)
+                    self.wayback.record_result(url)
+                    if payload:
+                        discard_download(temp_path)
+                    downloaded = payload or temp_path
                     
                     # Check if file is not empty
-                    if os.path.getsize(temp_path) > 0:
+                    if (payload.size if payload else os.path.getsize(temp_path)) > 0:
                         self.log_message(f"Successfully downloaded from URL: {url}")
-                        return temp_path
+                        # Only sources that can be revalidated later are worth keeping
+                        if state.get('etag') or state.get('last_modified'):
+                            self.cache_download(url, downloaded, {'etag': state.get('etag'), 'last_modified': state.get('last_modified')})
+                        return downloaded
                     else:
                         self.log_message(f"Downloaded file is empty (attempt {attempt + 1}/{max_retries})", "WARNING")
                         
                 except Exception as e:
                     self.log_message(f"Download failed (attempt {attempt + 1}/{max_retries}): {str(e)}", "WARNING")
+                    error = e
+                    if self.wayback.record_result(url, e):
+                        self.log_message(f"{self.wayback.host_of(url)} looks dead, skipping further direct attempts", "WARNING")
+                        break
                     
-                if attempt < max_retries - 1:
-                    time.sleep(self.pause_seconds_var.get())
+                if not self.retry_after_failure(error, attempt, max_retries, retries):
+                    break
+            
+            discard_download(temp_path)
+            if not self.is_running:
+                return None
             
             # If all retries failed, try Wayback Machine
             self.log_message(f"All download attempts failed, trying Wayback Machine for: {url}")
-            return self.download_from_wayback(url, max_retries)
+            return self.download_from_wayback(url, max_retries, retries)
             
         except Exception as e:
             self.log_message(f"Error in download_file_from_url: {str(e)}", "ERROR")
-            if temp_file and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
+            if temp_file:
+                discard_download(temp_path)
+            return None
+    
+    def query_wayback_snapshot(self, url):
+        """Ask the CDX API for the oldest snapshot of `url`; returns its timestamp or None"""
+        response = self.http.get(WAYBACK_CDX_URL, params={'url': url, 'limit': 1, 'sort': 'timestamp'}, timeout=30)
+        response.raise_for_status()
+        if not response.text.strip():
             return None
+        # Parse CDX response (space-separated)
+        parts = response.text.strip().split('\n')[0].split()
+        if len(parts) < 2:
+            self.log_message("Invalid CDX response from Wayback Machine", "WARNING")
+            return None
+        return parts[1]
     
-    def download_from_wayback(self, url, max_retries):
+    def download_from_wayback(self, url, max_retries, retries=None):
         """Download file from Wayback Machine (oldest snapshot)"""
-        temp_file = None
+        temp_path = None
         try:
-            # Get oldest snapshot from Wayback Machine CDX API
-            cdx_url = f"http://web.archive.org/cdx/search/cdx?url={url}&limit=1&sort=timestamp"
-            
+            # Kept across attempts so a retry resumes the partial snapshot download
+            state = {}
             for attempt in range(max_retries):
+                error = None
                 try:
+                    # The oldest snapshot comes from the shared resolver (often already looked up)
                     self.log_message(f"Querying Wayback Machine (attempt {attempt + 1}/{max_retries})")
-                    cdx_response = requests.get(cdx_url, timeout=30)
-                    cdx_response.raise_for_status()
-                    
-                    if not cdx_response.text.strip():
+                    timestamp = self.wayback.snapshot(url)
+                    if not timestamp:
                         self.log_message("No snapshots found in Wayback Machine", "WARNING")
+                        if temp_path:
+                            discard_download(temp_path)
                         return None
                     
-                    # Parse CDX response (space-separated)
-                    cdx_line = cdx_response.text.strip().split('\n')[0]
-                    parts = cdx_line.split()
-                    
-                    if len(parts) < 2:
-                        self.log_message("Invalid CDX response from Wayback Machine", "WARNING")
-                        return None
-                    
-                    timestamp = parts[1]
                     wayback_url = f"http://web.archive.org/web/{timestamp}id_/{url}"
                     
                     self.log_message(f"Found Wayback snapshot from {timestamp[:8]}, downloading...")
                     
-                    # Download from Wayback Machine
-                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='_wayback')
-                    temp_path = temp_file.name
-                    temp_file.close()
+                    # A snapshot never changes, so a cached copy needs no revalidation
+                    cached = self.cached_download(wayback_url)
+                    if cached:
+                        if temp_path:
+                            discard_download(temp_path)
+                        return cached
                     
-                    wb_response = requests.get(wayback_url, timeout=60, stream=True)
-                    wb_response.raise_for_status()
+                    # Download from Wayback Machine
+                    if temp_path is None:
+                        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='_wayback')
+                        temp_path = temp_file.name
+                        temp_file.close()
                     
-                    with open(temp_path, 'wb') as f:
-                        for chunk in wb_response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
+                    payload = self.fetch_to_file(wayback_url, temp_path, state, timeout=60)
+                    if payload:
+                        discard_download(temp_path)
+                    downloaded = payload or temp_path
                     
                     # Check if file is not empty
-                    if os.path.getsize(temp_path) > 0:
+                    if (payload.size if payload else os.path.getsize(temp_path)) > 0:
                         self.log_message(f"Successfully downloaded from Wayback Machine")
-                        return temp_path
+                        self.cache_download(wayback_url, downloaded)
+                        return downloaded
                     else:
                         self.log_message(f"Wayback file is empty (attempt {attempt + 1}/{max_retries})", "WARNING")
-                        os.remove(temp_path)
                         
                 except Exception as e:
                     self.log_message(f"Wayback download failed (attempt {attempt + 1}/{max_retries}): {str(e)}", "WARNING")
-                    if temp_file and os.path.exists(temp_path):
-                        try:
-                            os.remove(temp_path)
-                        except:
-                            pass
+                    error = e
                 
-                if attempt < max_retries - 1:
-                    time.sleep(self.pause_seconds_var.get())
+                if not self.retry_after_failure(error, attempt, max_retries, retries):
+                    break
             
+            if temp_path:
+                discard_download(temp_path)
             self.log_message("All Wayback Machine attempts failed", "ERROR")
             return None
             
         except Exception as e:
             self.log_message(f"Error in download_from_wayback: {str(e)}", "ERROR")
+            if temp_path:
+                discard_download(temp_path)
             return None
     
     def is_youtube_url(self, url):
@@ -906,13 +2393,18 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
         except:
             return False
     
-    def download_youtube_video(self, url, max_retries):
+    def download_youtube_video(self, url, max_retries, retries=None):
         """Download YouTube video using yt-dlp with browser cookie fallback"""
         try:
             if not YT_DLP_AVAILABLE:
                 self.log_message("yt-dlp not installed. Install with: pip install yt-dlp", "ERROR")
                 return None
 
+            # A video is treated as unchanging, so a cached copy is used without revalidation
+            cached = self.cached_download(url)
+            if cached:
+                return cached
+
             # Build list of strategies to try in order:
             # 1. No cookies (anonymous, works for non-restricted videos)
             # 2. Chrome cookies
@@ -948,6 +2440,7 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
                         return None
 
                     self.log_message(f"YouTube download attempt {attempt + 1}/{max_retries} [{strategy['name']}]...")
+                    error = None
 
                     # Try formats in order: direct mp4 > any non-HLS > any best
                     # proto filter avoids HLS/DASH streams that produce empty files without ffmpeg
@@ -973,12 +2466,14 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
 
                         if os.path.exists(temp_path) and os.path.getsize(temp_path) > 0:
                             self.log_message(f"Successfully downloaded YouTube video [{strategy['name']}]: {temp_path}")
+                            self.cache_download(url, temp_path)
                             return temp_path
                         else:
                             self.log_message(f"Download produced empty file [{strategy['name']}] (attempt {attempt + 1}/{max_retries})", "WARNING")
 
                     except Exception as e:
                         err = str(e)
+                        error = e
                         self.log_message(f"Download error [{strategy['name']}] attempt {attempt + 1}/{max_retries}: {err}", "WARNING")
                         # If bot-detection error, no point retrying same strategy
                         if 'Sign in to confirm' in err or 'not a bot' in err:
@@ -1002,9 +2497,8 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
                         except:
                             pass
 
-                    if attempt < max_retries - 1:
-                        self.log_message(f"Waiting {self.pause_seconds_var.get()} seconds before retry...")
-                        time.sleep(self.pause_seconds_var.get())
+                    if not self.retry_after_failure(error, attempt, max_retries, retries):
+                        break
 
                 # Cleanup between strategies
                 if os.path.exists(temp_path):
@@ -1020,16 +2514,29 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
             self.log_message(f"Error in download_youtube_video: {str(e)}", "ERROR")
             return None
     
+    def retry_after_failure(self, error, attempt, max_attempts, row_counts=None):
+        """Apply the retry policy to a failed attempt; returns True if it should be tried again
+        
+        Sleeps the backoff delay first, waking early if the batch is stopped.
+        """
+        error_class = self.retry_policy.classify(error)
+        if not self.retry_policy.should_retry(error_class, attempt, max_attempts, row_counts):
+            if error_class == RETRY_PERMANENT:
+                self.log_message(f"Not retrying, the error is permanent: {error}", "WARNING")
+            elif self.retry_policy.exhausted and attempt + 1 < max_attempts:
+                self.log_message("Not retrying, the retry budget for this run is used up", "WARNING")
+            return False
+        delay = self.retry_policy.delay(error_class, attempt)
+        self.log_message(f"Waiting {delay:.1f} seconds before retry ({error_class.replace('_', '-')}, attempt {attempt + 1}/{max_attempts})")
+        self.stop_event.wait(delay)
+        return self.is_running
+    
     def wait_for_internet(self):
         """Wait for internet connection to be restored"""
-        retry_count = 0
-        while self.is_running and not self.test_internet_connection():
-            retry_count += 1
-            if retry_count == 1:  # Only log on first attempt
-                self.log_message("Waiting for internet connection...")
-            time.sleep(10)
-        
-        if self.is_running and retry_count > 0:
+        if self.connectivity.is_online():
+            return self.is_running
+        self.log_message("Waiting for internet connection...")
+        if self.connectivity.wait_online(lambda: self.is_running):
             self.log_message("Internet connection restored")
         return self.is_running
         
@@ -1037,10 +2544,10 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
         """Initialize Pywikibot with proper config paths"""
         try:
             # Set environment variables for pywikibot
-            os.environ['PYWIKIBOT_DIR'] = CONFIG_DIR
-            # Add CONFIG_DIR to sys.path so pywikibot can find user-config.py
-            if CONFIG_DIR not in sys.path:
-                sys.path.insert(0, CONFIG_DIR)
+            os.environ['PYWIKIBOT_DIR'] = self.config_dir
+            # Add the config directory to sys.path so pywikibot can find user-config.py
+            if self.config_dir not in sys.path:
+                sys.path.insert(0, self.config_dir)
             # Force reload of pywikibot to use new config
             modules_to_remove = [key for key in sys.modules.keys() if key.startswith('pywikibot')]
             for module in modules_to_remove:
@@ -1048,10 +2555,10 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
 
             # Wait for config files to be readable
             for _ in range(10):  # up to ~1 second total (10 * 0.1s)
-                if os.path.exists(USER_CONFIG_PATH) and os.path.exists(PASSWORD_FILE_PATH):
+                if os.path.exists(self.user_config_path) and os.path.exists(self.password_file_path):
                     try:
                         # quick open test to ensure filesystem returns readable content
-                        with open(PASSWORD_FILE_PATH, 'r', encoding='utf-8') as tf:
+                        with open(self.password_file_path, 'r', encoding='utf-8') as tf:
                             if tf.read(1) is not None:
                                 break
                     except Exception:
@@ -1069,15 +2576,15 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
             self.FilePage = _FilePage
 
             # Check if config files exist
-            if not os.path.exists(USER_CONFIG_PATH) or not os.path.exists(PASSWORD_FILE_PATH):
-                self.log_message(f"Config files missing: {USER_CONFIG_PATH}, {PASSWORD_FILE_PATH}", "ERROR")
+            if not os.path.exists(self.user_config_path) or not os.path.exists(self.password_file_path):
+                self.log_message(f"Config files missing: {self.user_config_path}, {self.password_file_path}", "ERROR")
                 return False
                 
             # Verify password file is readable
             max_retries = 5
             for attempt in range(max_retries):
                 try:
-                    with open(PASSWORD_FILE_PATH, 'r', encoding='utf-8') as f:
+                    with open(self.password_file_path, 'r', encoding='utf-8') as f:
                         content = f.read()
                         if content.strip():  # Ensure file has content
                             break
@@ -1088,14 +2595,17 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
                         self.log_message(f"Cannot read password file after {max_retries} attempts: {e}", "ERROR")
                         return False
             
-            family = self.family_var.get()
-            mylang = self.mylang_var.get()
+            family = self.family
+            mylang = self.mylang
             
             self.site = self.pywikibot.Site(mylang, family)
             self.site.login()
+            self.title_resolver = TitleResolver(self.query_existing_titles)
+            self.title_allocator = TitleAllocator(self.title_resolver, self.query_titles_with_prefix)
+            self.duplicate_finder = DuplicateFinder(self.query_sha1_duplicate)
 
             # Debug info
-            self.log_message(f"Config directory: {CONFIG_DIR}")
+            self.log_message(f"Config directory: {self.config_dir}")
             if getattr(sys.modules[__name__], '__compiled__', False):
                 self.log_message(f"Pywikibot data directory: {PYWIKIBOT_DATA_DIR}")
                 self.log_message(f"Running as compiled executable")
@@ -1108,131 +2618,253 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
             self.log_message(f"Traceback: {traceback.format_exc()}", "ERROR")
             return False
 
-    def convert_video_to_webm(self, input_path, max_retries=3):
-        """Convert video file to WebM format using moviepy"""
-        try:
-            if not MOVIEPY_AVAILABLE:
-                self.log_message("moviepy not installed. Install with: pip install moviepy", "ERROR")
-                return None
-            
-            # Create temporary output file
+    def conversion_cache_keys(self, source_sha1, preset):
+        """Cache keys a conversion of this source may be stored under: its remux, then its encode
+        
+        The encode key carries a digest of the preset's settings, so changing
+        a preset's definition does not reuse files encoded with the old one.
+        """
+        import hashlib
+        settings = json.dumps(ENCODER_PRESETS[preset], sort_keys=True)
+        digest = hashlib.sha1(settings.encode('utf-8')).hexdigest()[:12]
+        return [f"{source_sha1}:remux", f"{source_sha1}:{preset}:{digest}"]
+    
+    def cached_conversion(self, source_sha1, preset, stats):
+        """Return a temp copy of an earlier conversion of this source, or None; fills `stats` from it"""
+        if not self.conversion_cache:
+            return None
+        for key in self.conversion_cache_keys(source_sha1, preset):
+            meta = self.conversion_cache.get(key)
+            if meta is None:
+                continue
             temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.webm')
-            output_path = temp_file.name
             temp_file.close()
-            
-            self.log_message(f"Converting video to WebM: {input_path}")
-            
+            os.remove(temp_file.name)
+            if self.conversion_cache.checkout(key, temp_file.name):
+                stats.update(meta, cached=True)
+                return temp_file.name
+        return None
+    
+    def cache_conversion(self, source_sha1, preset, output_path, stats):
+        """Keep a finished conversion in the cache; failures only cost the cache entry"""
+        if not self.conversion_cache:
+            return
+        remux_key, encode_key = self.conversion_cache_keys(source_sha1, preset)
+        try:
+            self.conversion_cache.put(remux_key if stats.get('method') == 'remux' else encode_key, output_path, dict(stats))
+        except Exception as e:
+            self.log_message(f"Could not cache conversion of {output_path}: {e}", "WARNING")
+    
+    def remux_if_compatible(self, input_path, media):
+        """Stream-copy a video whose codecs WebM already allows into a .webm file
+        
+        `media` is probe_media()'s description of the file. Returns the output
+        path, or None when the file has to be re-encoded (other codecs, no
+        ffmpeg, or the remux failed) or Stop was pressed.
+        """
+        ffmpeg = find_ffmpeg()
+        if not ffmpeg or not media or not is_webm_compatible(media['streams']):
+            return None
+        
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.webm')
+        output_path = temp_file.name
+        temp_file.close()
+        codecs = ', '.join(codec for _, codec in media['streams'] if codec)
+        self.log_message(f"Streams are already WebM-compatible ({codecs}), remuxing without re-encoding: {input_path}")
+        try:
+            job = FfmpegJob(webm_remux_args(ffmpeg, input_path, output_path), media['duration'])
+            job.start()
+            if self.run_conversion_job(job, input_path) and os.path.getsize(output_path) > 0:
+                return output_path
+            if not self.stop_event.is_set():
+                self.log_message("Remux produced an empty file, re-encoding instead", "WARNING")
+        except Exception as e:
+            self.log_message(f"Remux failed, re-encoding instead: {e}", "WARNING")
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+        return None
+    
+    def run_conversion_job(self, job, input_path):
+        """Wait for a started FfmpegJob, listing it as a running conversion until it ends
+        
+        Returns False when Stop cancelled it. Progress is reported to the
+        front end about once a second.
+        """
+        self.conversion_started(job, input_path)
+        try:
+            return job.wait(self.stop_event.is_set, self.conversion_progressed)
+        finally:
+            self.conversion_finished(job)
+    
+    def conversion_started(self, job, input_path):
+        with self.conversions_lock:
+            self.active_conversions[job] = os.path.basename(input_path)
+    
+    def conversion_finished(self, job):
+        with self.conversions_lock:
+            self.active_conversions.pop(job, None)
+        self.update_progress()
+    
+    def conversion_progressed(self, job):
+        now = time.monotonic()
+        if now - self.last_conversion_report >= 1:
+            self.last_conversion_report = now
+            self.update_progress()
+    
+    def conversion_status(self):
+        """One line on the running conversions (percent done, encode fps), or '' when there are none"""
+        with self.conversions_lock:
+            conversions = list(self.active_conversions.items())
+        parts = []
+        for job, name in conversions:
+            details = []
+            if job.percent is not None:
+                details.append(f"{job.percent:.0f}%")
+            if job.fps:
+                details.append(f"{job.fps:.1f} fps")
+            parts.append(f"{name} ({', '.join(details)})" if details else name)
+        return f"Converting {'; '.join(parts)}" if parts else ''
+    
+    def estimate_remaining(self):
+        """Estimated seconds until the batch is done, or None while there is nothing to go by
+        
+        The average time per row finished in this run (rows loaded by a
+        resume took no time here) is extrapolated to the rows left; a running
+        conversion can make that too short, so the estimate is never less
+        than the time its encode still needs.
+        """
+        estimate = None
+        if self.start_time and self.processed_this_run > 0 and self.manifest_complete:
+            elapsed = time.time() - self.start_time
+            estimate = elapsed / self.processed_this_run * (self.total_files - self.processed_files)
+        with self.conversions_lock:
+            conversions = list(self.active_conversions)
+        for job in conversions:
+            remaining = job.remaining_seconds()
+            if remaining is not None:
+                estimate = max(estimate or 0, remaining)
+        return estimate
+    
+    def convert_video_to_webm(self, input_path, max_retries=3, preset=None, stats=None):
+        """Convert video file to WebM: remux when the codecs allow it, else encode with ffmpeg (see TranscodeService)
+        
+        `stats`, when given, is filled with how the file was converted: the
+        method ('remux' or 'encode') and, for encodes, the preset and fps.
+        Results are kept in the conversion cache, keyed by the source's SHA-1
+        and the preset, and reused by later rows and runs with the same source.
+        """
+        preset = preset or self.encoder_preset
+        stats = stats if stats is not None else {}
+        source_sha1 = None
+        if self.conversion_cache:
+            try:
+                source_sha1 = file_sha1(input_path)
+                cached = self.cached_conversion(source_sha1, preset, stats)
+                if cached:
+                    self.log_message(f"Using cached conversion of {input_path}")
+                    return cached
+            except Exception as e:
+                self.log_message(f"Could not look up {input_path} in the conversion cache: {e}", "WARNING")
+        
+        output_path = self._convert_video_to_webm(input_path, max_retries, preset, stats)
+        if output_path and source_sha1:
+            self.cache_conversion(source_sha1, preset, output_path, stats)
+        return output_path
+    
+    def _convert_video_to_webm(self, input_path, max_retries, preset, stats):
+        """Remux or encode `input_path` into a new temp .webm file; the uncached part of convert_video_to_webm"""
+        if not find_ffmpeg():
+            self.log_message("ffmpeg not found. Install moviepy (pip install moviepy), which brings its own ffmpeg", "ERROR")
+            return None
+        try:
+            media = probe_media(input_path)
+        except Exception as e:
+            self.log_message(f"Could not probe {input_path}: {e}", "WARNING")
+            media = None
+        remuxed = self.remux_if_compatible(input_path, media)
+        if remuxed:
+            stats['method'] = 'remux'
+            return remuxed
+        
+        transcoder = self.transcoder or TranscodeService(1, self.transcode_threads)
+        # Create temporary output file
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.webm')
+        output_path = temp_file.name
+        temp_file.close()
+        
+        self.log_message(f"Converting video to WebM: {input_path}")
+        try:
             for attempt in range(max_retries):
                 if self.stop_event.is_set():
-                    self.log_message("Video conversion cancelled by user")
-                    return None
+                    break
                 try:
-                    # Load video
-                    self.log_message(f"Loading video file (attempt {attempt + 1}/{max_retries})...")
-                    video = VideoFileClip(input_path)
-                    
                     # Convert to WebM with good quality settings
                     # Using libvpx-vp9 codec (VP9) which is preferred for Wikimedia Commons
-                    self.log_message(f"Converting to WebM format...")
-                    # Handle videos without fps info
-                    fps_value = video.fps if video.fps and video.fps > 0 else 30
-                    # Create a temp audio file with .opus extension so moviepy
-                    # can resolve the libopus codec correctly
-                    temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix='.opus')
-                    temp_audio_path = temp_audio.name
-                    temp_audio.close()
+                    self.log_message(f"Converting to WebM format with the {preset} preset (attempt {attempt + 1}/{max_retries})...")
+                    started = []
                     try:
-                        video.write_videofile(
-                            output_path,
-                            codec='libvpx-vp9',
-                            audio_codec='libopus',
-                            temp_audiofile=temp_audio_path,
-                            bitrate='2000k',
-                            audio_bitrate='128k',
-                            audio_fps=48000,
-                            fps=fps_value,
-                            threads=4,
-                            logger=None
-                        )
-                    except Exception as opus_err:
-                        if 'unknown' in str(opus_err).lower() or 'audio_codec' in str(opus_err).lower():
-                            # libopus not available in this ffmpeg build, fall back to libvorbis
-                            self.log_message("libopus unavailable, retrying with libvorbis...", "WARNING")
-                            temp_audio_ogg = tempfile.NamedTemporaryFile(delete=False, suffix='.ogg')
-                            temp_audio_ogg_path = temp_audio_ogg.name
-                            temp_audio_ogg.close()
-                            try:
-                                video.write_videofile(
-                                    output_path,
-                                    codec='libvpx-vp9',
-                                    audio_codec='libvorbis',
-                                    temp_audiofile=temp_audio_ogg_path,
-                                    bitrate='2000k',
-                                    audio_bitrate='128k',
-                                    audio_fps=48000,
-                                    fps=fps_value,
-                                    threads=4,
-                                    logger=None
-                                )
-                            finally:
-                                try:
-                                    os.remove(temp_audio_ogg_path)
-                                except:
-                                    pass
-                        else:
-                            raise
+                        encoded = transcoder.encode(
+                            input_path, output_path, preset, media['duration'] if media else None,
+                            should_stop=self.stop_event.is_set,
+                            on_start=lambda job: (started.append(job), self.conversion_started(job, input_path)),
+                            on_progress=self.conversion_progressed)
                     finally:
-                        try:
-                            os.remove(temp_audio_path)
-                        except:
-                            pass
-                    
-                    # Close the video to free resources
-                    video.close()
+                        for job in started:
+                            self.conversion_finished(job)
+                    if encoded is None:
+                        break
+                    if encoded['audio_codec'] != 'libopus':
+                        self.log_message(f"libopus unavailable, audio was encoded with {encoded['audio_codec']}", "WARNING")
                     
                     # Verify output file exists and is not empty
                     if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                        self.log_message(f"Successfully converted video to WebM: {output_path}")
+                        speed = f" at {encoded['fps']:.1f} fps" if encoded['fps'] else ""
+                        self.log_message(f"Successfully converted video to WebM{speed}: {output_path}")
+                        stats.update(method='encode', preset=preset, fps=encoded['fps'])
                         return output_path
                     else:
                         self.log_message(f"Conversion produced empty file (attempt {attempt + 1}/{max_retries})", "WARNING")
                         
                 except Exception as e:
                     self.log_message(f"Conversion error (attempt {attempt + 1}/{max_retries}): {str(e)}", "WARNING")
-                    try:
-                        video.close()
-                    except:
-                        pass
-                
-                # Cleanup failed attempt
-                if os.path.exists(output_path):
-                    try:
-                        os.remove(output_path)
-                    except:
-                        pass
                 
-                if attempt < max_retries - 1:
+                if attempt < max_retries - 1 and not self.stop_event.is_set():
                     self.log_message(f"Waiting 2 seconds before retry...")
-                    time.sleep(2)
+                    self.stop_event.wait(2)
             
-            self.log_message("All video conversion attempts failed", "ERROR")
-            return None
-            
-        except Exception as e:
-            self.log_message(f"Error in convert_video_to_webm: {str(e)}", "ERROR")
-            try:
-                if 'video' in locals():
-                    video.close()
-            except:
-                pass
+            if self.stop_event.is_set():
+                self.log_message("Video conversion cancelled by user")
+            else:
+                self.log_message("All video conversion attempts failed", "ERROR")
+            # Cleanup failed or cancelled attempt
+            if os.path.exists(output_path):
+                try:
+                    os.remove(output_path)
+                except:
+                    pass
             return None
+        finally:
+            if transcoder is not self.transcoder:
+                transcoder.shutdown()
     
     def get_extension_from_file(self, file_path):
-        """Get extension from actual file content using file signatures and PIL"""
+        """Get extension from actual file content using file signatures and PIL
+        
+        `file_path` may also be a MemoryDownload, which is read from memory.
+        """
+        import io
+        source = file_path
+        file_path = getattr(source, 'name', source)
+        def read_head(size):
+            if isinstance(source, MemoryDownload):
+                return source.data[:size]
+            with open(source, 'rb') as f:
+                return f.read(size)
         try:
             # Read file signatures (magic numbers) - need more bytes for some formats
-            with open(file_path, 'rb') as f:
-                header = f.read(512)  # Read more bytes for better detection            
+            header = read_head(512)  # Read more bytes for better detection
             # Check file signatures (magic numbers)
             if header[:4] == b'\x89PNG':
                 return '.png'
@@ -1241,8 +2873,7 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
             elif header[:6] in (b'GIF87a', b'GIF89a'):
                 return '.gif'
             elif header[:4] == b'\x89PNG':
-                with open(file_path, 'rb') as f:
-                    content = f.read(4096)
+                content = read_head(4096)
                 if b'acTL' in content:
                     return '.apng'
                 return '.png'
@@ -1266,8 +2897,7 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
             elif b'<svg' in header[:512].lower():
                 return '.svg'
             elif header[:5] == b'<?xml':
-                with open(file_path, 'rb') as f:
-                    content = f.read(2048)
+                content = read_head(2048)
                 if b'<svg' in content.lower():
                     return '.svg'
             
@@ -1293,8 +2923,7 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
                 return '.mp3'
             
             elif header[:4] == b'OggS':
-                with open(file_path, 'rb') as f:
-                    content = f.read(4096)
+                content = read_head(4096)
                 if b'OpusHead' in content:
                     return '.opus'
                 _, ext = os.path.splitext(file_path)
@@ -1317,7 +2946,7 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
             
             # For remaining image files, use PIL as fallback
             try:
-                with Image.open(file_path) as img:
+                with Image.open(io.BytesIO(source.data) if isinstance(source, MemoryDownload) else source) as img:
                     format_ext = img.format.lower()
                     if format_ext == 'jpeg':
                         return '.jpg'
@@ -1342,59 +2971,161 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
             self.log_message(f"Could not determine file type for {file_path}: {e}", "WARNING")
             return None
 
-    def verify_upload(self, original_file_path, target_filename, expected_wikitext, file_page):
-        """Verify uploaded file matches original"""
-        try:
-            # Handle auto-incremented filenames
-            actual_filename = file_page.title(with_ns=False)
-            self.log_message(f"Verifying upload: {actual_filename}")
-            
-            # Get file info from Commons
-            try:
-                # Reload page to get latest info
-                file_page = self.FilePage(self.site, f'File:{actual_filename}')
-                file_info = file_page.latest_file_info
-                uploaded_size = file_info.size
-            except Exception as e:
-                return f"Not OK: Could not get file info - {str(e)}"
-            
-            # Get original file size
-            try:
-                original_size = os.path.getsize(original_file_path)
-            except Exception as e:
-                return f"Not OK: Could not get original file size - {str(e)}"
-            
-            # Compare file sizes (allow 2 byte difference in either direction)
-            size_diff = abs(uploaded_size - original_size)
-            if size_diff > 2:
-                return f"Not OK: Size mismatch (original: {original_size}, uploaded: {uploaded_size}, diff: {size_diff})"
-            
-            # Verify wikitext content
-            try:
-                uploaded_text = file_page.text
-                # Remove category added by pypan for comparison
-                expected_clean = expected_wikitext.replace("\n[[Category: Uploaded with pypan]]", "")
-                uploaded_clean = uploaded_text.replace("[[Category: Uploaded with pypan]]", "")
-                
-                if expected_clean.strip() == uploaded_clean.strip():
-                    return "Verified"
-                else:
-                    return "Not OK: Wikitext mismatch"
-            except Exception as e:
-                return f"Not OK: Could not verify wikitext - {str(e)}"
-                
-        except Exception as e:
-            return f"Not OK: Verification error - {str(e)}"
+    def query_existing_titles(self, titles):
+        """Check up to 50 File: titles in one API query; returns {title: exists}"""
+        request = self.site.simple_request(
+            action='query',
+            titles='|'.join(f'File:{title}' for title in titles),
+            formatversion=2
+        )
+        data = request.submit()
+        query = data.get('query', {})
+        # The API reports titles in normalized form (spaces, first-letter case)
+        normalized = {item['from']: item['to'] for item in query.get('normalized', [])}
+        pages = {page['title']: not (page.get('missing') or page.get('invalid')) for page in query.get('pages', [])}
+        answers = {}
+        for title in titles:
+            full_title = f'File:{title}'
+            page_title = normalized.get(full_title, full_title)
+            if page_title in pages:
+                answers[title] = pages[page_title]
+        return answers
+    
+    def query_titles_with_prefix(self, prefix):
+        """List every File: title starting with `prefix`, following API continuation"""
+        params = {
+            'action': 'query',
+            'list': 'allpages',
+            'apnamespace': 6,
+            'apprefix': prefix,
+            'aplimit': 'max',
+            'formatversion': 2,
+        }
+        titles = []
+        while True:
+            data = self.site.simple_request(**params).submit()
+            titles.extend(page['title'].split(':', 1)[1] for page in data.get('query', {}).get('allpages', []))
+            if 'continue' not in data:
+                return titles
+            params.update(data['continue'])
+    
+    def query_sha1_duplicate(self, sha1):
+        """Return the title of a file on the wiki with this SHA-1, or None"""
+        request = self.site.simple_request(
+            action='query',
+            list='allimages',
+            aisha1=sha1,
+            ailimit=1,
+            formatversion=2
+        )
+        data = request.submit()
+        images = data.get('query', {}).get('allimages', [])
+        if not images:
+            return None
+        return images[0]['title'].split(':', 1)[1]
+    
+    def query_file_info(self, titles):
+        """Fetch SHA-1, size and wikitext for up to 50 File: titles; returns {title: info}"""
+        params = {
+            'action': 'query',
+            'titles': '|'.join(f'File:{title}' for title in titles),
+            'prop': 'imageinfo|revisions',
+            'iiprop': 'sha1|size',
+            'rvprop': 'content',
+            'rvslots': 'main',
+            'formatversion': 2,
+        }
+        normalized = {}
+        pages = {}
+        while True:
+            data = self.site.simple_request(**params).submit()
+            query = data.get('query', {})
+            normalized.update((item['from'], item['to']) for item in query.get('normalized', []))
+            for page in query.get('pages', []):
+                if page.get('missing') or page.get('invalid'):
+                    continue
+                info = pages.setdefault(page['title'], {})
+                if page.get('imageinfo'):
+                    info['sha1'] = page['imageinfo'][0].get('sha1')
+                    info['size'] = page['imageinfo'][0].get('size')
+                if page.get('revisions'):
+                    info['text'] = page['revisions'][0].get('slots', {}).get('main', {}).get('content')
+            # Large pages can push some revision contents into a continuation
+            if 'continue' not in data:
+                break
+            params.update(data['continue'])
+        answers = {}
+        for title in titles:
+            full_title = f'File:{title}'
+            page_title = normalized.get(full_title, full_title)
+            if page_title in pages:
+                answers[title] = pages[page_title]
+        return answers
+    
+    def new_upload_job(self, row_data, row_index):
+        """Create the per-row state that is handed from one pipeline stage to the next"""
+        file_path, target_filename, description = row_data[:3]
+        return {
+            'row_index': row_index,
+            'file_path': file_path,
+            'target_filename': target_filename,
+            'description': description,
+            'downloaded_file': None,
+            'converted_file': None,
+            'needs_conversion': False,
+            'file_ext': None,
+            'sha1': None,
+            'retries': {},
+            # Small downloads held in memory (MemoryDownload) until the upload needs a file
+            'payload': None,
+            # Encoder preset of this row (None: the run's), and how its video was converted
+            'preset': row_data[3] if len(row_data) > 3 else None,
+            'encode': {},
+        }
+    
+    def make_result(self, job, status, error=''):
+        return {
+            'row': job['row_index'] + 1,
+            'file_path': job['file_path'],
+            'target_filename': job['target_filename'],
+            'status': status,
+            'error': error,
+            # Shared with the job, so retries made after this point still show up
+            'retries': job['retries'],
+            'encode': job['encode'],
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+    
+    def cleanup_job_files(self, job):
+        """Remove the temporary download and conversion files of a job"""
+        job['payload'] = None
+        for key in ('downloaded_file', 'converted_file'):
+            temp_path = job.get(key)
+            if temp_path and os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                    self.log_message(f"Cleaned up temporary file: {temp_path}")
+                except Exception as e:
+                    self.log_message(f"Could not remove temporary file {temp_path}: {e}", "WARNING")
+            job[key] = None
+    
+    def wait_while_paused(self):
+        """Block while the batch is paused; returns False once it has been stopped"""
+        while self.is_paused and self.is_running:
+            time.sleep(0.5)
+        return self.is_running
+    
+    def stage_fetch(self, job):
+        """Pipeline stage 1 (network): download URL sources and check the file exists
         
-    def upload_single_file(self, row_data, row_index):
-        """Upload a single file with retry logic"""
-        from pywikibot.exceptions import UploadError
-        file_path, target_filename, description = row_data
+        Returns a final result to end the job, or None to pass it on.
+        """
+        if not self.wait_while_paused():
+            return self.make_result(job, 'Failed', 'Upload stopped by user')
+        file_path = job['file_path']
         
         # Check if file_path is a URL
         is_url = False
-        downloaded_file = None
-        converted_file = None
         try:
             parsed = urlparse(file_path)
             is_url = parsed.scheme in ('http', 'https')
@@ -1403,479 +3134,1095 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
         
         # Download file if it's a URL
         if is_url:
+            # Stay within the lookahead and disk budget ahead of the uploads
+            if self.prefetch_gate and not self.prefetch_gate.wait_turn(job['row_index'], lambda: self.is_running):
+                return self.make_result(job, 'Failed', 'Upload stopped by user')
             self.log_message(f"Detected URL: {file_path}")
             
-            # Check if it's a YouTube URL
-            if self.is_youtube_url(file_path):
-                self.log_message("YouTube URL detected, using yt-dlp...")
-                downloaded_file = self.download_youtube_video(file_path, self.max_attempts_var.get())
-            else:
-                downloaded_file = self.download_file_from_url(file_path, self.max_attempts_var.get())
+            # Check if it's a YouTube URL
+            if self.is_youtube_url(file_path):
+                self.log_message("YouTube URL detected, using yt-dlp...")
+                downloaded_file = self.download_youtube_video(file_path, self.max_attempts, job['retries'])
+            else:
+                downloaded_file = self.download_file_from_url(file_path, self.max_attempts, job['retries'])
+            
+            if not downloaded_file:
+                error_msg = 'Could not download YouTube video' if self.is_youtube_url(file_path) else 'Could not download file from URL or Wayback Machine'
+                return self.make_result(job, 'Failed', error_msg)
+            
+            if isinstance(downloaded_file, MemoryDownload):
+                # Detection and hashing read it from memory; job['file_path'] stays the URL
+                job['payload'] = downloaded_file
+                return self.stage_detect(job)
+            
+            job['downloaded_file'] = downloaded_file
+            job['file_path'] = file_path = downloaded_file
+            if self.prefetch_gate:
+                self.prefetch_gate.hold(job['row_index'], os.path.getsize(downloaded_file))
+        
+        # Check if file exists first
+        if not os.path.exists(file_path):
+            return self.make_result(job, 'Skipped', 'File not found')
+        
+        # Videos go on to the conversion stage; everything else is ready for upload
+        _, original_ext = os.path.splitext(file_path)
+        if original_ext.lower() in VIDEO_FORMATS_TO_CONVERT:
+            job['needs_conversion'] = True
+            return None
+        return self.stage_detect(job)
+    
+    def stage_convert(self, job):
+        """Pipeline stage 2 (CPU): convert video formats to WebM, then detect the file type"""
+        if not self.wait_while_paused():
+            self.cleanup_job_files(job)
+            return self.make_result(job, 'Failed', 'Upload stopped by user')
+        file_path = job['file_path']
+        _, original_ext = os.path.splitext(file_path)
+        self.log_message(f"Detected video format {original_ext}, converting to WebM...")
+        converted_file = self.convert_video_to_webm(file_path, preset=job['preset'], stats=job['encode'])
+        
+        if not converted_file:
+            if self.stop_event.is_set():
+                reason = 'Upload stopped by user'
+            else:
+                reason = f'Could not convert {original_ext} to WebM. Install moviepy: pip install moviepy'
+            result = self.make_result(job, 'Failed', reason)
+            # Cleanup downloaded file if exists
+            self.cleanup_job_files(job)
+            return result
+        
+        job['converted_file'] = converted_file
+        job['file_path'] = converted_file
+        # Update target filename to use .webm extension
+        target_filename = job['target_filename']
+        if '.' in target_filename:
+            target_filename = target_filename.rsplit('.', 1)[0] + '.webm'
+        else:
+            target_filename = target_filename + '.webm'
+        job['target_filename'] = target_filename
+        self.log_message(f"Video converted successfully, new filename: {target_filename}")
+        return self.stage_detect(job)
+    
+    def stage_detect(self, job):
+        """Detect the real file type and build the final, sanitized target filename"""
+        file_path = job['file_path']
+        source = job['payload'] or file_path
+        actual_file_ext = self.get_extension_from_file(source)
+        
+        # Skip if no extension could be determined
+        if not actual_file_ext:
+            self.cleanup_job_files(job)
+            self.log_message(f"Skipping {file_path}: Could not determine file extension", "WARNING")
+            return self.make_result(job, 'Skipped', 'Could not determine file extension')
+        
+        # Check if extension is allowed
+        if actual_file_ext not in ALLOWED_EXTENSIONS:
+            self.cleanup_job_files(job)
+            self.log_message(f"Skipping {file_path}: Extension {actual_file_ext} not in allowed list", "WARNING")
+            return self.make_result(job, 'Skipped', f'File extension {actual_file_ext} not allowed')
+        
+        # Remove any existing extension from target filename and add the correct one
+        target_filename = job['target_filename']
+        target_filename_base = target_filename
+        if '.' in target_filename:
+            parts = target_filename.rsplit('.', 1)
+            if len(parts) == 2 and f'.{parts[1].lower()}' in ALLOWED_EXTENSIONS:
+                target_filename_base = parts[0]
+        
+        # Sanitize filename to remove illegal characters
+        target_filename_base = sanitize_filename(target_filename_base)
+        job['target_filename'] = target_filename_base + actual_file_ext
+        job['file_ext'] = actual_file_ext
+        # Skip content Commons already has before any bytes are sent
+        if self.skip_duplicates and self.duplicate_finder:
+            try:
+                job['sha1'] = file_sha1(source)
+                duplicate = self.duplicate_finder.find(job['sha1'])
+            except Exception as e:
+                self.log_message(f"Could not check {file_path} for duplicates: {e}", "WARNING")
+                duplicate = None
+            if duplicate:
+                self.cleanup_job_files(job)
+                self.log_message(f"Skipping {file_path}: duplicate of File:{duplicate}", "WARNING")
+                return self.make_result(job, 'Skipped', f'Duplicate of File:{duplicate}')
+        
+        # Queue the title so its existence is checked in a batch before an upload slot needs it
+        if self.title_resolver:
+            self.title_resolver.prefetch([job['target_filename']])
+        return None
+    
+    def stage_upload(self, job):
+        """Pipeline stage 3 (API): upload with retries, verify, and clean up temp files"""
+        try:
+            if job['payload']:
+                # pywikibot uploads from a path, so the bytes are written out only now
+                job['downloaded_file'] = job['file_path'] = job['payload'].materialize()
+                job['payload'] = None
+            if not (job['sha1'] and self.duplicate_finder):
+                return self.upload_prepared_file(job)
+            # Rows of this run with the same content are uploaded only once
+            duplicate = self.duplicate_finder.claim(job['sha1'])
+            if duplicate:
+                self.log_message(f"Skipping {job['file_path']}: duplicate of File:{duplicate}", "WARNING")
+                return self.make_result(job, 'Skipped', f'Duplicate of File:{duplicate}')
+            try:
+                return self.upload_prepared_file(job)
+            finally:
+                self.duplicate_finder.release(job['sha1'])
+        finally:
+            self.cleanup_job_files(job)
+    
+    def upload_prepared_file(self, job):
+        """Upload a downloaded/converted and type-checked file with retry logic"""
+        from pywikibot.exceptions import UploadError
+        file_path = job['file_path']
+        target_filename = job['target_filename']
+        description = job['description']
+                
+        result = self.make_result(job, 'Failed')
+        
+        for attempt in range(self.max_attempts):
+            reserved_title = None
+            error = None
+            try:
+                # Check if paused
+                if not self.wait_while_paused():
+                    result['error'] = 'Upload stopped by user'
+                    return result
+                
+                # Check the shared connectivity state before each upload
+                if not self.connectivity.is_online():
+                    self.log_message(f"No internet connection for {target_filename}, waiting...", "WARNING")
+                    if not self.wait_for_internet():
+                        result['error'] = 'No internet connection'
+                        return result
+                
+                # Check if file exists
+                if not os.path.exists(file_path):
+                    result['error'] = f'File not found: {file_path}'
+                    return result
+                
+                # Wait for a free upload slot; the number of slots adapts to server load
+                if not self.upload_slots.acquire(lambda: self.is_running):
+                    result['error'] = 'Upload stopped by user'
+                    return result
+                try:
+                    # Pick a free title (the allocator reserves it so no other worker can take it)
+                    original_target_filename = job['target_filename']
+                    target_filename = reserved_title = self.title_allocator.allocate(original_target_filename)
+                    if target_filename != original_target_filename:
+                        self.log_message(f"Using filename: {target_filename} (original was taken)")
+                    result['target_filename'] = target_filename
+                    
+                    # Create FilePage with ignore_extension to prevent validation issues with dots in filename
+                    file_page = self.FilePage(self.site, f'File:{target_filename}', ignore_extension=True)
+                    
+                    # Upload file
+                    self.log_message(f"Uploading {target_filename} (attempt {attempt + 1})")
+                    
+                    success = file_page.upload(
+                        source=file_path,
+                        comment=f"Pypan 0.2.1a0",
+                        text=description,
+                        ignore_warnings=self.ignore_warnings
+                    )
+                finally:
+                    self.upload_slots.release()
+                
+                if success:
+                    self.upload_slots.record_success()
+                    self.title_allocator.confirm(target_filename)
+                    if job['sha1'] and self.duplicate_finder:
+                        self.duplicate_finder.remember(job['sha1'], target_filename)
+                    result['status'] = 'Success'
+                    result['error'] = ''
+                    self.log_message(f"Successfully uploaded {target_filename}")
+                    
+                    # The hash is checked against the wiki later, in a batch with other uploads
+                    result['sha1'] = job['sha1'] or file_sha1(file_path)
+                    result['verification'] = 'Pending'
+                    result['expected_wikitext'] = description
+                    
+                    # Wait after successful upload
+                    time.sleep(self.pause_after_upload)
+                    return result
+                else:
+                    result['error'] = 'Upload failed - server response'
+                    
+            except UploadError as e:
+                result['error'] = f'Upload warning: {str(e)}'
+                self.log_message(f"Upload warning for {target_filename}: {str(e)}", "WARNING")
+                self.upload_slots.record_error(e)
+                error = e
+                
+            except Exception as e:
+                result['error'] = f'Exception: {str(e)}'
+                self.log_message(f"Error uploading {target_filename}: {str(e)}", "ERROR")
+                # Could be the network; let the monitor re-check it
+                self.connectivity.report_failure()
+                self.upload_slots.record_error(e)
+                error = e
+            
+            if reserved_title:
+                self.title_allocator.release(reserved_title)
+            
+            # Wait before retry, unless retrying cannot help
+            if not self.retry_after_failure(error, attempt, self.max_attempts, job['retries']):
+                break
+            
+        return result
+    
+    def record_result(self, result):
+        """Keep a finished row's outcome and append it to the journal"""
+        expected_wikitext = result.pop('expected_wikitext', None)
+        with self.results_lock:
+            self.results.append(result)
+        if self.journal:
+            self.journal.append(result)
+        # Queued only now, so the verified entry is journaled after this one
+        if expected_wikitext is not None and self.verifier:
+            self.verifier.add(result, expected_wikitext)
+    
+    def record_verification(self, result):
+        """Verifier hook: journal a result again with its verification filled in"""
+        self.log_message(f"Verification of {result['target_filename']}: {result['verification']}")
+        if self.journal:
+            self.journal.append(result)
+    
+    def choose_output_path(self):
+        """Pick the results file of a new run
+        
+        An existing file is left alone and the results go to a numbered name
+        next to it; a resumed run rewrites its own results file in place. The
+        choice holds for the whole run, so files written meanwhile (e.g. by
+        `export`) cannot move it.
+        """
+        output_path = self.output_file
+        if os.path.exists(output_path) and not self.resume_previous:
+            base_name, extension = os.path.splitext(output_path)
+            counter = 1
+            while os.path.exists(f"{base_name}_{counter}{extension}"):
+                counter += 1
+            output_path = f"{base_name}_{counter}{extension}"
+            self.log_message(f"Output file exists, results will be saved to: {output_path}")
+        self.output_path = output_path
+    
+    def save_results(self):
+        """Save results to file (Excel, CSV, or JSON) with status in last column
+        
+        The output is built once from the result journal, so it can also be
+        produced on demand for a run that is still going or was interrupted.
+        """
+        try:
+            journal_path = journal_path_for(self.output_file)
+            if self.journal:
+                self.journal.sync()
+            if os.path.exists(journal_path):
+                results = ResultJournal.load(journal_path).values()
+            else:
+                with self.results_lock:
+                    results = list(self.results)
+            
+            output_path = self.output_path or self.output_file
+            _, ext = os.path.splitext(output_path)
+            ext = ext.lower()
+            
+            results_by_row = {result['row']: result for result in results}
+            
+            def describe_encode(encode):
+                if not encode:
+                    return ''
+                cached = ' (cached)' if encode.get('cached') else ''
+                if encode.get('method') == 'remux':
+                    return 'remux' + cached
+                if encode.get('fps'):
+                    return f"{encode['preset']}, {encode['fps']:.1f} fps{cached}"
+                return encode.get('preset', '') + cached
+            
+            def status_columns(row_number):
+                result = results_by_row.get(row_number)
+                if result is None:
+                    return '', '', '', ''
+                retries = ', '.join(f"{name}: {count}" for name, count in sorted((result.get('retries') or {}).items()))
+                encode = describe_encode(result.get('encode'))
+                if result['status'] == 'Success':
+                    return 'Success', result.get('verification', ''), retries, encode
+                elif result['status'] == 'Skipped':
+                    return f"Skipped: {result['error']}", '', retries, encode
+                return f"Failed: {result['error']}", '', retries, encode
+            
+            # Manifest rows are streamed again and written out one at a time
+            rows = self.iter_manifest_rows(self.input_file)
+            
+            # Save based on file type
+            if ext in ['.xlsx', '.xls']:
+                # Use openpyxl directly to preserve formulas
+                from openpyxl import Workbook
+                wb = Workbook(write_only=True)
+                ws = wb.create_sheet()
+                
+                # Write data row by row, preserving formulas
+                for r_idx, row in enumerate(rows):
+                    values = []
+                    for c_idx, str_value in enumerate(row):
+                        # Check if this is intended as text that starts with = (wikitext)
+                        # vs an actual Excel formula
+                        # For the description column (index 2), always treat as text
+                        if c_idx == 2 and str_value.startswith('='):
+                            # Escape with single quote to prevent Excel from treating as formula
+                            values.append("'" + str_value)
+                        else:
+                            # For other columns, a leading = is written as formula
+                            values.append(str_value)
+                    ws.append(values + list(status_columns(r_idx + 1)))
+                wb.save(output_path)
+            elif ext == '.csv':
+                import csv
+                with open(output_path, 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.writer(f)
+                    for r_idx, row in enumerate(rows):
+                        writer.writerow(row + list(status_columns(r_idx + 1)))
+            elif ext == '.json':
+                # Convert to JSON format, one array item at a time
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write('[')
+                    r_idx = -1
+                    for r_idx, row in enumerate(rows):
+                        upload_status, verification, retries, encode = status_columns(r_idx + 1)
+                        item = {
+                            'file_path': row[0],
+                            'target_filename': row[1],
+                            'description': row[2],
+                        }
+                        if len(row) > 3 and row[3]:
+                            item['preset'] = row[3]
+                        item.update({
+                            'upload_status': upload_status,
+                            'verification': verification,
+                            'retries': retries,
+                            'encode': encode
+                        })
+                        item = json.dumps(item, indent=2, ensure_ascii=False)
+                        f.write((',\n' if r_idx else '\n') + '\n'.join('  ' + line for line in item.split('\n')))
+                    f.write('\n]' if r_idx >= 0 else ']')
+            
+            self.log_message(f"Results saved to {output_path}")
+        except Exception as e:
+            self.log_message(f"Error saving results: {str(e)}", "ERROR")
+            
+    def build_upload_task(self, index, row):
+        """Turn a manifest row into (file_path, target_filename, description, preset), or None to skip it
+        
+        The row's encoder preset (see ENCODER_PRESETS) comes from the `preset`
+        key of a JSON manifest, or from the fourth column of a table whose
+        first row is a header naming that column `preset`. Other fourth
+        columns (e.g. the status of a results file fed back in) are ignored.
+        """
+        if index == 0 and len(row) > 3 and row[3].strip().lower() == 'preset':
+            # Header row: not uploaded, it only switches the preset column on
+            self.preset_column = True
+            return None
+        file_path, target_filename, description = row[0], row[1], row[2]
+        preset = row[3].strip().lower() if self.preset_column and len(row) > 3 and row[3] else None
+        if preset and preset not in ENCODER_PRESETS:
+            # Once per value, not once per row
+            if preset not in self.unknown_presets:
+                self.unknown_presets.add(preset)
+                self.log_message(f"Row {index + 1}: unknown encoder preset '{row[3]}', using {self.encoder_preset} for every row naming it", "WARNING")
+            preset = None
+        # Handle Excel formulas - if description starts with =, Excel might treat it as formula
+        # We need to read it as raw string
+        if description:
+            # If Excel stripped the leading =, try to detect and restore it
+            if not description.startswith('=') and not description.startswith('{'):
+                # Check if it looks like it should have started with =
+                if description.startswith('={{') or description.startswith('{int:'):
+                    description = '=' + description
+        description += "\n[[Category: Uploaded with pypan]]"
+        
+        if not (file_path and target_filename):
+            return None
+        # Log the description being used
+        self.log_message(f"Row {index + 1}: Using description (first 100 chars): {description[:100]}")
+        return (file_path, target_filename, description, preset)
+    
+    def collect_finished(self, in_flight, timeout=0.5):
+        """Wait up to `timeout` for in-flight uploads and record the ones that finished"""
+        done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            in_flight.pop(future)
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+                self.record_result(result)
+                
+                self.processed_files += 1
+                self.processed_this_run += 1
+                
+                if result['status'] == 'Success':
+                    self.successful_uploads += 1
+                else:
+                    self.failed_uploads += 1
+                    
+                self.update_progress()
+                
+            except Exception as e:
+                self.log_message(f"Error processing result: {str(e)}", "ERROR")
+                self.failed_uploads += 1
+    
+    def upload_worker_thread(self):
+        """Main upload worker thread"""
+        try:
+            if not self.initialize_pywikibot():
+                return
+            
+            # Process files with separate fetch / convert / upload worker pools
+            self.prefetch_gate = PrefetchGate(self.prefetch_rows, self.prefetch_disk_budget)
+            pipeline = UploadPipeline(self, self.download_workers, self.convert_workers, self.num_workers, self.prefetch_gate)
+            # Conversion stage threads run their encodes as ffmpeg processes
+            self.transcoder = TranscodeService(self.convert_workers, self.transcode_threads)
+            self.verifier = UploadVerifier(self.query_file_info, self.record_verification)
+            # The upload pool has num_workers threads; how many of them upload at once adapts
+            self.upload_slots = ConcurrencyController(self.num_workers, on_change=self.concurrency_changed)
+            try:
+                # Rows are streamed from the manifest and submitted as they are read,
+                # so uploads start before the whole file has been parsed. At most
+                # `window` rows are inside the pipeline at once, so memory does not
+                # grow with the manifest and Stop has no backlog to work through.
+                window = (self.num_workers + self.download_workers + self.convert_workers) * SUBMIT_WINDOW_FACTOR
+                # Rows inside the lookahead must be submitted before they can be prefetched
+                window = max(window, self.prefetch_rows + self.num_workers + self.convert_workers)
+                in_flight = {}
+                self.manifest_complete = False
+                # JSON rows carry a preset key; tables need a `preset` header (see build_upload_task)
+                self.preset_column = os.path.splitext(self.input_file)[1].lower() == '.json'
+                self.unknown_presets = set()
+                try:
+                    for index, row in enumerate(self.iter_manifest_rows(self.input_file)):
+                        if not self.is_running:
+                            break
+                        self.total_files = index + 1
+                        if (index + 1) in self.completed_rows:
+                            continue
+                        
+                        task = self.build_upload_task(index, row)
+                        if not task:
+                            continue
+                        # Backpressure: wait for a free slot before reading further
+                        while len(in_flight) >= window and self.is_running:
+                            self.collect_finished(in_flight)
+                        if not self.is_running:
+                            break
+                        upcoming = urlparse(task[0]).scheme in ('http', 'https') and not self.is_youtube_url(task[0])
+                        if upcoming:
+                            self.wayback.note_upcoming(task[0])
+                        future = pipeline.submit(task, index)
+                        if upcoming:
+                            # Rows leave the lookahead however they end (cache hit, Stop, failure)
+                            future.add_done_callback(lambda f, url=task[0], wayback=self.wayback: wayback.forget(url))
+                        in_flight[future] = index
+                    else:
+                        self.manifest_complete = True
+                except Exception as e:
+                    self.log_message(f"Error reading file: {str(e)}", "ERROR")
+                
+                if self.total_files == 0:
+                    self.log_message("No files found in input file", "ERROR")
+                    return
+                self.log_message(f"Found {self.total_files} files to upload")
+                if self.completed_rows:
+                    self.update_progress()
+                
+                # Drain the window; after Stop every stage returns straight away,
+                # and rows already uploading are still recorded so a resume sees them
+                while in_flight:
+                    self.collect_finished(in_flight)
+            finally:
+                pipeline.shutdown(wait=True)
+                self.transcoder.shutdown()
+                self.transcoder = None
+                # Deferred verification of the last, partly filled batch
+                self.verifier.flush()
+                self.verifier = None
+                        
+            self.save_results()
+            
+        except Exception as e:
+            self.log_message(f"Upload thread error: {str(e)}", "ERROR")
+            
+    def run(self):
+        """Run the whole batch on the calling thread and return when it finishes or is stopped"""
+        # Reset counters and stop flag
+        self.stop_event.clear()
+        self.processed_files = 0
+        self.processed_this_run = 0
+        self.successful_uploads = 0
+        self.failed_uploads = 0
+        self.total_files = 0
+        self.results = []
+        self.completed_rows = set()
+        self.start_time = time.time()
+        self.is_running = True
+        self.is_paused = False
+        self.choose_output_path()
+        
+        self.retry_policy = RetryPolicy(self.pause_seconds, budget=self.retry_budget)
+        self.http.close()
+        self.http = make_http_session(self.download_workers + self.num_workers)
+        self.download_cache = BlobCache(self.download_cache_dir, self.download_cache_size) if self.download_cache_size > 0 else None
+        self.conversion_cache = BlobCache(self.conversion_cache_dir, self.conversion_cache_size) if self.conversion_cache_size > 0 else None
+        self.wayback.shutdown()
+        self.wayback = WaybackResolver(self.query_wayback_snapshot, is_online=self.test_internet_connection)
+        self.log_message("Starting upload process")
+        self.journal = ResultJournal(journal_path_for(self.output_file))
+        try:
+            resumed = self.resume_previous and self.load_previous_results()
+            self.journal.open(truncate=not resumed)
+            if not resumed:
+                self.journal.append({'input_file': os.path.abspath(self.input_file), 'started': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+            self.connectivity.start()
+            self.upload_worker_thread()
+        finally:
+            self.connectivity.stop()
+            self.wayback.shutdown()
+            self.journal.close()
+            self.journal = None
+            self.is_running = False
+            self.is_paused = False
+            self.log_message("Upload process completed")
+            self.log_message(f"Total: {self.total_files}, Success: {self.successful_uploads}, Failed: {self.failed_uploads}")
+            self.log_message(f"Retries: {self.retry_policy.summary()}")
+    
+    def load_previous_results(self):
+        """Load the durable outcomes of a previous run of this manifest for resuming
+        
+        Rows that already succeeded or were skipped are marked complete and are
+        not scheduled again; pending and failed rows are. Returns False when
+        there is nothing to resume from.
+        """
+        journal_path = journal_path_for(self.output_file)
+        if not os.path.exists(journal_path):
+            self.log_message(f"No previous run journal at {journal_path}, starting from the first row")
+            return False
+        
+        # The first line of a journal names the manifest it was written for
+        try:
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or '{}')
+        except ValueError:
+            header = {}
+        journal_input = header.get('input_file')
+        if journal_input and os.path.abspath(self.input_file) != journal_input:
+            self.log_message(f"Journal {journal_path} belongs to {journal_input}, starting from the first row", "WARNING")
+            return False
+        
+        previous = ResultJournal.load(journal_path)
+        for row_number, result in previous.items():
+            if result.get('status') not in ('Success', 'Skipped'):
+                continue
+            self.completed_rows.add(row_number)
+            self.results.append(result)
+            self.processed_files += 1
+            if result['status'] == 'Success':
+                self.successful_uploads += 1
+            else:
+                self.failed_uploads += 1
+        
+        self.log_message(f"Resuming previous run: {len(self.completed_rows)} rows already done, "
+                         f"{len(previous) - len(self.completed_rows)} failed rows will be retried")
+        return True
+    
+    def pause(self):
+        """Pause the running batch; workers wait before their next attempt"""
+        self.is_paused = True
+        self.log_message("Upload paused")
+    
+    def resume(self):
+        """Resume a paused batch"""
+        self.is_paused = False
+        self.log_message("Upload resumed")
+    
+    def stop(self):
+        """Stop the running batch"""
+        self.is_running = False
+        self.is_paused = False
+        self.stop_event.set()
+        # Running encodes are killed now rather than at their next progress poll
+        if self.transcoder:
+            self.transcoder.cancel_all()
+        # Queued rows are not cancelled; each one returns "Upload stopped by
+        # user" from stage_fetch as soon as it reaches a fetch thread
+        self.log_message("Upload stopped by user")
+
+class PyPan:
+    """Tk front end; all upload work is delegated to an UploadEngine"""
+    def __init__(self, root):
+        self.root = root
+        self.root.title("PyPan")
+        self.root.geometry("800x600")
+        
+        self.engine = UploadEngine()
+        self.engine.on_log = self.append_log
+        self.engine.on_progress = self.update_progress
+        # Status changes arrive from the connectivity thread; hand them to Tk's thread
+        self.engine.on_internet_status = lambda status: self.root.after(0, self.update_internet_status, status)
+        
+        self.input_file = tk.StringVar()
+        self.output_file = tk.StringVar(value="upload_results.xlsx")
+        self.num_workers_var = tk.IntVar(value=1)
+        self.is_logged_in = False
+        self.internet_status = tk.StringVar(value="Unknown")
+               
+        self.setup_ui()
+        self.engine.check_external_dependencies()
+        # Check internet connection on startup
+        threading.Thread(target=self.engine.test_internet_connection, daemon=True).start()
+        
+    def setup_ui(self):
+        # Set window icon
+        try:
+            # When compiled, use the exe's embedded icon
+            if getattr(sys.modules[__name__], '__compiled__', False):
+                self.root.iconbitmap(default=sys.executable)
+            else:
+                # When running as script, use icon file
+                icon_path = get_resource_path('icon.ico')
+                if os.path.exists(icon_path):
+                    self.root.iconbitmap(icon_path)
+        except Exception as e:
+            # Icon is optional, continue without it
+            pass
+        
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        config_frame = ttk.LabelFrame(main_frame, text="Configuration", padding="10")
+        config_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(config_frame, text="Login Status:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+        self.login_status_var = tk.StringVar(value="Not logged in")
+        self.login_status_label = ttk.Label(config_frame, textvariable=self.login_status_var, font=('Arial', 10, 'bold'), foreground='red')
+        self.login_status_label.grid(row=0, column=1, sticky=tk.W, padx=(0, 5))
+        
+        self.login_btn = ttk.Button(config_frame, text="Login", command=self.show_login_window)
+        self.login_btn.grid(row=0, column=2, sticky=tk.W)
+        
+        # Family and Language settings 
+        ttk.Label(config_frame, text="Family:").grid(row=0, column=3, sticky=tk.W, padx=(10, 5))
+        self.family_var = tk.StringVar(value="commons")
+        ttk.Entry(config_frame, textvariable=self.family_var, width=12).grid(row=0, column=4, sticky=tk.W, padx=(0, 5))
+        
+        ttk.Label(config_frame, text="Lang:").grid(row=0, column=5, sticky=tk.W, padx=(10, 5))
+        self.mylang_var = tk.StringVar(value="commons")
+        ttk.Entry(config_frame, textvariable=self.mylang_var, width=12).grid(row=0, column=6, sticky=tk.W, padx=(0, 10))
+        
+        ttk.Label(config_frame, text="Input File:").grid(row=1, column=0, sticky=tk.W, padx=(0, 5))
+        ttk.Entry(config_frame, textvariable=self.input_file, width=50).grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(0, 5))
+        ttk.Button(config_frame, text="Browse", command=self.browse_input_file).grid(row=1, column=2, sticky=tk.W)
+        
+        ttk.Label(config_frame, text="Output File:").grid(row=2, column=0, sticky=tk.W, padx=(0, 5))
+        ttk.Entry(config_frame, textvariable=self.output_file, width=30).grid(row=2, column=1, sticky=(tk.W, tk.E), padx=(0, 10))
+        
+        ttk.Label(config_frame, text="Parallelization:").grid(row=4, column=0, sticky=tk.W, padx=(0,5))
+        self.num_workers_var = tk.IntVar(value=1)
+        ttk.Entry(config_frame, textvariable=self.num_workers_var, width=5).grid(row=4, column=1, sticky=tk.W, padx=(0,10))
+        
+        ttk.Label(config_frame, text="Pause Between Retry(s):").grid(row=4, column=2, sticky=tk.W, padx=(10,5))
+        self.pause_seconds_var = tk.IntVar(value=10)
+        ttk.Entry(config_frame, textvariable=self.pause_seconds_var, width=5).grid(row=4, column=3, sticky=tk.W, padx=(0,10))
+        
+        ttk.Label(config_frame, text="Max Retry Attempts:").grid(row=4, column=4, sticky=tk.W, padx=(10,5))
+        self.max_attempts_var = tk.IntVar(value=10)
+        ttk.Entry(config_frame, textvariable=self.max_attempts_var, width=5).grid(row=4, column=5, sticky=tk.W, padx=(0,10))
+        
+        ttk.Label(config_frame, text="Pause After Upload(s):").grid(row=5, column=2, sticky=tk.W, padx=(10,5))
+        self.pause_after_upload_var = tk.DoubleVar(value=0.2)
+        ttk.Entry(config_frame, textvariable=self.pause_after_upload_var, width=5).grid(row=5, column=3, sticky=tk.W, padx=(0,10))
+        
+        ttk.Label(config_frame, text="Ignore Warnings:").grid(row=5, column=0, sticky=tk.W, padx=(0,5))
+        self.ignore_warnings_var = tk.StringVar(value="True")
+        ignore_dropdown = ttk.Combobox(config_frame, textvariable=self.ignore_warnings_var, values=["True", "False"], width=5, state="readonly")
+        ignore_dropdown.grid(row=5, column=1, sticky=tk.W, padx=(0,10))
+        
+        ttk.Label(config_frame, text="Resume Previous Run:").grid(row=5, column=4, sticky=tk.W, padx=(10,5))
+        self.resume_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, variable=self.resume_var).grid(row=5, column=5, sticky=tk.W, padx=(0,10))
+        
+        ttk.Label(config_frame, text="Skip Duplicates:").grid(row=3, column=2, sticky=tk.W, padx=(10,5))
+        self.skip_duplicates_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(config_frame, variable=self.skip_duplicates_var).grid(row=3, column=3, sticky=tk.W, padx=(0,10))
+
+        ttk.Label(config_frame, text="Video Preset:").grid(row=3, column=4, sticky=tk.W, padx=(10,5))
+        self.encoder_preset_var = tk.StringVar(value=DEFAULT_ENCODER_PRESET)
+        ttk.Combobox(config_frame, textvariable=self.encoder_preset_var, values=list(ENCODER_PRESETS), width=9, state="readonly").grid(row=3, column=5, sticky=tk.W, padx=(0,10))
+
+        ttk.Label(config_frame, text="Internet Status:").grid(row=3, column=0, sticky=tk.W, padx=(0, 5))
+        self.internet_status_label = ttk.Label(config_frame, textvariable=self.internet_status, foreground="gray")
+        self.internet_status_label.grid(row=3, column=1, sticky=tk.W, padx=(0, 10))
+        
+        config_frame.columnconfigure(1, weight=1)
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        self.start_btn = ttk.Button(button_frame, text="Start Upload", command=self.start_upload)
+        self.start_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.pause_btn = ttk.Button(button_frame, text="Pause", command=self.pause_upload, state=tk.DISABLED)
+        self.pause_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.stop_btn = ttk.Button(button_frame, text="Stop", command=self.stop_upload, state=tk.DISABLED)
+        self.stop_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.test_connection_btn = ttk.Button(button_frame, text="Test Connection", command=self.test_internet_connection)
+        self.test_connection_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.clear_btn = ttk.Button(button_frame, text="Reset", command=self.clear_reset)
+        self.clear_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
+        progress_frame = ttk.LabelFrame(main_frame, text="Progress", padding="10")
+        progress_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        self.progress_var = tk.DoubleVar()
+        self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100)
+        self.progress_bar.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 5))
+        
+        self.status_label = ttk.Label(progress_frame, text="Ready")
+        self.status_label.grid(row=1, column=0, sticky=tk.W)
+        
+        self.stats_label = ttk.Label(progress_frame, text="Files: 0/0 | Success: 0 | Failed: 0")
+        self.stats_label.grid(row=2, column=0, sticky=tk.W)
+        
+        self.time_label = ttk.Label(progress_frame, text="Time: 00:00:00 | ETA: --:--:--")
+        self.time_label.grid(row=3, column=0, sticky=tk.W)
+        
+        progress_frame.columnconfigure(0, weight=1)
+        
+        log_frame = ttk.LabelFrame(main_frame, text="Log", padding="10")
+        log_frame.grid(row=3, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        
+        self.log_text = tk.Text(log_frame, height=15, wrap=tk.WORD)
+        scrollbar = ttk.Scrollbar(log_frame, orient=tk.VERTICAL, command=self.log_text.yview)
+        self.log_text.configure(yscrollcommand=scrollbar.set)
+        
+        self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        
+        log_frame.columnconfigure(0, weight=1)
+        log_frame.rowconfigure(0, weight=1)
+        
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.rowconfigure(3, weight=1)
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+        
+    def show_login_window(self):
+        """Show login dialog"""
+        login_window = tk.Toplevel(self.root)
+        login_window.title("Wikimedia - Login")
+        login_window.geometry("400x275")
+        login_window.resizable(False, False)
+        login_window.transient(self.root)
+        login_window.grab_set()
+        
+        # Center window
+        login_window.update_idletasks()
+        width = login_window.winfo_width()
+        height = login_window.winfo_height()
+        x = (login_window.winfo_screenwidth() // 2) - (width // 2)
+        y = (login_window.winfo_screenheight() // 2) - (height // 2)
+        login_window.geometry(f'{width}x{height}+{x}+{y}')
+        
+        main_frame = ttk.Frame(login_window, padding="20")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        title_label = ttk.Label(main_frame, text="Wikimedia Login", 
+                               font=('Arial', 14, 'bold'))
+        title_label.grid(row=0, column=0, columnspan=3, pady=(0, 20))
+        
+        ttk.Label(main_frame, text="Username:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        username_var = tk.StringVar()
+        username_entry = ttk.Entry(main_frame, textvariable=username_var, width=30)
+        username_entry.grid(row=1, column=1, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        username_entry.focus()
+        
+        ttk.Label(main_frame, text="Password:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        password_var = tk.StringVar()
+        show_password_var = tk.BooleanVar(value=False)
+        password_entry = ttk.Entry(main_frame, textvariable=password_var, show="●", width=30)
+        password_entry.grid(row=2, column=1, sticky=(tk.W, tk.E), pady=5)
+        
+        def toggle_password():
+            if show_password_var.get():
+                password_entry.config(show="●")
+                show_password_var.set(False)
+            else:
+                password_entry.config(show="")
+                show_password_var.set(True)
+        
+        eye_button = ttk.Button(main_frame, text="👁", width=3, command=toggle_password)
+        eye_button.grid(row=2, column=2, sticky=tk.W, padx=(5, 0), pady=5)
+        
+        status_label = ttk.Label(main_frame, text="", font=('Arial', 9), foreground='red')
+        status_label.grid(row=3, column=0, columnspan=3, pady=(5, 10))
+        
+        info_frame = ttk.Frame(main_frame)
+        info_frame.grid(row=4, column=0, columnspan=3, pady=(0, 20))
+        
+        ttk.Label(info_frame, text="Enter your Wikimedia credentials", 
+                 font=('Arial', 8), foreground='gray').pack()
+        
+        creds_frame = ttk.Frame(info_frame)
+        creds_frame.pack()
+        ttk.Label(creds_frame, text="Use ", font=('Arial', 8), foreground='gray').pack(side=tk.LEFT)
+        
+        def open_bot_password():
+            import webbrowser
+            webbrowser.open("https://commons.wikimedia.org/wiki/Special:BotPasswords")
+        
+        bot_link = ttk.Button(creds_frame, text="bot password", command=open_bot_password, 
+                             style='Link.TButton', cursor='hand2')
+        bot_link.pack(side=tk.LEFT)
+        ttk.Label(creds_frame, text=" if you have 2FA enabled", 
+                 font=('Arial', 8), foreground='gray').pack(side=tk.LEFT)
+        
+        def do_login():
+            username = username_var.get().strip()
+            password = password_var.get().strip()
+            
+            if not username or not password:
+                status_label.config(text="Please enter both username and password", foreground='red')
+                return
+            
+            status_label.config(text="Logging in...", foreground='blue')
+            login_window.update()
+            
+            # Create config files
+            self.apply_settings()
+            if self.engine.create_config_files(username, password):
+                # Try to initialize pywikibot
+                if self.engine.test_login():
+                    self.engine.username = username
+                    self.engine.password = password
+                    self.is_logged_in = True
+                    family = self.family_var.get()
+                    mylang = self.mylang_var.get()
+                    self.login_status_var.set(f"Logged in as {username}")
+                    self.login_status_label.config(foreground='green')
+                    self.login_btn.config(text="Logout", command=self.do_logout)
+                    self.log_message(f"Successfully logged in as {username} to {mylang}.{family}")
+                    login_window.destroy()
+                else:
+                    status_label.config(text="Login failed! Please check credentials and try again.", foreground='red')
+                    self.log_message("Login failed - invalid credentials or connection issue", "ERROR")
+                    self.engine.cleanup_config_files()
+            else:
+                status_label.config(text="Failed to create config files. Try again.", foreground='red')
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=5, column=0, columnspan=3)
+        
+        ttk.Button(button_frame, text="Login", command=do_login, width=15).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=login_window.destroy, width=15).pack(side=tk.LEFT, padx=5)
+        
+        login_window.bind('<Return>', lambda e: do_login())
+        
+        main_frame.columnconfigure(1, weight=1)
+        login_window.columnconfigure(0, weight=1)
+        login_window.rowconfigure(0, weight=1)
+    
+    def do_logout(self):
+        """Logout and cleanup"""
+        self.engine.cleanup_config_files()
+        self.engine.username = None
+        self.engine.password = None
+        self.is_logged_in = False
+        self.login_status_var.set("Not logged in")
+        self.login_status_label.config(foreground='red')
+        self.login_btn.config(text="Login", command=self.show_login_window)
+        self.log_message("Logged out successfully")
+    
+    def browse_input_file(self):
+        filename = filedialog.askopenfilename(
+            title="Select input file",
+            filetypes=[
+                ("Supported files", "*.xlsx *.xls *.csv *.json"),
+                ("Excel files", "*.xlsx *.xls"),
+                ("CSV files", "*.csv"),
+                ("JSON files", "*.json"),
+                ("All files", "*.*")
+            ]
+        )
+        if filename:
+            self.input_file.set(filename)
+            # Setting output file to same directory of input
+            self.output_file.set(default_output_path(filename))
+    
+    def apply_settings(self):
+        """Copy the values entered in the window into the engine"""
+        self.engine.input_file = self.input_file.get()
+        self.engine.output_file = self.output_file.get()
+        self.engine.family = self.family_var.get()
+        self.engine.mylang = self.mylang_var.get()
+        self.engine.num_workers = self.num_workers_var.get()
+        self.engine.max_attempts = self.max_attempts_var.get()
+        self.engine.pause_seconds = self.pause_seconds_var.get()
+        self.engine.pause_after_upload = self.pause_after_upload_var.get()
+        self.engine.ignore_warnings = (self.ignore_warnings_var.get() == "True")
+        self.engine.resume_previous = self.resume_var.get()
+        self.engine.skip_duplicates = self.skip_duplicates_var.get()
+        self.engine.encoder_preset = self.encoder_preset_var.get()
+            
+    def log_message(self, message, level="INFO"):
+        self.engine.log_message(message, level)
+    
+    def append_log(self, formatted_message, level="INFO"):
+        """Engine log hook: append a formatted line to the log pane"""
+        self.log_text.insert(tk.END, formatted_message)
+        self.log_text.see(tk.END)
+        self.root.update_idletasks()
+            
+    def update_internet_status(self, status):
+        """Update internet status in UI"""
+        self.internet_status.set(status)
+        if status == "Active":
+            self.internet_status_label.config(foreground="green")
+        elif status == "Inactive":
+            self.internet_status_label.config(foreground="red")
+        else:
+            self.internet_status_label.config(foreground="gray")
+    
+    def test_internet_connection(self):
+        """Test Connection button handler"""
+        if self.engine.test_internet_connection():
+            self.log_message("Internet connection is working")
+            messagebox.showinfo("Connection Test", "Internet connection is working!")
+        else:
+            self.log_message("Internet connection failed", "ERROR")
             
-            if not downloaded_file:
-                error_msg = 'Could not download YouTube video' if self.is_youtube_url(file_path) else 'Could not download file from URL or Wayback Machine'
-                result = {
-                    'row': row_index + 1,
-                    'file_path': file_path,
-                    'target_filename': target_filename,
-                    'status': 'Failed',
-                    'error': error_msg,
-                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                return result
-            
-            file_path = downloaded_file
-        
-        # Check if file exists first
-        if not os.path.exists(file_path):
-            result = {
-                'row': row_index + 1,
-                'file_path': file_path,
-                'target_filename': target_filename,
-                'status': 'Skipped',
-                'error': 'File not found',
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            return result
+    def clear_reset(self):
+        """Clear all fields and reset the application state"""
+        if self.engine.is_running:
+            response = messagebox.askyesno(
+                "Upload in Progress",
+                "An upload is currently in progress. Are you sure you want to reset?"
+            )
+            if not response:
+                return
+            # Stop the upload
+            self.engine.stop()
         
-        # Check if file needs video conversion
-        _, original_ext = os.path.splitext(file_path)
-        if original_ext.lower() in VIDEO_FORMATS_TO_CONVERT:
-            self.log_message(f"Detected video format {original_ext}, converting to WebM...")
-            converted_file = self.convert_video_to_webm(file_path)
-            
-            if not converted_file:
-                result = {
-                    'row': row_index + 1,
-                    'file_path': file_path,
-                    'target_filename': target_filename,
-                    'status': 'Failed',
-                    'error': f'Could not convert {original_ext} to WebM. Install moviepy: pip install moviepy',
-                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                # Cleanup downloaded file if exists
-                if downloaded_file and os.path.exists(downloaded_file):
-                    try:
-                        os.remove(downloaded_file)
-                        self.log_message(f"Cleaned up downloaded temp file: {downloaded_file}")
-                    except Exception as e:
-                        self.log_message(f"Could not remove downloaded file {downloaded_file}: {e}", "WARNING")
-                return result
-            
-            file_path = converted_file
-            # Update target filename to use .webm extension
-            if '.' in target_filename:
-                target_filename = target_filename.rsplit('.', 1)[0] + '.webm'
-            else:
-                target_filename = target_filename + '.webm'
-            self.log_message(f"Video converted successfully, new filename: {target_filename}")
+        # Logout if logged in
+        if self.is_logged_in:
+            self.do_logout()
         
-        actual_file_ext = self.get_extension_from_file(file_path)
+        # Clear input fields
+        self.input_file.set("")
+        self.output_file.set("upload_results.xlsx")
+        self.num_workers_var.set(1)
+        self.pause_seconds_var.set(10)
+        self.max_attempts_var.set(10)
+        self.pause_after_upload_var.set(0.2)
+        self.ignore_warnings_var.set("True")
+        self.resume_var.set(False)
+        self.skip_duplicates_var.set(True)
+        self.encoder_preset_var.set(DEFAULT_ENCODER_PRESET)
         
-        # Skip if no extension could be determined
-        if not actual_file_ext:
-            # Cleanup temp files
-            if downloaded_file and os.path.exists(downloaded_file):
-                try:
-                    os.remove(downloaded_file)
-                except:
-                    pass
-            if converted_file and os.path.exists(converted_file):
-                try:
-                    os.remove(converted_file)
-                except:
-                    pass
-            result = {
-                'row': row_index + 1,
-                'file_path': file_path,
-                'target_filename': target_filename,
-                'status': 'Skipped',
-                'error': 'Could not determine file extension',
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            self.log_message(f"Skipping {file_path}: Could not determine file extension", "WARNING")
-            return result
+        # Reset family and lang to defaults
+        self.family_var.set("commons")
+        self.mylang_var.set("commons")
         
-        # Check if extension is allowed
-        if actual_file_ext not in ALLOWED_EXTENSIONS:
-            # Cleanup temp files
-            if downloaded_file and os.path.exists(downloaded_file):
-                try:
-                    os.remove(downloaded_file)
-                except:
-                    pass
-            if converted_file and os.path.exists(converted_file):
-                try:
-                    os.remove(converted_file)
-                except:
-                    pass
-            result = {
-                'row': row_index + 1,
-                'file_path': file_path,
-                'target_filename': target_filename,
-                'status': 'Skipped',
-                'error': f'File extension {actual_file_ext} not allowed',
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            self.log_message(f"Skipping {file_path}: Extension {actual_file_ext} not in allowed list", "WARNING")
-            return result
+        # Reset stop event for next run
+        self.engine.stop_event.clear()
         
-        # Remove any existing extension from target filename and add the correct one
-        target_filename_base = target_filename
-        if '.' in target_filename:
-            parts = target_filename.rsplit('.', 1)
-            if len(parts) == 2 and f'.{parts[1].lower()}' in ALLOWED_EXTENSIONS:
-                target_filename_base = parts[0]
+        # Reset counters
+        self.engine.processed_files = 0
+        self.engine.processed_this_run = 0
+        self.engine.successful_uploads = 0
+        self.engine.failed_uploads = 0
+        self.engine.total_files = 0
+        self.engine.results = []
+        self.engine.start_time = None
         
-        # Sanitize filename to remove illegal characters
-        target_filename_base = sanitize_filename(target_filename_base)
-        target_filename = target_filename_base + actual_file_ext
-                
-        result = {
-            'row': row_index + 1,
-            'file_path': file_path,
-            'target_filename': target_filename,
-            'status': 'Failed',
-            'error': '',
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        # Reset UI elements
+        self.progress_var.set(0)
+        self.status_label.config(text="Ready")
+        self.stats_label.config(text="Files: 0/0 | Success: 0 | Failed: 0")
+        self.time_label.config(text="Time: 00:00:00 | ETA: --:--:--")
+        self.update_internet_status("Unknown")
         
-        for attempt in range(self.max_attempts_var.get()):
-            try:
-                # Check if paused
-                while self.is_paused and self.is_running:
-                    time.sleep(0.5)
-                    
-                if not self.is_running:
-                    result['error'] = 'Upload stopped by user'
-                    # Cleanup temp files
-                    if downloaded_file and os.path.exists(downloaded_file):
-                        try:
-                            os.remove(downloaded_file)
-                        except:
-                            pass
-                    if converted_file and os.path.exists(converted_file):
-                        try:
-                            os.remove(converted_file)
-                        except:
-                            pass
-                    return result
-                
-                # Check internet connection before each upload
-                if not self.test_internet_connection():
-                    self.log_message(f"No internet connection for {target_filename}, waiting...", "WARNING")
-                    if not self.wait_for_internet():
-                        result['error'] = 'No internet connection'
-                        return result
-                
-                # Check if file exists
-                if not os.path.exists(file_path):
-                    result['error'] = f'File not found: {file_path}'
-                    return result
-                
-                # Create FilePage with ignore_extension to prevent validation issues with dots in filename
-                original_target_filename = target_filename
-                counter = 0
-                file_page = self.FilePage(self.site, f'File:{target_filename}', ignore_extension=True)
-                
-                # Check if file already exists and auto-increment
-                while file_page.exists():
-                    counter += 1
-                    # Split filename and extension
-                    name_parts = original_target_filename.rsplit('.', 1)
-                    if len(name_parts) == 2:
-                        target_filename = f"{name_parts[0]} ({counter}).{name_parts[1]}"
-                    else:
-                        target_filename = f"{original_target_filename} ({counter})"
-                    file_page = self.FilePage(self.site, f'File:{target_filename}', ignore_extension=True)
-                    self.log_message(f"File exists, trying: {target_filename}")
-                
-                if counter > 0:
-                    self.log_message(f"Using filename: {target_filename} (original was taken)")
-                
-                # Upload file
-                self.log_message(f"Uploading {target_filename} (attempt {attempt + 1})")
-                
-                success = file_page.upload(
-                    source=file_path,
-                    comment=f"Pypan 0.2.1a0",
-                    text=description,
-                    ignore_warnings=(self.ignore_warnings_var.get() == "True")
-                )
-                
-                if success:
-                    result['status'] = 'Success'
-                    result['error'] = ''
-                    self.log_message(f"Successfully uploaded {target_filename}")
-                    
-                    # Verify upload 
-                    verification_result = self.verify_upload(file_path, target_filename, description, file_page)
-                    result['verification'] = verification_result
-                    self.log_message(f"Verification: {verification_result}")
-                    
-                    # Update results file incrementally
-                    self.results.append(result)
-                    self.save_results()
-                    self.results.pop()  # Remove to avoid duplicate when returned
-                    
-                    # Wait after successful upload
-                    time.sleep(self.pause_after_upload_var.get())
-                    return result
-                else:
-                    result['error'] = 'Upload failed - server response'
-                    
-            except UploadError as e:
-                result['error'] = f'Upload warning: {str(e)}'
-                self.log_message(f"Upload warning for {target_filename}: {str(e)}", "WARNING")
-                
-            except Exception as e:
-                result['error'] = f'Exception: {str(e)}'
-                self.log_message(f"Error uploading {target_filename}: {str(e)}", "ERROR")
-            
-            # Wait before retry 
-            if attempt < self.max_attempts_var.get() - 1:
-                self.log_message(f"Waiting {self.pause_seconds_var.get()} seconds before retry (attempt {attempt + 1}/{self.max_attempts_var.get()})")
-                time.sleep(self.pause_seconds_var.get())
+        # Clear log
+        self.log_text.delete(1.0, tk.END)
         
-        # Cleanup downloaded file if it was from URL
-        if downloaded_file and os.path.exists(downloaded_file):
-            try:
-                os.remove(downloaded_file)
-                self.log_message(f"Cleaned up temporary file: {downloaded_file}")
-            except Exception as e:
-                self.log_message(f"Could not remove temporary file {downloaded_file}: {e}", "WARNING")
+        # Reset buttons
+        self.start_btn.config(state=tk.NORMAL)
+        self.pause_btn.config(state=tk.DISABLED, text="Pause")
+        self.stop_btn.config(state=tk.DISABLED)
         
-        # Cleanup converted file if it was created
-        if converted_file and os.path.exists(converted_file):
-            try:
-                os.remove(converted_file)
-                self.log_message(f"Cleaned up converted file: {converted_file}")
-            except Exception as e:
-                self.log_message(f"Could not remove converted file {converted_file}: {e}", "WARNING")
+        self.log_message("Application reset successfully")
+        messagebox.showinfo("Reset Complete", "All fields and settings have been reset")
             
-        return result
-        
     def update_progress(self):
         """Update progress indicators"""
-        if self.total_files > 0:
-            progress = (self.processed_files / self.total_files) * 100
+        engine = self.engine
+        if engine.total_files > 0:
+            progress = (engine.processed_files / engine.total_files) * 100
             self.progress_var.set(progress)
             
-            # Update stats
+            # Update stats ("+" while the manifest is still being read)
+            total_str = f"{engine.total_files}" if engine.manifest_complete else f"{engine.total_files}+"
             self.stats_label.config(
-                text=f"Files: {self.processed_files}/{self.total_files} | "
-                     f"Success: {self.successful_uploads} | "
-                     f"Failed: {self.failed_uploads}"
+                text=f"Files: {engine.processed_files}/{total_str} | "
+                     f"Success: {engine.successful_uploads} | "
+                     f"Failed: {engine.failed_uploads}"
             )
             
             # Calculate time and ETA
-            if self.start_time:
-                elapsed = time.time() - self.start_time
+            if engine.start_time:
+                elapsed = time.time() - engine.start_time
                 elapsed_str = time.strftime("%H:%M:%S", time.gmtime(elapsed))
                 
-                if self.processed_files > 0:
-                    avg_time_per_file = elapsed / self.processed_files
-                    remaining_files = self.total_files - self.processed_files
-                    eta_seconds = avg_time_per_file * remaining_files
+                # Includes the time running video conversions still need
+                eta_seconds = engine.estimate_remaining()
+                if eta_seconds is not None:
                     eta_str = time.strftime("%H:%M:%S", time.gmtime(eta_seconds))
                 else:
                     eta_str = "--:--:--"
                     
                 self.time_label.config(text=f"Time: {elapsed_str} | ETA: {eta_str}")
-                
-    def save_results(self):
-        """Save results to file (Excel, CSV, or JSON) with status in last column"""
-        try:
-            output_path = self.output_file.get()
-            _, ext = os.path.splitext(output_path)
-            ext = ext.lower()
-            
-            # Check if output file already exists and create unique name
-            if os.path.exists(output_path):
-                base_name, extension = os.path.splitext(output_path)
-                counter = 1
-                while os.path.exists(f"{base_name}_{counter}{extension}"):
-                    counter += 1
-                output_path = f"{base_name}_{counter}{extension}"
-                self.output_file.set(output_path)
-                self.log_message(f"Output file exists, using: {output_path}")
-            
-            input_df = self.read_input_file(self.input_file.get())
-            if input_df is None:
-                self.log_message("Could not read input file for results", "ERROR")
-                return
-            
-            input_df['Upload_Status'] = ''
-            input_df['Verification'] = ''
-            
-            # Update status for each row based on results
-            for result in self.results:
-                row_idx = result['row'] - 1  # Convert to 0-based index
-                if row_idx < len(input_df):
-                    if result['status'] == 'Success':
-                        input_df.loc[row_idx, 'Upload_Status'] = 'Success'
-                        input_df.loc[row_idx, 'Verification'] = result.get('verification', '')
-                    elif result['status'] == 'Skipped':
-                        input_df.loc[row_idx, 'Upload_Status'] = f"Skipped: {result['error']}"
-                    else:
-                        input_df.loc[row_idx, 'Upload_Status'] = f"Failed: {result['error']}"
-            
-            # Save based on file type
-            if ext in ['.xlsx', '.xls']:
-                # Use openpyxl directly to preserve formulas
-                import openpyxl
-                from openpyxl import Workbook
-                wb = Workbook()
-                ws = wb.active
-                
-                # Write data row by row, preserving formulas
-                for r_idx, row in input_df.iterrows():
-                    for c_idx, value in enumerate(row):
-                        if pd.notna(value):
-                            str_value = str(value)
-                            # Check if this is intended as text that starts with = (wikitext)
-                            # vs an actual Excel formula
-                            # For the description column (index 2), always treat as text
-                            if c_idx == 2 and str_value.startswith('='):
-                                # Escape with single quote to prevent Excel from treating as formula
-                                ws.cell(row=r_idx + 1, column=c_idx + 1).value = "'" + str_value
-                            elif str_value.startswith('='):
-                                # For other columns, write as formula
-                                ws.cell(row=r_idx + 1, column=c_idx + 1).value = str_value
-                            else:
-                                ws.cell(row=r_idx + 1, column=c_idx + 1).value = str_value
-                        else:
-                            ws.cell(row=r_idx + 1, column=c_idx + 1).value = ''
-                wb.save(output_path)
-            elif ext == '.csv':
-                input_df.to_csv(output_path, index=False, header=False)
-            elif ext == '.json':
-                # Convert to JSON format
-                json_data = []
-                for _, row in input_df.iterrows():
-                    json_data.append({
-                        'file_path': str(row[0]) if pd.notna(row[0]) else '',
-                        'target_filename': str(row[1]) if pd.notna(row[1]) else '',
-                        'description': str(row[2]) if pd.notna(row[2]) else '',
-                        'upload_status': str(row['Upload_Status']) if pd.notna(row['Upload_Status']) else '',
-                        'verification': str(row['Verification']) if pd.notna(row['Verification']) else ''
-                    })
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(json_data, f, indent=2, ensure_ascii=False)
-            
-            self.log_message(f"Results saved to {output_path}")
-        except Exception as e:
-            self.log_message(f"Error saving results: {str(e)}", "ERROR")
             
+            if engine.is_running and not engine.is_paused:
+                self.status_label.config(text=engine.conversion_status() or "Uploading...")
+    
     def upload_worker_thread(self):
-        """Main upload worker thread"""
+        """Run the engine, then restore the window state"""
         try:
-            df = self.read_input_file(self.input_file.get())
-            if df is None:
-                self.log_message("Could not read input file", "ERROR")
-                return
-            
-            self.total_files = len(df)
-            
-            if self.total_files == 0:
-                self.log_message("No files found in input file", "ERROR")
-                return
-                
-            self.log_message(f"Found {self.total_files} files to upload")
-            
-            if not self.initialize_pywikibot():
-                return
-                
-            # Process files with thread pool
-            with ThreadPoolExecutor(max_workers=self.num_workers_var.get()) as executor:
-                self.executor = executor
-                
-                # Submit all tasks
-                future_to_row = {}
-                for index, row in df.iterrows():
-                    if not self.is_running:
-                        break
-                        
-                    file_path = str(row[0]) if pd.notna(row[0]) else ""
-                    target_filename = str(row[1]) if pd.notna(row[1]) else ""
-                    # Handle Excel formulas - if description starts with =, Excel might treat it as formula
-                    # We need to read it as raw string
-                    if pd.notna(row[2]):
-                        description = str(row[2])
-                        # If Excel stripped the leading =, try to detect and restore it
-                        if not description.startswith('=') and not description.startswith('{'):
-                            # Check if it looks like it should have started with =
-                            if description.startswith('={{') or description.startswith('{int:'):
-                                description = '=' + description
-                    else:
-                        description = ""
-                    description += "\n[[Category: Uploaded with pypan]]"
-                    
-                    if file_path and target_filename:
-                        # Log the description being used
-                        self.log_message(f"Row {index + 1}: Using description (first 100 chars): {description[:100]}")
-                        future = executor.submit(
-                            self.upload_single_file, 
-                            (file_path, target_filename, description),
-                            index
-                        )
-                        future_to_row[future] = index
-                        
-                # Process completed tasks
-                for future in as_completed(future_to_row):
-                    if not self.is_running:
-                        break
-                        
-                    try:
-                        result = future.result()
-                        self.results.append(result)
-                        
-                        self.processed_files += 1
-                        
-                        if result['status'] == 'Success':
-                            self.successful_uploads += 1
-                        else:
-                            self.failed_uploads += 1
-                            
-                        self.update_progress()
-                        
-                    except Exception as e:
-                        self.log_message(f"Error processing result: {str(e)}", "ERROR")
-                        self.failed_uploads += 1
-                        
-            self.save_results()
-            
-        except Exception as e:
-            self.log_message(f"Upload thread error: {str(e)}", "ERROR")
+            self.engine.run()
         finally:
             self.upload_finished()
-            
+                
     def upload_finished(self):
         """Called when upload process is finished"""
-        self.is_running = False
-        self.is_paused = False
-        
+        engine = self.engine
         self.start_btn.config(state=tk.NORMAL)
         self.pause_btn.config(state=tk.DISABLED, text="Pause")
         self.stop_btn.config(state=tk.DISABLED)
         
         self.status_label.config(text="Upload completed")
         
-        self.log_message("Upload process completed")
-        self.log_message(f"Total: {self.total_files}, Success: {self.successful_uploads}, Failed: {self.failed_uploads}")
-        
         # completion dialog
         messagebox.showinfo(
             "Upload Complete",
             f"Batch upload completed!\n\n"
-            f"Total files: {self.total_files}\n"
-            f"Successful: {self.successful_uploads}\n"
-            f"Failed: {self.failed_uploads}\n\n"
-            f"Results saved to:\n{self.output_file.get()}"
+            f"Total files: {engine.total_files}\n"
+            f"Successful: {engine.successful_uploads}\n"
+            f"Failed: {engine.failed_uploads}\n\n"
+            f"Results saved to:\n{engine.output_path or engine.output_file}"
         )
         
         # Cleanup config files
-        self.cleanup_config_files()
+        self.engine.cleanup_config_files()
         
     def start_upload(self):
         """Start the upload process"""
@@ -1896,57 +4243,189 @@ os.environ['PYWIKIBOT_NO_USER_CONFIG'] = '2'
         if not os.path.exists(self.input_file.get()):
             messagebox.showerror("Error", "Input file does not exist")
             return
-            
-        # Reset counters and stop flag
-        self.stop_event.clear()
-        self.processed_files = 0
-        self.successful_uploads = 0
-        self.failed_uploads = 0
-        self.results = []
-        self.start_time = time.time()
         
-        self.is_running = True
-        self.is_paused = False
+        self.apply_settings()
+        
         self.start_btn.config(state=tk.DISABLED)
         self.pause_btn.config(state=tk.NORMAL, text="Pause")
         self.stop_btn.config(state=tk.NORMAL)
         
         self.status_label.config(text="Starting upload...")
-        self.log_message("Starting upload process")
         
         # Start worker thread
         threading.Thread(target=self.upload_worker_thread, daemon=True).start()
         
     def pause_upload(self):
         """Pause/resume the upload process"""
-        if self.is_paused:
-            self.is_paused = False
+        if self.engine.is_paused:
+            self.engine.resume()
             self.pause_btn.config(text="Pause")
             self.status_label.config(text="Resuming upload...")
-            self.log_message("Upload resumed")
         else:
-            self.is_paused = True
+            self.engine.pause()
             self.pause_btn.config(text="Resume")
             self.status_label.config(text="Upload paused")
-            self.log_message("Upload paused")
             
     def stop_upload(self):
         """Stop the upload process"""
-        self.is_running = False
-        self.is_paused = False
-        self.stop_event.set()
-        
-        if self.executor:
-            self.executor.shutdown(wait=False)
-            
+        self.engine.stop()
         self.status_label.config(text="Stopping upload...")
-        self.log_message("Upload stopped by user")
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+
+def build_arg_parser():
+    """Command-line interface: `pypan run manifest.xlsx --workers N ...`"""
+    parser = argparse.ArgumentParser(prog='pypan', description='PyPan - Wikimedia Commons batch uploader')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    run_parser = subparsers.add_parser('run', help='Upload every row of a manifest without the GUI')
+    run_parser.add_argument('manifest', help='Input file (.xlsx, .xls, .csv or .json)')
+    run_parser.add_argument('-o', '--output', help='Results file (default: <manifest>_results.<ext>)')
+    run_parser.add_argument('-w', '--workers', type=int, default=1, help='Concurrent uploads (default: 1)')
+    run_parser.add_argument('--download-workers', type=int, default=2, help='Concurrent URL/YouTube downloads (default: 2)')
+    run_parser.add_argument('--convert-workers', type=int, default=1, help='Concurrent video conversions (default: 1)')
+    run_parser.add_argument('--transcode-threads', type=int, default=TRANSCODE_CPU_THREADS,
+                            help='Encoder threads shared by the concurrent conversions (default: CPU count, %(default)s)')
+    run_parser.add_argument('--preset', choices=list(ENCODER_PRESETS), default=DEFAULT_ENCODER_PRESET,
+                            help='Video encoder preset for rows that do not name one (default: %(default)s)')
+    run_parser.add_argument('--prefetch', type=int, default=PREFETCH_ROWS,
+                            help=f'Download remote sources up to N rows ahead of the uploads (default: {PREFETCH_ROWS})')
+    run_parser.add_argument('--prefetch-disk', type=int, default=PREFETCH_DISK_BUDGET // (1024 * 1024),
+                            help='Disk space in MB that downloaded files waiting for upload may take (default: %(default)s)')
+    run_parser.add_argument('--max-attempts', type=int, default=10, help='Max retry attempts per file (default: 10)')
+    run_parser.add_argument('--pause', type=float, default=10, help='Base pause between retries in seconds, doubled on each retry (default: 10)')
+    run_parser.add_argument('--retry-budget', type=int, default=RETRY_BUDGET,
+                            help=f'Most retries allowed in the whole run (default: {RETRY_BUDGET})')
+    run_parser.add_argument('--pause-after-upload', type=float, default=0.2, help='Pause after each successful upload in seconds (default: 0.2)')
+    run_parser.add_argument('--respect-warnings', action='store_true', help='Do not ignore upload warnings')
+    run_parser.add_argument('--resume', action='store_true',
+                            help='Continue a previous run with the same output file, skipping rows already done')
+    run_parser.add_argument('--allow-duplicates', action='store_true',
+                            help='Upload files even when Commons already has the same content (SHA-1)')
+    run_parser.add_argument('--cache-size', type=int, default=DOWNLOAD_CACHE_MAX_BYTES // (1024 * 1024),
+                            help='Size limit of the download cache in MB; 0 turns it off (default: %(default)s)')
+    run_parser.add_argument('--cache-dir', default=DOWNLOAD_CACHE_DIR,
+                            help='Directory of the download cache, shared between runs')
+    run_parser.add_argument('--conversion-cache-size', type=int, default=CONVERSION_CACHE_MAX_BYTES // (1024 * 1024),
+                            help='Size limit of the converted-video cache in MB; 0 turns it off (default: %(default)s)')
+    run_parser.add_argument('--conversion-cache-dir', default=CONVERSION_CACHE_DIR,
+                            help='Directory of the converted-video cache, shared between runs')
+    run_parser.add_argument('--family', default='commons', help='Wiki family (default: commons)')
+    run_parser.add_argument('--lang', default='commons', help='Wiki language (default: commons)')
+    run_parser.add_argument('-u', '--username', default=os.environ.get('PYPAN_USERNAME'),
+                            help='Wiki username (default: $PYPAN_USERNAME)')
+    run_parser.add_argument('--config-dir', default=CONFIG_DIR,
+                            help='Directory for the temporary pywikibot files; use one per parallel run')
+    
+    export_parser = subparsers.add_parser('export', help='Write the results file from a run\'s journal')
+    export_parser.add_argument('manifest', help='Input file the run was started with')
+    export_parser.add_argument('-o', '--output', help='Results file the run was started with (default: <manifest>_results.<ext>)')
+    return parser
+
+def export_cli(args):
+    """Build the results file from the journal of a finished, running or interrupted run"""
+    output_file = args.output or default_output_path(args.manifest)
+    journal_path = journal_path_for(output_file)
+    if not os.path.exists(journal_path):
+        print(f"No result journal found: {journal_path}", file=sys.stderr)
+        return 2
+    engine = UploadEngine()
+    engine.input_file = args.manifest
+    engine.output_file = output_file
+    engine.save_results()
+    return 0
+
+def run_cli(args):
+    """Run a batch from the command line and return the process exit code"""
+    if not os.path.exists(args.manifest):
+        print(f"Input file does not exist: {args.manifest}", file=sys.stderr)
+        return 2
+    if not args.username:
+        print("A username is required (--username or PYPAN_USERNAME)", file=sys.stderr)
+        return 2
+    # Password is never taken from the command line, where other users could see it
+    password = os.environ.get('PYPAN_PASSWORD') or getpass.getpass(f"Password for {args.username}: ")
+    
+    os.makedirs(args.config_dir, exist_ok=True)
+    engine = UploadEngine(config_dir=args.config_dir)
+    engine.input_file = args.manifest
+    engine.output_file = args.output or default_output_path(args.manifest)
+    engine.family = args.family
+    engine.mylang = args.lang
+    engine.num_workers = max(1, args.workers)
+    engine.download_workers = max(1, args.download_workers)
+    engine.convert_workers = max(1, args.convert_workers)
+    engine.transcode_threads = max(1, args.transcode_threads)
+    engine.encoder_preset = args.preset
+    engine.prefetch_rows = max(0, args.prefetch)
+    engine.prefetch_disk_budget = max(1, args.prefetch_disk) * 1024 * 1024
+    engine.max_attempts = max(1, args.max_attempts)
+    engine.pause_seconds = args.pause
+    engine.retry_budget = max(0, args.retry_budget)
+    engine.pause_after_upload = args.pause_after_upload
+    engine.ignore_warnings = not args.respect_warnings
+    engine.resume_previous = args.resume
+    engine.skip_duplicates = not args.allow_duplicates
+    engine.download_cache_dir = args.cache_dir
+    engine.download_cache_size = max(0, args.cache_size) * 1024 * 1024
+    engine.conversion_cache_dir = args.conversion_cache_dir
+    engine.conversion_cache_size = max(0, args.conversion_cache_size) * 1024 * 1024
+    engine.username = args.username
+    engine.password = password
+    
+    def report_progress():
+        slots = f" | Upload slots: {engine.upload_slots.limit}" if engine.upload_slots else ""
+        converting = engine.conversion_status()
+        converting = f" | {converting}" if converting else ""
+        eta_seconds = engine.estimate_remaining()
+        eta = f" | ETA: {time.strftime('%H:%M:%S', time.gmtime(eta_seconds))}" if eta_seconds is not None else ""
+        engine.logger.info(f"Progress: {engine.processed_files}/{engine.total_files} | "
+                           f"Success: {engine.successful_uploads} | Failed: {engine.failed_uploads}{slots}{converting}{eta}")
+    engine.on_progress = report_progress
+    
+    # Ctrl+C / SIGTERM stop the batch cleanly so results are still written
+    def handle_signal(signum, frame):
+        engine.stop()
+    signal.signal(signal.SIGINT, handle_signal)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, handle_signal)
+    
+    try:
+        if not engine.create_config_files(args.username, password):
+            return 1
+        engine.run()
+    finally:
+        engine.cleanup_config_files()
+    
+    engine.logger.info(f"Results saved to {engine.output_path or engine.output_file}")
+    return 0 if engine.failed_uploads == 0 else 1
 
 def main():
     # Create config directory if running as compiled executable
     if getattr(sys.modules[__name__], '__compiled__', False):
         os.makedirs(CONFIG_DIR, exist_ok=True)
     
+    setup_logging()
+    
+    # Any arguments select the command line; no arguments open the window
+    if len(sys.argv) > 1:
+        args = build_arg_parser().parse_args()
+        if args.command == 'run':
+            sys.exit(run_cli(args))
+        if args.command == 'export':
+            sys.exit(export_cli(args))
+        build_arg_parser().print_help()
+        sys.exit(2)
+    
+    if tk is None:
+        print("Tkinter is not available; use the command line: pypan run <manifest>", file=sys.stderr)
+        sys.exit(2)
+    
     root = tk.Tk()
     app = PyPan(root)
     root.mainloop()
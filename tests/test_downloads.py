@@ -0,0 +1,287 @@
+import os
+import re
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import Pypan
+from Pypan import BlobCache, UploadEngine, WaybackResolver
+
+# Several DOWNLOAD_CHUNK_SIZE chunks, so a cut transfer leaves whole chunks on disk
+BODY = bytes(range(256)) * (40 * 1024) + b'tail'
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves `server.body` with byte ranges and If-Range, like a static file host"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send_headers(self, status, length, extra=()):
+        self.send_response(status)
+        if self.command == 'GET' and not self.server.get_length:
+            # The body then ends when the connection closes
+            self.close_connection = True
+        else:
+            self.send_header('Content-Length', str(length))
+        self.send_header('ETag', self.server.etag)
+        if not self.server.ignore_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        for name, value in extra:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        length = self.server.head_length
+        self.send_headers(200, len(self.server.body) if length is None else length)
+
+    def do_GET(self):
+        body = self.server.body
+        requested = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        self.server.requests.append((requested, if_range))
+        if self.headers.get('If-None-Match') == self.server.etag:
+            self.send_headers(304, 0)
+            return
+        match = re.match(r'bytes=(\d+)-(\d*)$', requested or '')
+        # A stale If-Range validator gets the whole current body
+        if match and not self.server.ignore_ranges and if_range in (None, self.server.etag):
+            first = int(match.group(1))
+            last = int(match.group(2)) if match.group(2) else len(body) - 1
+            if first >= len(body):
+                self.send_headers(416, 0)
+                return
+            content = body[first:last + 1]
+            self.send_headers(206, len(content), [('Content-Range', f'bytes {first}-{last}/{len(body)}')])
+        else:
+            first = 0
+            content = body
+            self.send_headers(200, len(content))
+        if first in self.server.drop_at:
+            # Cut the connection halfway through the body, once
+            self.server.drop_at.discard(first)
+            self.wfile.write(content[:len(content) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(content)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.daemon_threads = True
+    httpd.body = BODY
+    httpd.etag = '"v1"'
+    httpd.ignore_ranges = False
+    # Content-Length reported by HEAD, when it differs from the body
+    httpd.head_length = None
+    httpd.get_length = True
+    httpd.drop_at = set()
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f'http://127.0.0.1:{httpd.server_address[1]}/file.bin'
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = UploadEngine(config_dir=str(tmp_path))
+    # Always stream to a file, whatever the body size
+    engine.spool_max_bytes = 0
+    return engine
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_resumes_after_connection_drops_mid_body(server, engine, tmp_path):
+    target = str(tmp_path / 'download')
+    state = {}
+    server.drop_at = {0}
+    with pytest.raises(Exception):
+        engine.fetch_to_file(server.url, target, state)
+    have = os.path.getsize(target)
+    assert 0 < have < len(BODY)
+
+    assert engine.fetch_to_file(server.url, target, state) is None
+    assert read(target) == BODY
+    assert server.requests[-1] == (f'bytes={have}-', '"v1"')
+
+
+def test_restarts_when_server_answers_200_to_a_resume(server, engine, tmp_path):
+    target = str(tmp_path / 'download')
+    state = {}
+    server.drop_at = {0}
+    with pytest.raises(Exception):
+        engine.fetch_to_file(server.url, target, state)
+    assert os.path.getsize(target) < len(BODY)
+
+    server.ignore_ranges = True
+    engine.fetch_to_file(server.url, target, state)
+    # The full body replaces the partial file instead of being appended to it
+    assert read(target) == BODY
+    assert server.requests[-1][0] is not None
+
+
+def test_stale_if_range_validator_fetches_the_new_body(server, engine, tmp_path):
+    target = str(tmp_path / 'download')
+    state = {}
+    server.drop_at = {0}
+    with pytest.raises(Exception):
+        engine.fetch_to_file(server.url, target, state)
+
+    # The file changes on the server between attempts, keeping its size
+    server.body = bytes(reversed(BODY))
+    server.etag = '"v2"'
+    engine.fetch_to_file(server.url, target, state)
+    assert server.requests[-1][1] == '"v1"'
+    assert read(target) == server.body
+
+
+def test_resized_file_is_fetched_whole_and_checked_against_its_new_size(server, engine, tmp_path):
+    target = str(tmp_path / 'download')
+    state = {}
+    server.drop_at = {0}
+    with pytest.raises(Exception):
+        engine.fetch_to_file(server.url, target, state)
+
+    server.body = BODY + b'0123456789'
+    server.etag = '"v2"'
+    assert engine.fetch_to_file(server.url, target, state) is None
+    assert read(target) == server.body
+    assert state['size'] == len(server.body)
+    assert state['validator'] == '"v2"'
+
+
+def test_size_comes_from_the_get_response_not_head(server, engine, tmp_path):
+    target = str(tmp_path / 'download')
+    server.head_length = len(BODY) - 10
+    assert engine.fetch_to_file(server.url, target, {}) is None
+    assert read(target) == BODY
+
+
+def test_parallel_ranges_are_stitched_in_order(server, engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(Pypan, 'PARALLEL_DOWNLOAD_MIN_SIZE', 1)
+    target = str(tmp_path / 'download')
+    engine.fetch_to_file(server.url, target, {})
+
+    assert read(target) == BODY
+    part_size = -(-len(BODY) // Pypan.DOWNLOAD_RANGE_PARTS)
+    expected = {f'bytes={first}-{min(len(BODY), first + part_size) - 1}'
+                for first in range(0, len(BODY), part_size)}
+    assert {requested for requested, _ in server.requests} == expected
+    assert os.listdir(tmp_path) == ['download']
+
+
+def test_parallel_ranges_resume_only_the_broken_part(server, engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(Pypan, 'PARALLEL_DOWNLOAD_MIN_SIZE', 1)
+    target = str(tmp_path / 'download')
+    state = {}
+    part_size = -(-len(BODY) // Pypan.DOWNLOAD_RANGE_PARTS)
+    server.drop_at = {part_size}
+    with pytest.raises(Exception):
+        engine.fetch_to_file(server.url, target, state)
+    kept = os.path.getsize(f'{target}.part1')
+    assert 0 < kept < part_size
+    server.requests.clear()
+
+    engine.fetch_to_file(server.url, target, state)
+    assert read(target) == BODY
+    assert [requested for requested, _ in server.requests] == [f'bytes={part_size + kept}-{2 * part_size - 1}']
+
+
+def test_parallel_ranges_fall_back_to_one_request_without_range_support(server, engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(Pypan, 'PARALLEL_DOWNLOAD_MIN_SIZE', 1)
+    target = str(tmp_path / 'download')
+    state = {}
+    # HEAD advertised ranges, but the GETs answer 200 with the whole body
+    state.update(url=server.url, **engine.probe_download(server.url))
+    server.ignore_ranges = True
+    with pytest.raises(IOError):
+        engine.fetch_to_file(server.url, target, state)
+    assert state['ranges'] is False
+
+    engine.fetch_to_file(server.url, target, state)
+    assert read(target) == BODY
+    assert os.listdir(tmp_path) == ['download']
+
+
+def test_parallel_parts_of_a_changed_file_are_discarded(server, engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(Pypan, 'PARALLEL_DOWNLOAD_MIN_SIZE', 1)
+    target = str(tmp_path / 'download')
+    state = {}
+    part_size = -(-len(BODY) // Pypan.DOWNLOAD_RANGE_PARTS)
+    server.drop_at = {part_size}
+    with pytest.raises(Exception):
+        engine.fetch_to_file(server.url, target, state)
+    assert os.path.exists(f'{target}.part1')
+
+    # The old parts must not be completed with bytes of the new version
+    server.body = bytes(reversed(BODY)) + b'new'
+    server.etag = '"v2"'
+    with pytest.raises(IOError):
+        engine.fetch_to_file(server.url, target, state)
+    assert os.listdir(tmp_path) == []
+    assert state['ranges'] is False and state['size'] == len(server.body)
+
+    engine.fetch_to_file(server.url, target, state)
+    assert read(target) == server.body
+
+
+def test_small_body_is_spooled_by_the_get_length(server, engine, tmp_path):
+    engine.spool_max_bytes = Pypan.SPOOL_MAX_BYTES
+    server.body = b'x' * 104
+    server.head_length = 0
+    payload = engine.fetch_to_file(server.url, str(tmp_path / 'download'), {})
+    assert payload.data == server.body
+    assert os.listdir(tmp_path) == []
+
+
+def test_body_without_length_goes_to_a_file(server, engine, tmp_path):
+    engine.spool_max_bytes = Pypan.SPOOL_MAX_BYTES
+    target = str(tmp_path / 'download')
+    server.body = b'x' * 104
+    server.get_length = False
+    assert engine.fetch_to_file(server.url, target, {}) is None
+    assert read(target) == server.body
+
+
+@pytest.fixture
+def cached_engine(engine, tmp_path):
+    engine.download_cache = BlobCache(str(tmp_path / 'cache'), 1024 * 1024 * 1024)
+    engine.wayback = WaybackResolver(lambda url: None, is_online=lambda: True)
+    old = tmp_path / 'old'
+    old.write_bytes(b'old version')
+    engine.download_cache.put('key', str(old), {'etag': '"v0"', 'last_modified': None})
+    yield engine
+    engine.wayback.shutdown()
+
+
+def test_revalidation_keeps_the_new_version_it_receives(server, cached_engine):
+    path = cached_engine.cached_download('key', revalidate_url=server.url)
+    assert read(path) == BODY
+    assert len(server.requests) == 1
+    assert cached_engine.download_cache.get('key')['etag'] == '"v1"'
+
+    # Now current: a 304, answered from the cache
+    path = cached_engine.cached_download('key', revalidate_url=server.url)
+    assert read(path) == BODY
+    assert len(server.requests) == 2
+
+
+def test_no_revalidation_against_a_dead_host(server, cached_engine):
+    for _ in range(Pypan.DEAD_HOST_THRESHOLD):
+        cached_engine.wayback.record_result(server.url, Pypan.requests.ConnectionError())
+    path = cached_engine.cached_download('key', revalidate_url=server.url)
+    assert read(path) == b'old version'
+    assert server.requests == []
@@ -0,0 +1,33 @@
+from Pypan import UploadEngine
+
+
+def build(rows, preset_column=False):
+    engine = UploadEngine()
+    engine.preset_column = preset_column
+    messages = []
+    engine.log_message = lambda message, level="INFO": messages.append((level, message))
+    tasks = [engine.build_upload_task(index, row) for index, row in enumerate(rows)]
+    return tasks, [message for level, message in messages if level == 'WARNING']
+
+
+def test_fourth_column_without_header_is_not_a_preset():
+    tasks, warnings = build([['a.webm', 'A.webm', 'desc', 'Success'],
+                             ['b.webm', 'B.webm', 'desc', 'Failed: gone']])
+    assert [task[3] for task in tasks] == [None, None]
+    assert warnings == []
+
+
+def test_preset_header_enables_the_column():
+    tasks, warnings = build([['source', 'title', 'description', 'Preset'],
+                             ['a.webm', 'A.webm', 'desc', 'archival'],
+                             ['b.webm', 'B.webm', 'desc', '']])
+    assert tasks[0] is None
+    assert [task[3] for task in tasks[1:]] == ['archival', None]
+    assert warnings == []
+
+
+def test_unknown_preset_is_reported_once():
+    rows = [['a.webm', 'A.webm', 'desc', 'turbo']] * 3 + [['b.webm', 'B.webm', 'desc', 'slow']]
+    tasks, warnings = build(rows, preset_column=True)
+    assert [task[3] for task in tasks] == [None] * 4
+    assert len(warnings) == 2
@@ -0,0 +1,13 @@
+import time
+
+from Pypan import UploadEngine
+
+
+def test_eta_after_resume_uses_only_rows_finished_in_this_run(tmp_path):
+    engine = UploadEngine(config_dir=str(tmp_path))
+    engine.start_time = time.time() - 100
+    engine.total_files = 110
+    # 80 rows loaded from the previous run, 10 finished in the last 100 seconds
+    engine.processed_files = 90
+    engine.processed_this_run = 10
+    assert 199 <= engine.estimate_remaining() <= 201
@@ -0,0 +1,28 @@
+from Pypan import UploadEngine
+
+
+def make_engine(tmp_path):
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text('a.jpg,A.jpg,desc\n')
+    engine = UploadEngine(config_dir=str(tmp_path))
+    engine.input_file = str(manifest)
+    engine.output_file = str(tmp_path / 'results.csv')
+    return engine
+
+
+def test_run_keeps_the_results_file_it_picked(tmp_path):
+    (tmp_path / 'results.csv').write_text('earlier run\n')
+    engine = make_engine(tmp_path)
+    engine.choose_output_path()
+    engine.save_results()
+    # An export meanwhile rewrites results.csv; the run's next save stays put
+    make_engine(tmp_path).save_results()
+    engine.save_results()
+    assert sorted(path.name for path in tmp_path.glob('results*')) == ['results.csv', 'results_1.csv']
+
+
+def test_export_overwrites_the_given_file(tmp_path):
+    (tmp_path / 'results.csv').write_text('earlier export\n')
+    make_engine(tmp_path).save_results()
+    assert (tmp_path / 'results.csv').read_text() != 'earlier export\n'
+    assert not (tmp_path / 'results_1.csv').exists()
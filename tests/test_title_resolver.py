@@ -0,0 +1,66 @@
+import threading
+import time
+
+from Pypan import TitleResolver
+
+
+class MockTitleAPI:
+    """query_titles() stand-in; the first query for `block_on` waits for release(), keeping that title in flight"""
+    def __init__(self, existing=(), block_on=None):
+        self.existing = set(existing)
+        self.block_on = block_on
+        self.queries = []
+        self.blocked = threading.Event()
+        self._release = threading.Event()
+
+    def release(self):
+        self._release.set()
+
+    def __call__(self, titles):
+        self.queries.append(list(titles))
+        if self.block_on in titles and not self.blocked.is_set():
+            self.blocked.set()
+            self._release.wait(5)
+        return {title: title in self.existing for title in titles}
+
+
+def test_batches_pending_titles_with_exists_call():
+    api = MockTitleAPI(existing={'B.jpg'})
+    api.release()
+    resolver = TitleResolver(api, batch_size=3)
+    resolver.prefetch(['B.jpg', 'C.jpg'])
+    assert api.queries == []
+
+    assert resolver.exists('A.jpg') is False
+    assert api.queries == [['A.jpg', 'B.jpg', 'C.jpg']]
+    # Answered from the cache
+    assert resolver.exists('B.jpg') is True
+    assert len(api.queries) == 1
+
+
+def test_full_prefetch_does_not_requery_title_in_flight():
+    api = MockTitleAPI(block_on='X.jpg')
+    resolver = TitleResolver(api, batch_size=2)
+    # The first batch is queried at once; P3.jpg and X.jpg stay pending
+    resolver.prefetch(['P1.jpg', 'P2.jpg', 'P3.jpg', 'X.jpg'])
+    assert api.queries == [['P1.jpg', 'P2.jpg']]
+
+    answers = {}
+    first = threading.Thread(target=lambda: answers.setdefault('first', resolver.exists('X.jpg')), daemon=True)
+    first.start()
+    assert api.blocked.wait(5)
+    # A second row with the same name waits for the query already running
+    second = threading.Thread(target=lambda: answers.setdefault('second', resolver.exists('X.jpg')), daemon=True)
+    second.start()
+    time.sleep(0.2)
+
+    # A full batch of prefetched titles must leave X.jpg to the running query
+    resolver.prefetch(['Y.jpg', 'Z.jpg'])
+    assert all('X.jpg' not in query for query in api.queries[2:])
+
+    api.release()
+    first.join(5)
+    second.join(5)
+    assert not first.is_alive() and not second.is_alive()
+    assert answers == {'first': False, 'second': False}
+    assert sum(query.count('X.jpg') for query in api.queries) == 1
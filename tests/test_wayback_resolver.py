@@ -0,0 +1,51 @@
+import time
+
+import requests
+
+from Pypan import WaybackResolver
+
+URL = 'http://example.org/a.jpg'
+
+
+def fail(resolver, times=1):
+    return [resolver.record_result(URL, requests.ConnectionError()) for _ in range(times)][-1]
+
+
+def make_resolver(online=True, **kwargs):
+    return WaybackResolver(lambda url: None, dead_after=3, is_online=lambda: online, **kwargs)
+
+
+def test_host_is_dead_after_failures_in_a_row():
+    resolver = make_resolver()
+    assert fail(resolver, 2) is False
+    assert fail(resolver) is True
+    assert resolver.is_dead(URL)
+    resolver.shutdown()
+
+
+def test_failures_while_offline_do_not_count():
+    resolver = make_resolver(online=False)
+    assert fail(resolver, 10) is False
+    assert not resolver.is_dead(URL)
+    resolver.shutdown()
+
+
+def test_successful_fetch_clears_the_dead_mark():
+    resolver = make_resolver()
+    fail(resolver, 3)
+    assert resolver.record_result(URL) is False
+    assert not resolver.is_dead(URL)
+    # The count starts over as well
+    assert fail(resolver, 2) is False
+    resolver.shutdown()
+
+
+def test_dead_mark_expires_and_one_more_failure_renews_it():
+    resolver = make_resolver(dead_ttl=0.05)
+    fail(resolver, 3)
+    assert resolver.is_dead(URL)
+    time.sleep(0.1)
+    assert not resolver.is_dead(URL)
+    assert fail(resolver) is True
+    assert resolver.is_dead(URL)
+    resolver.shutdown()